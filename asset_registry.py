@@ -0,0 +1,154 @@
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from model_loader import ModelLoader
+from mesh_cache import MeshCache
+from obj_stream import StreamingModel, STREAM_THRESHOLD
+
+
+class AssetRegistry:
+    '''
+        keeps loaded models (gpu buffers + textures) resident by name
+        so switching back to a model is a dictionary lookup.
+        when the estimated vram use goes over the budget the least
+        recently used models are released.
+        request() loads in the background: parsing and image decoding run
+        on worker threads and poll() does the gl upload on the render thread.
+        obj files over stream_threshold bytes are streamed: the model is
+        returned right away and grows as poll() uploads its blocks.
+    '''
+    def __init__(self, configs, vram_budget=64 * 1024 * 1024, mesh_cache=None, workers=2,
+                 texture_options=None, stream_threshold=STREAM_THRESHOLD):
+        self.configs = configs
+        # passed to every ModelLoader, see texture.py
+        self.texture_options = texture_options
+        self.vram_budget = vram_budget
+        self.mesh_cache = mesh_cache if mesh_cache is not None else MeshCache()
+        # name -> ModelLoader, most recently used last
+        self.resident = OrderedDict()
+        # name -> (ModelLoader, future) for loads still running on a worker
+        self.pending = {}
+        # name -> StreamingModel still receiving blocks, also in resident
+        self.streaming = {}
+        self.stream_threshold = stream_threshold
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="asset-loader")
+        # the model being drawn is never evicted
+        self.active = None
+        self.loads = 0
+        self.evictions = 0
+
+    def get(self, name):
+        # blocking load
+        model = self.resident.get(name)
+        if model is not None:
+            self.resident.move_to_end(name)
+            self.active = name
+            return model
+        if self._streams(name):
+            model = self._start_stream(name)
+            model.upload()
+        else:
+            model = ModelLoader(self.configs[name], mesh_cache=self.mesh_cache,
+                                texture_options=self.texture_options)
+        self.loads += 1
+        self.resident[name] = model
+        self.active = name
+        self._evict()
+        return model
+
+    def request(self, name):
+        '''
+            non blocking load, returns the model if it is resident,
+            otherwise starts loading it and returns None.
+            streamed models are returned at once, still empty
+        '''
+        model = self.resident.get(name)
+        if model is not None:
+            self.resident.move_to_end(name)
+            self.active = name
+            return model
+        if self._streams(name):
+            model = self._start_stream(name)
+            self.streaming[name] = model
+            self.loads += 1
+            self.resident[name] = model
+            self.active = name
+            return model
+        if name not in self.pending:
+            model = ModelLoader(self.configs[name], mesh_cache=self.mesh_cache, load=False,
+                                texture_options=self.texture_options)
+            self.pending[name] = (model, self.executor.submit(model.prepare))
+        return None
+
+    def _streams(self, name):
+        path = self.configs[name][0]
+        return bool(path) and os.path.exists(path) and os.path.getsize(path) > self.stream_threshold
+
+    def _start_stream(self, name):
+        model = StreamingModel(self.configs[name], mesh_cache=self.mesh_cache,
+                               texture_options=self.texture_options)
+        self.executor.submit(model.prepare)
+        return model
+
+    def poll(self):
+        # call once per frame on the gl thread, uploads finished loads
+        # and the next blocks of streamed ones
+        for name, model in list(self.streaming.items()):
+            model.pump()
+            if model.finished:
+                del self.streaming[name]
+                if model.error is not None:
+                    print(f"failed to stream {name}: {model.error!r}")
+        ready = []
+        for name, (model, future) in list(self.pending.items()):
+            if not future.done():
+                continue
+            del self.pending[name]
+            error = future.exception()
+            if error is not None:
+                print(f"failed to load {name}: {error!r}")
+                continue
+            model.upload()
+            self.loads += 1
+            self.resident[name] = model
+            ready.append(name)
+        if ready:
+            self._evict(keep=ready)
+        return ready
+
+    def loading(self):
+        # name -> (stage, progress) of every load still in flight
+        loads = {name: (model.load_stage, model.load_progress)
+                 for name, (model, _) in self.pending.items()}
+        for name, model in self.streaming.items():
+            loads[name] = (model.load_stage, model.load_progress)
+        return loads
+
+    def vram_bytes(self):
+        return sum(model.vram_bytes() for model in self.resident.values())
+
+    def set_budget(self, vram_budget):
+        self.vram_budget = vram_budget
+        self._evict()
+
+    def _evict(self, keep=()):
+        # oldest first, never the model being drawn or one just loaded
+        for name in list(self.resident):
+            if self.vram_bytes() <= self.vram_budget:
+                break
+            if name == self.active or name in keep:
+                continue
+            model = self.resident.pop(name)
+            self.streaming.pop(name, None)
+            model.release()
+            self.evictions += 1
+            print(f"evicted model: {name}")
+
+    def release_all(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.pending.clear()
+        self.streaming.clear()
+        for model in self.resident.values():
+            model.release()
+        self.resident.clear()
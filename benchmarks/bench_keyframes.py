@@ -0,0 +1,48 @@
+'''
+    keyframe path evaluation: samples / second for each interpolation at a
+    few batch sizes, and what a retrace of all three curves costs a frame
+    usage (from repo root):
+        python -m benchmarks.bench_keyframes [--keys 64]
+'''
+import argparse
+import time
+
+import numpy as np
+
+from keyframes import KeyframePath, METHODS
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--keys", type=int, default=64)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    keys = rng.uniform([-180.0, -90.0, -180.0], [180.0, 90.0, 180.0], (args.keys, 3))
+    path = KeyframePath(keys)
+    print(f"{args.keys} keyframes, samples / second")
+    print(f"{'samples':>10}" + "".join(f"{method:>14}" for method in METHODS))
+    for size in args.sizes:
+        t = rng.uniform(0.0, path.duration, size)
+        rates = [size / timed(lambda: path.evaluate(t, method)) for method in METHODS]
+        print(f"{size:>10,}" + "".join(f"{rate:>14,.0f}" for rate in rates))
+
+    def retrace():
+        # what Window._draw_paths pays when the keys have just changed
+        path._build()
+        for method in METHODS:
+            path.trace(method, 2048, 150.0)
+    print(f"rebuild + 3 x 2048 sample traces: {1000 * timed(retrace):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+'''
+    smooth normal generation: the vectorized scatter-add version in
+    normals.py against a per face python loop, on a smooth surface and on
+    one folded into sharp ridges so the crease split does real work
+    usage (from repo root):
+        python -m benchmarks.bench_normals [--triangles 1000000]
+'''
+import argparse
+import time
+
+import numpy as np
+
+from normals import smooth_normals, CREASE_ANGLE
+
+
+def grid_mesh(triangles, ridged=False):
+    # (V,3) positions and (F,3) faces of a square grid, two triangles per quad
+    side = max(int(np.sqrt(triangles / 2)), 1)
+    n = side + 1
+    ys, xs = np.mgrid[0:n, 0:n].reshape(2, -1).astype(np.float32)
+    if ridged:
+        # saw tooth along x, 127 degrees between the faces on either side of a ridge
+        zs = np.abs((xs % 16) - 8) * 2.0
+    else:
+        zs = np.sin(xs * 0.1) * np.cos(ys * 0.1)
+    positions = np.stack([xs, ys, zs], axis=1).astype(np.float32)
+    cells = np.arange(side * side)
+    a = (cells // side) * n + cells % side
+    faces = np.concatenate([np.stack([a, a + 1, a + n + 1], axis=1),
+                            np.stack([a, a + n + 1, a + n], axis=1)]).astype(np.int32)
+    return positions, faces
+
+
+def loop_normals(positions, faces, crease_angle=CREASE_ANGLE):
+    # the straightforward version: per face normals, then per corner sums over the vertex's faces
+    cos_crease = np.cos(np.radians(crease_angle))
+    face_normals = []
+    vertex_faces = [[] for _ in range(len(positions))]
+    for f, (a, b, c) in enumerate(faces.tolist()):
+        pa, pb, pc = positions[a], positions[b], positions[c]
+        face_normals.append(np.cross(pb - pa, pc - pa))
+        for v in (a, b, c):
+            vertex_faces[v].append(f)
+    corner_normals = np.zeros((len(faces), 3, 3))
+    for f, corners in enumerate(faces.tolist()):
+        unit = face_normals[f] / (np.linalg.norm(face_normals[f]) or 1.0)
+        for k, v in enumerate(corners):
+            total = np.zeros(3)
+            for g in vertex_faces[v]:
+                other = face_normals[g]
+                if np.dot(unit, other / (np.linalg.norm(other) or 1.0)) >= cos_crease:
+                    total += other
+            corner_normals[f, k] = total / (np.linalg.norm(total) or 1.0)
+    return corner_normals
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--triangles", type=int, default=1_000_000)
+    parser.add_argument("--loop-triangles", type=int, default=20_000,
+                        help="size of the python loop run, it is too slow for the full mesh")
+    args = parser.parse_args()
+
+    # correctness and speedup against the loop on a small ridged mesh
+    positions, faces = grid_mesh(args.loop_triangles, ridged=True)
+    reference, loop_time = timed(loop_normals, positions, faces)
+    (normals, face_normals), vector_time = timed(smooth_normals, positions, faces)
+    error = np.abs(normals[face_normals] - reference).max()
+    print(f"{len(faces):,} triangles: python loop {loop_time:.2f} s, vectorized {vector_time * 1000:.1f} ms "
+          f"({loop_time / vector_time:.0f}x), max difference {error:.2e}")
+
+    print(f"{'surface':<10}{'triangles':>12}{'time (ms)':>12}{'tris / s':>16}{'split normals':>16}")
+    for ridged in (False, True):
+        positions, faces = grid_mesh(args.triangles, ridged)
+        (normals, _), elapsed = timed(smooth_normals, positions, faces)
+        name = "ridged" if ridged else "smooth"
+        print(f"{name:<10}{len(faces):>12,}{elapsed * 1000:>12.1f}{len(faces) / elapsed:>16,.0f}"
+              f"{len(normals) - len(positions):>16,}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+'''
+    compare the bulk numpy obj parser against the old line by line parser
+    usage (from repo root):
+        python -m benchmarks.bench_obj_load [--triangles 1000000]
+'''
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from obj_parser import parse_obj
+
+
+def write_grid_obj(filepath, triangles):
+    # square grid of quads with v/vt/vn corners, two triangles per quad
+    side = max(int(np.sqrt(triangles / 2)), 1)
+    n = side + 1
+    ys, xs = np.mgrid[0:n, 0:n]
+    xs = xs.reshape(-1).astype(np.float32)
+    ys = ys.reshape(-1).astype(np.float32)
+    zs = np.sin(xs * 0.1) * np.cos(ys * 0.1)
+    with open(filepath, 'w') as f:
+        f.write("# synthetic grid\n")
+        np.savetxt(f, np.stack([xs, ys, zs], axis=1), fmt='v %.5f %.5f %.5f')
+        np.savetxt(f, np.stack([xs / side, ys / side], axis=1), fmt='vt %.5f %.5f')
+        np.savetxt(f, np.tile([0.0, 0.0, 1.0], (n * n, 1)), fmt='vn %.1f %.1f %.1f')
+        cells = np.arange(side * side)
+        r, c = cells // side, cells % side
+        a = r * n + c + 1
+        quads = np.stack([a, a + 1, a + n + 1, a + n], axis=1)
+        corners = np.repeat(quads, 3, axis=1)
+        np.savetxt(f, corners, fmt='f %d/%d/%d %d/%d/%d %d/%d/%d %d/%d/%d')
+    return side * side * 2
+
+
+def legacy_load_obj(filepath):
+    # the original per line parser from ModelLoader._load_obj
+    vertices = []
+    tex_coords = []
+    normals = []
+    faces = []
+    with open(filepath, 'r') as o:
+        for line in o:
+            line = line.strip()
+            if (not line or
+                line.startswith('usemtl') or
+                line.startswith('g') or
+                line.startswith('#')):
+                continue
+            parts = line.split()
+            if parts[0] == 'v':
+                vertices.append([float(parts[1]), float(parts[2]), float(parts[3])])
+            elif parts[0] == 'vt':
+                tex_coords.append([float(parts[1]), float(parts[2])])
+            elif parts[0] == 'vn':
+                normals.append([float(parts[1]), float(parts[2]), float(parts[3])])
+            elif parts[0] == "f":
+                face_verts = []
+                face_texs = []
+                face_norms = []
+                for vertex_data in parts[1:]:
+                    indices = vertex_data.split('/')
+                    face_verts.append(int(indices[0]) - 1)
+                    if len(indices) > 1 and indices[1]:
+                        face_texs.append(int(indices[1]) - 1)
+                    if len(indices) > 2 and indices[2]:
+                        face_norms.append(int(indices[2]) - 1)
+                if len(face_verts) == 3:
+                    faces.append({
+                        'vertices': face_verts,
+                        'texcoords': face_texs if face_texs else None
+                    })
+                elif len(face_verts) == 4:
+                    faces.append({
+                        'vertices': [face_verts[0], face_verts[1], face_verts[2]],
+                        'texcoords': [face_texs[0], face_texs[1], face_texs[2]] if face_texs else None,
+                        'normals': [face_norms[0], face_norms[1], face_norms[2]] if face_norms else None
+                    })
+                    faces.append({
+                        'vertices': [face_verts[0], face_verts[2], face_verts[3]],
+                        'texcoords': [face_texs[0], face_texs[2], face_texs[3]] if face_texs else None,
+                        'normals': [face_norms[0], face_norms[2], face_norms[3]] if face_norms else None
+                    })
+    return vertices, tex_coords, normals, faces
+
+
+def measure(fn, filepath):
+    # timing and memory are separate runs, tracemalloc slows python code down a lot
+    start = time.perf_counter()
+    result = fn(filepath)
+    elapsed = time.perf_counter() - start
+    del result
+    tracemalloc.start()
+    result = fn(filepath)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--triangles", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "grid.obj")
+        tris = write_grid_obj(filepath, args.triangles)
+        size_mb = os.path.getsize(filepath) / 1e6
+        print(f"synthetic obj: {tris} triangles, {size_mb:.1f} MB")
+
+        legacy, legacy_time, legacy_peak = measure(legacy_load_obj, filepath)
+        legacy_tris = len(legacy[3])
+        del legacy
+        mesh, bulk_time, bulk_peak = measure(parse_obj, filepath)
+        assert len(mesh.faces) == legacy_tris
+
+        print(f"{'parser':<10}{'time (s)':>12}{'peak (MB)':>12}")
+        print(f"{'legacy':<10}{legacy_time:>12.2f}{legacy_peak / 1e6:>12.1f}")
+        print(f"{'bulk':<10}{bulk_time:>12.2f}{bulk_peak / 1e6:>12.1f}")
+        print(f"speedup {legacy_time / bulk_time:.1f}x, "
+              f"memory {legacy_peak / bulk_peak:.1f}x less")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+'''
+    streaming obj reader against the whole file parser: parse throughput,
+    peak python memory and how soon the first block is available
+    usage (from repo root):
+        python -m benchmarks.bench_obj_stream [--triangles 2000000] [--chunk-mb 4]
+'''
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from obj_parser import parse_obj
+from obj_stream import read_blocks, block_bytes
+from benchmarks.bench_obj_load import write_grid_obj
+
+
+def whole_file(filepath, chunk_bytes):
+    start = time.perf_counter()
+    mesh = parse_obj(filepath)
+    elapsed = time.perf_counter() - start
+    # nothing can be drawn before the whole file is parsed
+    return elapsed, elapsed, len(mesh.faces)
+
+
+def streamed(filepath, chunk_bytes):
+    # blocks are dropped after counting, like StreamingModel after upload
+    start = time.perf_counter()
+    first = None
+    triangles = 0
+    for block, _ in read_blocks(filepath, chunk_bytes):
+        if first is None and block.faces is not None:
+            first = time.perf_counter() - start
+        if block.faces is not None:
+            triangles += len(block.faces)
+        block_bytes(block)
+    return time.perf_counter() - start, first, triangles
+
+
+def measure(fn, *args):
+    # timing and memory are separate runs, tracemalloc slows allocation heavy code down
+    result = fn(*args)
+    tracemalloc.start()
+    fn(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--triangles", type=int, default=2_000_000)
+    parser.add_argument("--chunk-mb", type=float, default=4.0)
+    args = parser.parse_args()
+    chunk_bytes = int(args.chunk_mb * 1024 * 1024)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filepath = os.path.join(tmp, "grid.obj")
+        write_grid_obj(filepath, args.triangles)
+        size = os.path.getsize(filepath)
+        print(f"synthetic obj: {size / 1e6:.1f} MB, {args.chunk_mb:g} MB chunks")
+        print(f"{'reader':<10}{'time (s)':>10}{'MB / s':>10}{'first faces (s)':>18}{'peak (MB)':>12}{'triangles':>12}")
+        for name, fn in (("whole", whole_file), ("streamed", streamed)):
+            (elapsed, first, triangles), peak = measure(fn, filepath, chunk_bytes)
+            print(f"{name:<10}{elapsed:>10.2f}{size / elapsed / 1e6:>10.1f}{first:>18.3f}"
+                  f"{peak / 1e6:>12.1f}{triangles:>12,}")
+
+
+if __name__ == "__main__":
+    main()
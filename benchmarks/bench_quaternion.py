@@ -0,0 +1,65 @@
+'''
+    batched QuaternionArray vs looping over Quaternion.times
+    usage (from repo root):
+        python -m benchmarks.bench_quaternion [--count 1000000]
+'''
+import argparse
+import time
+
+import numpy as np
+
+from quaternion import QuaternionArray
+
+
+def timed(fn, repeat=3):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--scalar-count", type=int, default=100_000,
+                        help="the python loop is timed on fewer items and scaled")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    a = QuaternionArray(rng.normal(size=(args.count, 4)))
+    b = QuaternionArray(rng.normal(size=(args.count, 4)))
+
+    n = min(args.scalar_count, args.count)
+    qa = [a.to_quaternion(x) for x in range(n)]
+    qb = [b.to_quaternion(x) for x in range(n)]
+    scalar, scalar_time = timed(lambda: [x.times(y) for x, y in zip(qa, qb)], repeat=1)
+    batched, batched_time = timed(lambda: a.times(b))
+
+    check = QuaternionArray.from_quaternions(scalar)
+    assert np.allclose(check.data, batched.data[:n])
+
+    scalar_rate = n / scalar_time
+    batched_rate = args.count / batched_time
+    print(f"{'operation':<22}{'per second':>16}")
+    print(f"{'Quaternion.times':<22}{scalar_rate:>16,.0f}")
+    print(f"{'QuaternionArray.times':<22}{batched_rate:>16,.0f}")
+    print(f"speedup {batched_rate / scalar_rate:.0f}x")
+
+    points = rng.normal(size=(args.count, 3))
+    t = rng.random(args.count)
+    for name, fn in [
+        ("inverse", lambda: a.inverse()),
+        ("slerp", lambda: a.slerp(b, t)),
+        ("to_matrices", lambda: a.to_matrices()),
+        ("to_euler", lambda: a.to_euler()),
+        ("rotate points", lambda: a.rotate(points)),
+    ]:
+        _, elapsed = timed(fn)
+        print(f"{name:<22}{args.count / elapsed:>16,.0f}")
+
+
+if __name__ == "__main__":
+    main()
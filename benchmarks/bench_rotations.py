@@ -0,0 +1,162 @@
+'''
+    rotations.py: conversion throughput and accuracy.
+    validation first: the app's euler matrices against the glRotatef chain
+    (the spec formula, and the driver's own matrices when a headless gl
+    context can be made), euler round trips for all 12 sequences with
+    angles packed around the gimbal singularity, then conversions / second.
+    usage (from repo root):
+        python -m benchmarks.bench_rotations [--count 1000000] [--no-gl]
+'''
+import argparse
+import os
+import time
+
+import numpy as np
+
+import rotations
+
+
+def timed(fn, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def glrotatef_chain(angles):
+    # (N,3,3) of glRotatef(yaw, z) glRotatef(pitch, y) glRotatef(roll, x), spec formula
+    m = np.broadcast_to(np.eye(3), (len(angles), 3, 3))
+    for n, axis in enumerate(([0, 0, 1], [0, 1, 0], [1, 0, 0])):
+        m = m @ rotations.axis_angle_to_matrix(axis, angles[:, n], degrees=True)
+    return m
+
+
+def driver_chain(angles):
+    # the same chain run through the driver's matrix stack, None without a gl context
+    try:
+        # same headless setup as main.py --headless
+        os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
+        if os.environ['PYOPENGL_PLATFORM'] == 'egl':
+            os.environ.setdefault('EGL_PLATFORM', 'surfaceless')
+        from OpenGL.GL import (glMatrixMode, glLoadIdentity, glRotated, glGetDoublev,
+                               GL_MODELVIEW, GL_MODELVIEW_MATRIX)
+        from offscreen import HeadlessContext
+        context = HeadlessContext(16, 16)
+    except Exception as e:
+        print(f"no gl context, driver check skipped: {e}")
+        return None
+    out = np.empty((len(angles), 3, 3))
+    glMatrixMode(GL_MODELVIEW)
+    for n, (yaw, pitch, roll) in enumerate(angles):
+        glLoadIdentity()
+        glRotated(yaw, 0, 0, 1)
+        glRotated(pitch, 0, 1, 0)
+        glRotated(roll, 1, 0, 0)
+        # column major, the transpose of the numpy layout
+        out[n] = np.asarray(glGetDoublev(GL_MODELVIEW_MATRIX)).reshape(4, 4).T[:3, :3]
+    context.destroy()
+    return out
+
+
+def test_angles(rng, count, sequence):
+    # a quarter generic, the rest within 1e-1 .. 1e-15 radians of the singularity or on it
+    angles = rng.uniform(-np.pi, np.pi, (count, 3))
+    near = rng.choice([-1.0, 1.0], count) * 10.0 ** -rng.uniform(1, 15, count)
+    if sequence in rotations.TAIT_BRYAN:
+        angles[:, 1] = rng.uniform(-0.5 * np.pi, 0.5 * np.pi, count)
+        lock = rng.choice([-0.5 * np.pi, 0.5 * np.pi], count)
+        near = -np.sign(lock) * np.abs(near)
+    else:
+        angles[:, 1] = rng.uniform(0.0, np.pi, count)
+        lock = rng.choice([0.0, np.pi], count)
+        near = np.where(lock > 0, -1.0, 1.0) * np.abs(near)
+    quarter = count // 4
+    angles[quarter:2 * quarter, 1] = lock[quarter:2 * quarter]
+    angles[2 * quarter:, 1] = lock[2 * quarter:] + near[2 * quarter:]
+    return angles, slice(0, quarter)
+
+
+def naive_pitch(m):
+    # textbook extraction, asin of one matrix entry
+    return np.arcsin(np.clip(-m[:, 2, 0], -1.0, 1.0))
+
+
+def validate(rng, count, use_gl):
+    print("validation (max abs error)")
+    angles = rng.uniform(-180.0, 180.0, (count, 3))
+    angles[:count // 2, 1] = rng.choice([-90.0, 90.0], count // 2) + rng.normal(0, 1e-3, count // 2)
+    ours = rotations.euler_to_matrix(angles, rotations.APP_SEQUENCE, degrees=True)
+    spec = glrotatef_chain(angles)
+    print(f"  euler_to_matrix vs glRotatef spec chain:   {np.abs(ours - spec).max():.2e}")
+    via_quaternion = rotations.quaternion_to_matrix(
+        rotations.euler_to_quaternion(angles, rotations.APP_SEQUENCE, degrees=True))
+    print(f"  euler_to_quaternion matrix vs chain:       {np.abs(via_quaternion - spec).max():.2e}")
+    if use_gl:
+        sample = angles[:min(count, 2000)]
+        driver = driver_chain(sample)
+        if driver is not None:
+            # drivers may build the matrices in single precision
+            print(f"  euler_to_matrix vs driver glRotated chain: {np.abs(ours[:len(sample)] - driver).max():.2e}")
+
+    print(f"  {'sequence':<10}{'intrinsic':>10}{'extrinsic':>12}{'generic angles':>16}")
+    for sequence in rotations.SEQUENCES:
+        errors = []
+        angle_error = 0.0
+        for intrinsic in (True, False):
+            angles, generic = test_angles(rng, count, sequence)
+            m = rotations.euler_to_matrix(angles, sequence, intrinsic)
+            back = rotations.matrix_to_euler(m, sequence, intrinsic)
+            errors.append(np.abs(rotations.euler_to_matrix(back, sequence, intrinsic) - m).max())
+            # away from the singularity the angles themselves come back
+            diff = np.angle(np.exp(1j * (back[generic] - angles[generic])))
+            angle_error = max(angle_error, np.abs(diff).max())
+        print(f"  {sequence:<10}{errors[0]:>10.1e}{errors[1]:>12.1e}{angle_error:>16.1e}")
+
+    # the app's pitch near lock, atan2 based against asin of a matrix entry
+    offsets = 10.0 ** -np.arange(2, 9)
+    pitch = 0.5 * np.pi - offsets
+    m = rotations.euler_to_matrix(np.stack([np.zeros_like(pitch), pitch, np.zeros_like(pitch)], axis=1))
+    ours = rotations.matrix_to_euler(m)[:, 1]
+    naive = naive_pitch(m)
+    print(f"  pitch error near 90 deg  {'offset':>8}{'asin':>12}{'rotations':>12}")
+    for offset, a, b, p in zip(offsets, naive, ours, pitch):
+        print(f"  {'':<25}{offset:>8.0e}{abs(a - p):>12.1e}{abs(b - p):>12.1e}")
+
+
+def throughput(rng, count):
+    angles = rng.uniform(-np.pi, np.pi, (count, 3))
+    q = rotations.euler_to_quaternion(angles)
+    m = rotations.quaternion_to_matrix(q)
+    axes, theta = rotations.quaternion_to_axis_angle(q)
+    cases = [
+        ("euler_to_quaternion", lambda: rotations.euler_to_quaternion(angles)),
+        ("euler_to_matrix", lambda: rotations.euler_to_matrix(angles)),
+        ("quaternion_to_euler", lambda: rotations.quaternion_to_euler(q)),
+        ("quaternion_to_euler zxz", lambda: rotations.quaternion_to_euler(q, 'zxz')),
+        ("quaternion_to_matrix", lambda: rotations.quaternion_to_matrix(q)),
+        ("matrix_to_quaternion", lambda: rotations.matrix_to_quaternion(m)),
+        ("matrix_to_euler", lambda: rotations.matrix_to_euler(m)),
+        ("axis_angle_to_quaternion", lambda: rotations.axis_angle_to_quaternion(axes, theta)),
+        ("quaternion_to_axis_angle", lambda: rotations.quaternion_to_axis_angle(q)),
+        ("axis_angle_to_matrix", lambda: rotations.axis_angle_to_matrix(axes, theta)),
+    ]
+    print(f"{'conversion':<28}{'per second':>16}")
+    for name, fn in cases:
+        print(f"{name:<28}{count / timed(fn):>16,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=1_000_000)
+    parser.add_argument("--check-count", type=int, default=100_000)
+    parser.add_argument("--no-gl", action="store_true", help="skip the check against the driver")
+    args = parser.parse_args()
+    rng = np.random.default_rng(0)
+    validate(rng, args.check_count, not args.no_gl)
+    throughput(rng, args.count)
+
+
+if __name__ == "__main__":
+    main()
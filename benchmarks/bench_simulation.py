@@ -0,0 +1,52 @@
+'''
+    fixed timestep simulation throughput, scalar Simulation vs the batched
+    InstancedScene orientation arrays
+    usage (from repo root):
+        python -m benchmarks.bench_simulation [--steps 200000] [--instances 10000]
+'''
+import argparse
+import time
+
+from simulation import Simulation
+from scene import InstancedScene
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--steps", type=int, default=200_000)
+    parser.add_argument("--instances", type=int, default=10_000)
+    parser.add_argument("--batch-steps", type=int, default=500)
+    args = parser.parse_args()
+
+    print(f"{'path':<34}{'steps / s':>14}{'orientations / s':>20}")
+
+    # one plane, every control held so each step does the full update
+    sim = Simulation(max_steps=args.steps)
+    sim.held = {"i", "u", "o"}
+    start = time.perf_counter()
+    sim.advance(args.steps * sim.dt)
+    elapsed = time.perf_counter() - start
+    rate = sim.steps / elapsed
+    print(f"{'Simulation (scalar)':<34}{rate:>14,.0f}{rate:>20,.0f}")
+
+    for count in sorted({1_000, args.instances}):
+        scene = InstancedScene(count)
+        start = time.perf_counter()
+        scene.step(args.batch_steps)
+        elapsed = time.perf_counter() - start
+        rate = args.batch_steps / elapsed
+        print(f"{f'InstancedScene ({count:,} objects)':<34}{rate:>14,.0f}{rate * count:>20,.0f}")
+
+    # how many steps fit in one 60 fps frame with the batch attached
+    sim = Simulation()
+    sim.batch = InstancedScene(args.instances)
+    start = time.perf_counter()
+    steps = 0
+    while time.perf_counter() - start < 1.0 / 60.0:
+        sim.step()
+        steps += 1
+    print(f"steps per 16.7 ms frame with {args.instances:,} objects attached: {steps}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+'''
+    startup cost: import time of each entry point and which gui modules it
+    pulls in, then time to first frame and to the first frame with the
+    model for a headless Window with the initial load blocking or in the
+    background (what a windowed session does). every run is a fresh
+    interpreter, times include interpreter start.
+    usage (from repo root):
+        python -m benchmarks.bench_startup [--runs 5] [--platform egl]
+'''
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+# entry point -> module imported, analysis tools must not load any GUI_MODULES
+ENTRY_POINTS = {
+    'main.py': 'main',
+    'window (headless)': 'window',
+    'gimbal_sweep.py': 'gimbal_sweep',
+    'drift_study.py': 'drift_study',
+    'study.py': 'study',
+    'keyframes.py': 'keyframes',
+    'trajectory.py': 'trajectory',
+}
+GUI_MODULES = ('pygame', 'imgui', 'glm', 'OpenGL', 'PIL')
+
+IMPORT_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import {module}
+print(json.dumps({{'import': time.perf_counter() - start,
+                   'gui': [m for m in {gui!r} if m in sys.modules]}}))
+'''
+
+FIRST_FRAME_SCRIPT = '''
+import json, sys, time
+launched = {launched!r}
+start = time.time()
+import window
+from OpenGL.GL import glFinish
+imported = time.time()
+w = window.Window(1280, 780, "bench", headless=True, async_load={async_load!r})
+created = time.time()
+w._finish_loads()
+w._render_offscreen()
+glFinish()
+first = time.time()
+frames = 1
+while w.model is None:
+    w._finish_loads()
+    w._render_offscreen()
+    frames += 1
+glFinish()
+model = time.time()
+print(json.dumps({{'interpreter': start - launched, 'import': imported - start, 'init': created - imported,
+                   'first_frame': first - launched, 'model_frame': model - launched, 'frames': frames}}))
+sys.stdout.flush()
+w._cleanup()
+'''
+
+
+def run(script, env):
+    out = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, env=env)
+    lines = [line for line in out.stdout.splitlines() if line.startswith('{')]
+    if out.returncode not in (0, None) and not lines:
+        raise RuntimeError(out.stderr.strip().splitlines()[-1] if out.stderr.strip() else "failed")
+    return json.loads(lines[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--platform", choices=["egl", "osmesa"], default="egl")
+    args = parser.parse_args()
+    env = dict(os.environ, PYOPENGL_PLATFORM=args.platform)
+    if args.platform == "egl":
+        env.setdefault("EGL_PLATFORM", "surfaceless")
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.getcwd(), env.get('PYTHONPATH')]))
+
+    print(f"import time, median of {args.runs} fresh interpreters")
+    print(f"{'entry point':<22}{'ms':>10}   gui modules loaded")
+    for name, module in ENTRY_POINTS.items():
+        results = [run(IMPORT_SCRIPT.format(module=module, gui=GUI_MODULES), env) for _ in range(args.runs)]
+        ms = 1000 * statistics.median(r['import'] for r in results)
+        print(f"{name:<22}{ms:>10.1f}   {', '.join(results[0]['gui']) or '-'}")
+
+    print(f"\ntime from launch, ms (median of {args.runs})")
+    print(f"{'initial load':<14}{'interpreter':>12}{'import':>10}{'init':>10}{'first frame':>14}"
+          f"{'with model':>12}{'frames':>8}")
+    for async_load in (False, True):
+        results = []
+        for _ in range(args.runs):
+            script = FIRST_FRAME_SCRIPT.format(launched=time.time(), async_load=async_load)
+            results.append(run(script, env))
+        row = {key: statistics.median(r[key] for r in results) for key in results[0]}
+        print(f"{'background' if async_load else 'blocking':<14}{1000 * row['interpreter']:>12.1f}"
+              f"{1000 * row['import']:>10.1f}{1000 * row['init']:>10.1f}{1000 * row['first_frame']:>14.1f}"
+              f"{1000 * row['model_frame']:>12.1f}{row['frames']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+'''
+    study.py scaling: the same grid run on 1, 2, 4 ... workers up to the
+    core count, trials / second and speedup over one worker
+    usage (from repo root):
+        python -m benchmarks.bench_study [--seconds 30] [--seeds 4]
+'''
+import argparse
+import os
+import tempfile
+import time
+
+from study import run_study
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--seconds", type=float, default=30.0, help="simulated seconds per trial")
+    parser.add_argument("--seeds", type=int, default=4)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    spec = {
+        'seconds': args.seconds,
+        'seeds': args.seeds,
+        'grid': {
+            'step_degrees': [1.0, 2.0, 4.0],
+            'sequence': ['pitch', 'tumble', 'random'],
+            'renormalize': ['never', 'always', 'lazy:1e-12', 'approx'],
+        },
+    }
+    counts = [1]
+    while counts[-1] * 2 <= args.max_workers:
+        counts.append(counts[-1] * 2)
+    if counts[-1] != args.max_workers:
+        counts.append(args.max_workers)
+
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for workers in counts:
+            # a fresh results file each time, nothing is resumed
+            out_path = os.path.join(tmp, f"study_{workers}.jsonl")
+            start = time.perf_counter()
+            trials = len(run_study(spec, out_path, workers))
+            rows.append((workers, trials / (time.perf_counter() - start)))
+    print(f"{'workers':>8}{'trials / s':>14}{'speedup':>10}{'efficiency':>12}")
+    for workers, rate in rows:
+        speedup = rate / rows[0][1]
+        print(f"{workers:>8}{rate:>14.1f}{speedup:>10.2f}{speedup / workers:>12.0%}")
+
+
+if __name__ == "__main__":
+    main()
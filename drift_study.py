@@ -0,0 +1,182 @@
+'''
+    long run quaternion integration: compose the same small rotation onto
+    many independent chains for a very large number of steps and measure
+    how far each renormalization policy drifts from the exact answer.
+
+    every chain repeats one fixed step quaternion s, so after n steps the
+    exact orientation is s^n, the same axis with n times the angle. that
+    reference is computed in closed form in float64, no accumulation.
+    chain 0 uses Window's increments (i_quat * j_quat * k_quat).
+
+    policies:
+        never       no renormalization (shows the raw drift)
+        always      divide by the norm every step, what Quaternion.__init__ did
+        lazy:TOL    renormalize only the chains with |norm^2 - 1| > TOL
+        periodic:K  renormalize every chain every K steps
+        approx      first order fix q *= (3 - |q|^2) / 2 every step, no sqrt
+
+    usage:
+        python drift_study.py --chains 10000 --steps 100000 --policies never always lazy:1e-12 periodic:64
+'''
+import argparse
+import time
+
+import numpy as np
+
+from quaternion import Quaternion, QuaternionArray
+
+DEFAULT_POLICIES = ["never", "always", "lazy:1e-12", "lazy:1e-8", "periodic:16", "periodic:256", "approx"]
+
+
+def step_quaternions(chains, max_angle_deg=2.0, seed=0):
+    # (chains, 4) unit steps, random axes and angles, chain 0 is Window's i*j*k
+    rng = np.random.default_rng(seed)
+    axes = rng.normal(size=(chains, 3))
+    angles = np.radians(rng.uniform(-max_angle_deg, max_angle_deg, chains))
+    steps = QuaternionArray.from_axis_angle(axes, angles).data
+    window = Quaternion(.95, .02, 0, 0).times(Quaternion(.95, 0, .02, 0)).times(Quaternion(.95, 0, 0, .02))
+    steps[0] = [window.r, window.i, window.j, window.k]
+    return steps
+
+
+def exact_power(steps, n):
+    # s^n in closed form, float64
+    r = np.clip(steps[:, 0], -1.0, 1.0)
+    imag = np.linalg.norm(steps[:, 1:], axis=1)
+    half = np.arctan2(imag, r) * n
+    axis = steps[:, 1:] / np.where(imag > 0, imag, 1.0)[:, None]
+    return np.hstack([np.cos(half)[:, None], np.sin(half)[:, None] * axis])
+
+
+def right_multiply_matrices(steps, dtype):
+    # (4,4,N) M with q * s == M q for [r, i, j, k] quaternions. chains are the
+    # last axis so each einsum term runs over one contiguous row of N values
+    a, b, c, d = steps.T
+    m = np.array([[a, -b, -c, -d],
+                  [b, a, d, -c],
+                  [c, -d, a, b],
+                  [d, c, -b, a]])
+    return np.ascontiguousarray(m, dtype=dtype)
+
+
+def parse_policy(spec):
+    name, _, arg = spec.partition(':')
+    if name not in ('never', 'always', 'lazy', 'periodic', 'approx'):
+        raise ValueError(f"unknown policy: {spec}")
+    if name == 'lazy':
+        return name, float(arg or 1e-12)
+    if name == 'periodic':
+        return name, int(arg or 64)
+    return name, None
+
+
+def errors(q, reference):
+    # rotation angle between q and the reference in degrees, and |1 - |q||
+    norms = np.linalg.norm(q, axis=1)
+    unit = q / norms[:, None]
+    # q and -q are the same rotation
+    sign = np.where(np.einsum('ij,ij->i', unit, reference) < 0, -1.0, 1.0)[:, None]
+    diff = np.linalg.norm(unit - sign * reference, axis=1)
+    total = np.linalg.norm(unit + sign * reference, axis=1)
+    angle = np.degrees(4.0 * np.arctan2(diff, total))
+    return angle, np.abs(1.0 - norms)
+
+
+def integrate(steps, total_steps, policy, chunk=1000, dtype=np.float64):
+    '''
+        compose steps onto identity total_steps times with one policy.
+        returns a dict with throughput, renormalization count and the
+        drift measured after every chunk of steps
+    '''
+    name, arg = parse_policy(policy)
+    chains = len(steps)
+    m = right_multiply_matrices(steps, dtype)
+    # (4, N), preallocated so the inner loop does not allocate
+    q = np.zeros((4, chains), dtype=dtype)
+    q[0] = 1.0
+    out = np.empty_like(q)
+    norm_sq = np.empty(chains, dtype=dtype)
+    renormalized = 0
+    history = []
+    elapsed = 0.0
+    done = 0
+    while done < total_steps:
+        count = min(chunk, total_steps - done)
+        start = time.perf_counter()
+        for n in range(done + 1, done + count + 1):
+            np.einsum('ijn,jn->in', m, q, out=out)
+            q, out = out, q
+            if name == 'never':
+                continue
+            if name == 'periodic' and n % arg:
+                continue
+            np.einsum('in,in->n', q, q, out=norm_sq)
+            if name == 'approx':
+                q *= (3.0 - norm_sq) * 0.5
+                renormalized += chains
+            elif name == 'lazy':
+                off = np.abs(norm_sq - 1.0) > arg
+                if off.any():
+                    q[:, off] /= np.sqrt(norm_sq[off])
+                    renormalized += int(off.sum())
+            else:
+                q /= np.sqrt(norm_sq)
+                renormalized += chains
+        elapsed += time.perf_counter() - start
+        done += count
+        angle, norm_error = errors(q.T.astype(np.float64), exact_power(steps, done))
+        history.append((done, float(angle.max()), float(norm_error.max())))
+    return {
+        'policy': policy,
+        'compositions': chains * total_steps,
+        'seconds': elapsed,
+        'per_second': chains * total_steps / max(elapsed, 1e-12),
+        'renormalized': renormalized,
+        'max_angle_error': history[-1][1],
+        'max_norm_error': history[-1][2],
+        'history': history,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="quaternion drift and renormalization study")
+    parser.add_argument("--chains", type=int, default=10_000)
+    parser.add_argument("--steps", type=int, default=10_000,
+                        help="steps per chain, total compositions = chains * steps")
+    parser.add_argument("--chunk", type=int, default=1000, help="steps between drift measurements")
+    parser.add_argument("--policies", nargs="+", default=DEFAULT_POLICIES)
+    parser.add_argument("--dtype", choices=["float64", "float32"], default="float64")
+    parser.add_argument("--tolerance", type=float, default=1e-3,
+                        help="max rotation error in degrees a policy may reach to count as accurate")
+    parser.add_argument("--out", default=None, help="write per chunk drift history to this .csv")
+    args = parser.parse_args()
+
+    steps = step_quaternions(args.chains)
+    dtype = np.dtype(args.dtype)
+    print(f"{args.chains:,} chains x {args.steps:,} steps = {args.chains * args.steps:,} compositions ({dtype})")
+    print(f"{'policy':<16}{'compositions/s':>16}{'renormalized':>16}{'max angle err':>16}{'max |1-|q||':>14}")
+    results = []
+    for policy in args.policies:
+        result = integrate(steps, args.steps, policy, args.chunk, dtype)
+        results.append(result)
+        print(f"{policy:<16}{result['per_second']:>16,.0f}{result['renormalized']:>16,}"
+              f"{result['max_angle_error']:>15.3e}°{result['max_norm_error']:>14.3e}")
+
+    accurate = [r for r in results if r['max_angle_error'] <= args.tolerance and r['max_norm_error'] <= 1e-6]
+    if accurate:
+        best = max(accurate, key=lambda r: r['per_second'])
+        print(f"fastest accurate policy (< {args.tolerance}° and unit norm within 1e-6): {best['policy']}")
+    else:
+        print("no policy stayed within tolerance")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write("policy,steps,max_angle_error_deg,max_norm_error\n")
+            for result in results:
+                for done, angle, norm_error in result['history']:
+                    f.write(f"{result['policy']},{done},{angle:.6e},{norm_error:.6e}\n")
+        print(f"history: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,164 @@
+'''
+    gimbal ring geometry: torus meshes built with numpy, cached per
+    (radius, axis, segments) and uploaded once to vertex buffers.
+    a frame only sets each ring's rotation and issues one draw per ring.
+
+    axis names follow the original line loops:
+        'x' ring lies in the xy plane, 'y' in xz, 'z' in yz
+'''
+import ctypes
+import functools
+
 import numpy as np
 from OpenGL.GL import *
 
+# in-plane basis (e1, e2) and plane normal for each axis name
+RING_PLANES = {
+    'x': ((1, 0, 0), (0, 1, 0), (0, 0, 1)),
+    'y': ((1, 0, 0), (0, 0, 1), (0, 1, 0)),
+    'z': ((0, 1, 0), (0, 0, 1), (1, 0, 0)),
+}
+
+# (segments around the ring, sides around the tube), finest first
+RING_LODS = ((128, 16), (64, 12), (32, 8))
+
+# pos(3) + normal(3)
+RING_VERTEX_FLOATS = 6
+
+
 def create_ring_vertices(radius, axis='x', segments=64):
-    # make taurus
-    vertices = []
-    for i in range(segments):
-        angle = 2 * np.pi * i / segments
-        if axis == 'x':
-            x = radius * np.cos(angle)
-            y = radius * np.sin(angle)
-            z = 0
-        elif axis == 'y':
-            x = radius * np.cos(angle)
-            y = 0
-            z = radius * np.sin(angle)
-        elif axis == 'z':
-            x = 0
-            y = radius * np.cos(angle)
-            z = radius * np.sin(angle)
-
-        vertices.append([x, y, z])
-    
-    return vertices
\ No newline at end of file
+    # (segments, 3) points on the circle, used for line loops and picking
+    e1, e2, _ = (np.array(v, dtype=np.float32) for v in RING_PLANES[axis])
+    angles = np.linspace(0.0, 2 * np.pi, segments, endpoint=False)
+    return radius * (np.cos(angles)[:, None] * e1 + np.sin(angles)[:, None] * e2)
+
+
+@functools.lru_cache(maxsize=32)
+def torus_geometry(radius, axis='x', segments=64, sides=12, tube_radius=1.5):
+    '''
+        interleaved (segments*sides, 6) float32 vertices and (n,) uint32
+        triangle indices. cached, callers must not modify the arrays.
+    '''
+    e1, e2, normal = (np.array(v, dtype=np.float64) for v in RING_PLANES[axis])
+    u = np.linspace(0.0, 2 * np.pi, segments, endpoint=False)[:, None]
+    v = np.linspace(0.0, 2 * np.pi, sides, endpoint=False)[None, :]
+    # direction from the ring center line out to the tube surface
+    radial = np.cos(u)[..., None] * e1 + np.sin(u)[..., None] * e2
+    out = np.cos(v)[..., None] * radial + np.sin(v)[..., None] * normal
+    center = radius * radial
+    positions = center + tube_radius * out
+
+    vertices = np.empty((segments, sides, RING_VERTEX_FLOATS), dtype=np.float32)
+    vertices[..., :3] = positions
+    vertices[..., 3:] = out
+    vertices = vertices.reshape(-1, RING_VERTEX_FLOATS)
+
+    # two triangles per quad, both directions wrap around
+    s = np.arange(segments)[:, None]
+    t = np.arange(sides)[None, :]
+    s1 = (s + 1) % segments
+    t1 = (t + 1) % sides
+    a = s * sides + t
+    b = s1 * sides + t
+    c = s1 * sides + t1
+    d = s * sides + t1
+    indices = np.stack([a, b, c, a, c, d], axis=-1).astype(np.uint32).reshape(-1)
+
+    vertices.setflags(write=False)
+    indices.setflags(write=False)
+    return vertices, indices
+
+
+class RingMesh:
+    # one torus resident in a vbo/ebo pair, client arrays when buffers are missing
+    def __init__(self, vertices, indices):
+        self.vertices = vertices
+        self.indices = indices
+        self.count = len(indices)
+        self.vbo = None
+        self.ebo = None
+        if bool(glGenBuffers):
+            self.vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, vertices.nbytes, vertices, GL_STATIC_DRAW)
+            self.ebo = glGenBuffers(1)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, indices.nbytes, indices, GL_STATIC_DRAW)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def draw(self):
+        stride = RING_VERTEX_FLOATS * 4
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glEnableClientState(GL_NORMAL_ARRAY)
+        if self.vbo:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+            glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+            glNormalPointer(GL_FLOAT, stride, ctypes.c_void_p(3 * 4))
+            glDrawElements(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, ctypes.c_void_p(0))
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        else:
+            # raw addresses, a sliced array would be copied and freed before the draw
+            base = self.vertices.ctypes.data
+            glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(base))
+            glNormalPointer(GL_FLOAT, stride, ctypes.c_void_p(base + 3 * 4))
+            glDrawElements(GL_TRIANGLES, self.count, GL_UNSIGNED_INT, self.indices)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+
+    def vram_bytes(self):
+        return self.vertices.nbytes + self.indices.nbytes if self.vbo else 0
+
+    def release(self):
+        if self.vbo:
+            glDeleteBuffers(2, [self.vbo, self.ebo])
+        self.vbo = None
+        self.ebo = None
+
+
+class GimbalRings:
+    '''
+        gpu meshes for a set of rings. meshes are created on first use at
+        each level of detail and kept until release().
+        rings: list of (radius, axis)
+    '''
+    def __init__(self, rings, tube_radius=1.5, lods=RING_LODS):
+        self.rings = list(rings)
+        self.tube_radius = tube_radius
+        self.lods = lods
+        self.meshes = {}
+        self.lod = 0
+
+    def select_lod(self, camera_distance):
+        # the further the camera is relative to the rings, the fewer segments
+        ratio = camera_distance / max(radius for radius, _ in self.rings)
+        if ratio < 1.5:
+            self.lod = 0
+        elif ratio < 4.0:
+            self.lod = 1
+        else:
+            self.lod = len(self.lods) - 1
+        return self.lod
+
+    def mesh(self, index):
+        radius, axis = self.rings[index]
+        segments, sides = self.lods[self.lod]
+        key = (radius, axis, segments)
+        mesh = self.meshes.get(key)
+        if mesh is None:
+            mesh = RingMesh(*torus_geometry(radius, axis, segments, sides, self.tube_radius))
+            self.meshes[key] = mesh
+        return mesh
+
+    def draw(self, index):
+        self.mesh(index).draw()
+
+    def vram_bytes(self):
+        return sum(mesh.vram_bytes() for mesh in self.meshes.values())
+
+    def release(self):
+        for mesh in self.meshes.values():
+            mesh.release()
+        self.meshes = {}
@@ -0,0 +1,167 @@
+'''
+    headless gimbal lock analysis over dense yaw/pitch/roll grids
+    same composition as Window._render: R = Rz(yaw) Ry(pitch) Rx(roll)
+    no pygame or opengl needed.
+
+    usage:
+        python gimbal_sweep.py --steps 360 181 360 --out sweep.npy --workers 8
+'''
+import argparse
+import multiprocessing
+import os
+import time
+
+import numpy as np
+
+# one record per grid point, written straight into a .npy memmap
+RESULT_DTYPE = np.dtype([
+    ('sigma_min', 'f4'),    # smallest singular value of the jacobian
+    ('condition', 'f4'),    # sigma_max / sigma_min, inf at the singularity
+    ('distance', 'f4'),     # degrees of pitch away from the nearest +-90
+    ('rank', 'i1'),         # rank of the jacobian
+    ('lost_dof', 'i1'),     # 3 - rank
+])
+
+RANK_TOL = 1e-6
+
+
+def jacobians(yaw, pitch, roll, degrees=True):
+    '''
+        (N,3,3) maps [yaw', pitch', roll'] to the world angular velocity.
+        columns are the three gimbal axes in world space:
+        z, Rz(yaw) y, Rz(yaw) Ry(pitch) x. roll does not appear, the inner
+        ring axis only depends on the two outer rings.
+    '''
+    yaw = np.asarray(yaw, dtype=np.float64).reshape(-1)
+    pitch = np.asarray(pitch, dtype=np.float64).reshape(-1)
+    if degrees:
+        yaw = np.radians(yaw)
+        pitch = np.radians(pitch)
+    cy, sy = np.cos(yaw), np.sin(yaw)
+    cp, sp = np.cos(pitch), np.sin(pitch)
+    j = np.zeros((len(yaw), 3, 3))
+    j[:, 2, 0] = 1.0
+    j[:, 0, 1] = -sy
+    j[:, 1, 1] = cy
+    j[:, 0, 2] = cy * cp
+    j[:, 1, 2] = sy * cp
+    j[:, 2, 2] = -sp
+    return j
+
+
+def distance_to_singularity(pitch, degrees=True):
+    # degrees of pitch to the nearest +-90 (where roll and yaw axes line up)
+    pitch = np.asarray(pitch, dtype=np.float64)
+    if not degrees:
+        pitch = np.degrees(pitch)
+    return np.abs(pitch % 180.0 - 90.0)
+
+
+def singular_values(pitch, degrees=True):
+    '''
+        (N,3) singular values of jacobians(), largest first.
+        J^T J = [[1, 0, -sin p], [0, 1, 0], [-sin p, 0, 1]] for every yaw,
+        so they are sqrt(1 + |sin p|), 1, sqrt(1 - |sin p|) and no svd is needed
+    '''
+    pitch = np.asarray(pitch, dtype=np.float64).reshape(-1)
+    if degrees:
+        pitch = np.radians(pitch)
+    sp = np.abs(np.sin(pitch))
+    return np.stack([np.sqrt(1.0 + sp), np.ones_like(sp), np.sqrt(np.maximum(1.0 - sp, 0.0))], axis=1)
+
+
+def analyze(yaw, pitch, roll, degrees=True):
+    # vectorized per pose analysis, returns a RESULT_DTYPE array
+    s = singular_values(pitch, degrees)
+    out = np.empty(len(s), dtype=RESULT_DTYPE)
+    rank = (s > RANK_TOL * s[:, :1]).sum(axis=1)
+    out['sigma_min'] = s[:, 2]
+    with np.errstate(divide='ignore'):
+        out['condition'] = np.where(rank < 3, np.inf, s[:, 0] / s[:, 2])
+    out['distance'] = distance_to_singularity(np.asarray(pitch).reshape(-1), degrees)
+    out['rank'] = rank
+    out['lost_dof'] = 3 - rank
+    return out
+
+
+def grid_axes(steps, ranges):
+    return [np.linspace(lo, hi, n) for n, (lo, hi) in zip(steps, ranges)]
+
+
+def _run_chunk(job):
+    # worker: compute one flat range of the grid and write it to the memmap
+    out_path, axes, start, stop = job
+    shape = tuple(len(a) for a in axes)
+    yi, pi, ri = np.unravel_index(np.arange(start, stop), shape)
+    result = analyze(axes[0][yi], axes[1][pi], axes[2][ri])
+    out = np.load(out_path, mmap_mode='r+')
+    out.reshape(-1)[start:stop] = result
+    out.flush()
+    del out
+    return stop - start, int((result['lost_dof'] > 0).sum()), float(result['distance'].min())
+
+
+def sweep(out_path, steps, ranges=((-180, 180), (-180, 180), (-180, 180)),
+          chunk_size=1_000_000, workers=None):
+    '''
+        evaluate every point of the yaw x pitch x roll grid and store the
+        results in a (n_yaw, n_pitch, n_roll) .npy file of RESULT_DTYPE.
+        only one chunk per worker is in memory at a time.
+    '''
+    axes = grid_axes(steps, ranges)
+    shape = tuple(len(a) for a in axes)
+    total = int(np.prod(shape))
+    out = np.lib.format.open_memmap(out_path, mode='w+', dtype=RESULT_DTYPE, shape=shape)
+    del out
+
+    jobs = [(out_path, axes, start, min(start + chunk_size, total))
+            for start in range(0, total, chunk_size)]
+    workers = workers or os.cpu_count() or 1
+    done = 0
+    singular = 0
+    closest = float('inf')
+    start_time = time.perf_counter()
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        results = pool.imap_unordered(_run_chunk, jobs) if pool else map(_run_chunk, jobs)
+        for count, lost, dist in results:
+            done += count
+            singular += lost
+            closest = min(closest, dist)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start_time
+    return {
+        'points': done,
+        'singular_points': singular,
+        'closest_distance': closest,
+        'seconds': elapsed,
+        'points_per_second': done / elapsed if elapsed > 0 else float('inf'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="gimbal lock sweep over euler angle grids")
+    parser.add_argument("--steps", type=int, nargs=3, default=[361, 361, 361],
+                        metavar=("YAW", "PITCH", "ROLL"))
+    parser.add_argument("--yaw", type=float, nargs=2, default=[-180, 180])
+    parser.add_argument("--pitch", type=float, nargs=2, default=[-180, 180])
+    parser.add_argument("--roll", type=float, nargs=2, default=[-180, 180])
+    parser.add_argument("--chunk", type=int, default=1_000_000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--out", default="sweep.npy")
+    args = parser.parse_args()
+
+    stats = sweep(args.out, args.steps, (args.yaw, args.pitch, args.roll),
+                  chunk_size=args.chunk, workers=args.workers)
+    print(f"{stats['points']:,} poses in {stats['seconds']:.2f} s "
+          f"({stats['points_per_second']:,.0f} / s)")
+    print(f"singular poses: {stats['singular_points']:,}, "
+          f"closest distance to lock: {stats['closest_distance']:.3f} deg")
+    print(f"results: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
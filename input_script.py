@@ -0,0 +1,84 @@
+'''
+    per frame input recording and replay for Window
+
+    file format, json lines:
+        first line: header {"version": 2, "fps": 60, "frames": n or null}
+        then one line per frame: {"keys": [...], "actions": [...], "seconds": dt}
+    seconds is the wall clock time the live frame advanced the simulation by,
+    replay uses it so the orientation follows the recording exactly. version
+    1 scripts have no seconds, their frames advance by 1 / fps.
+    keys are the control names from window.CONTROL_KEYS ("left", "i", ...),
+    actions are lists like ["model", "rat"], ["quaternion_mode", true],
+    ["reset_object"], ["reset_camera"], ["seek", frame], ["pause", true],
+    ["keyframe", yaw, pitch, roll], ["path", "demo" or "clear"],
+    ["path_method", "slerp"], ["path_play", true],
+    ["render_mode", "on_demand" or "continuous"], ["quit"].
+    seek and pause drive trajectory playback.
+'''
+import json
+
+VERSION = 2
+# versions InputReplay still reads
+SUPPORTED_VERSIONS = (1, 2)
+
+
+class FrameInput:
+    def __init__(self, keys=(), actions=(), seconds=None):
+        self.keys = set(keys)
+        self.actions = [list(a) for a in actions]
+        # simulated time of the frame, None when the script did not record it
+        self.seconds = seconds
+
+    def to_json(self):
+        data = {'keys': sorted(self.keys), 'actions': self.actions}
+        if self.seconds is not None:
+            data['seconds'] = self.seconds
+        return data
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(data.get('keys', ()), data.get('actions', ()), data.get('seconds'))
+
+
+class InputRecorder:
+    def __init__(self, path, fps):
+        self.path = path
+        self.frames = 0
+        self._file = open(path, 'w')
+        self._file.write(json.dumps({'version': VERSION, 'fps': fps, 'frames': None}) + '\n')
+
+    def record(self, frame_input):
+        self._file.write(json.dumps(frame_input.to_json(), separators=(',', ':')) + '\n')
+        self.frames += 1
+
+    def close(self):
+        self._file.close()
+        print(f"recorded {self.frames} frames to {self.path}")
+
+
+class InputReplay:
+    # whole script is loaded up front so reading never shows up in timings
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'r') as f:
+            header = json.loads(f.readline())
+            if header.get('version') not in SUPPORTED_VERSIONS:
+                raise ValueError(f"{path}: unsupported input script version {header.get('version')}")
+            self.fps = header.get('fps', 60)
+            self.frames = [FrameInput.from_json(json.loads(line)) for line in f if line.strip()]
+        self.position = 0
+
+    def frame_seconds(self, frame):
+        # what a frame advances the simulation by, old scripts run at their fps
+        return frame.seconds if frame.seconds is not None else 1.0 / self.fps
+
+    def __len__(self):
+        return len(self.frames)
+
+    def done(self):
+        return self.position >= len(self.frames)
+
+    def next(self):
+        frame = self.frames[self.position]
+        self.position += 1
+        return frame
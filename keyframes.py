@@ -0,0 +1,249 @@
+'''
+    keyframe orientation paths, interpolated three ways:
+        euler   each of yaw / pitch / roll linearly between keys, what an
+                animation curve per gimbal ring does
+        slerp   great circle arcs on the unit quaternion sphere between keys,
+                constant angular speed within a segment
+        squad   spherical cubic through the keys (shoemake), slerp with
+                tangent continuity at the keys
+
+    keyframes are stored as arrays (times (K,), euler degrees (K,3), unit
+    quaternions (K,4) flipped onto one hemisphere) and everything that only
+    depends on the keys is tabled when they change: segment lengths, slerp
+    arc angles and the squad control quaternions. evaluate() then maps any
+    number of sample times to orientations in one vectorized call, no python
+    loop over samples or segments.
+
+    euler interpolation that passes near pitch +-90 swings the outer rings
+    around while the plane barely moves, compare() puts numbers on that.
+    usage:
+        python keyframes.py [--samples 4096]
+'''
+import argparse
+
+import numpy as np
+
+import rotations
+from gimbal_sweep import distance_to_singularity
+
+METHODS = ('euler', 'slerp', 'squad')
+
+# [yaw, pitch, roll] degrees, starts at the app's default pose and passes
+# close to pitch 90 twice
+DEMO_KEYFRAMES = (
+    (0.0, 0.0, 90.0),
+    (70.0, 85.0, 20.0),
+    (-60.0, 88.0, 150.0),
+    (40.0, -30.0, 60.0),
+    (0.0, 0.0, 90.0),
+)
+
+# arc angles below this are interpolated linearly, sin(theta) is too small to divide by
+SLERP_EPSILON = 1e-6
+
+
+def _log(q):
+    # (...,3) rotation vector part of log(q) for unit quaternions
+    imag = q[..., 1:]
+    norm = np.linalg.norm(imag, axis=-1, keepdims=True)
+    angle = np.arctan2(norm, q[..., :1])
+    return imag * np.where(norm > 1e-12, angle / np.where(norm > 1e-12, norm, 1.0), 1.0)
+
+
+def _exp(v):
+    # unit quaternion exp((0, v)) of (...,3) vectors
+    norm = np.linalg.norm(v, axis=-1, keepdims=True)
+    scale = np.where(norm > 1e-12, np.sin(norm) / np.where(norm > 1e-12, norm, 1.0), 1.0)
+    return np.concatenate([np.cos(norm), v * scale], axis=-1)
+
+
+def _conjugate(q):
+    return q * [1.0, -1.0, -1.0, -1.0]
+
+
+def _slerp(a, b, u, theta=None):
+    '''
+        (N,4) slerp from a to b at (N,) u, no hemisphere flip. theta is the
+        arc angle between a and b when it is already known
+    '''
+    if theta is None:
+        theta = np.arccos(np.clip(np.einsum('ij,ij->i', a, b), -1.0, 1.0))
+    sin_theta = np.sin(theta)
+    small = sin_theta < SLERP_EPSILON
+    safe = np.where(small, 1.0, sin_theta)
+    w1 = np.where(small, 1.0 - u, np.sin((1.0 - u) * theta) / safe)
+    w2 = np.where(small, u, np.sin(u * theta) / safe)
+    out = w1[:, None] * a + w2[:, None] * b
+    return out / np.linalg.norm(out, axis=1, keepdims=True)
+
+
+class KeyframePath:
+    '''
+        orientation keyframes and the interpolation tables derived from them.
+        euler: (K,3) [yaw, pitch, roll] degrees, times: (K,) increasing
+        seconds, evenly spaced seconds_per_key apart when left out
+    '''
+    def __init__(self, euler=(), times=None, seconds_per_key=2.0):
+        self.seconds_per_key = seconds_per_key
+        self.euler_keys = np.asarray(euler, dtype=np.float64).reshape(-1, 3)
+        if times is None:
+            times = np.arange(len(self.euler_keys)) * seconds_per_key
+        self.times = np.asarray(times, dtype=np.float64).reshape(-1)
+        if len(self.times) != len(self.euler_keys):
+            raise ValueError(f"{len(self.euler_keys)} keyframes but {len(self.times)} times")
+        if np.any(np.diff(self.times) <= 0.0):
+            raise ValueError("keyframe times have to increase")
+        # bumped whenever the keys change, traces and stats are cached against it
+        self.version = 0
+        self._cache = {}
+        self._build()
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def duration(self):
+        return float(self.times[-1]) if len(self.times) else 0.0
+
+    def add(self, yaw, pitch, roll, time=None):
+        if time is None:
+            time = self.duration + self.seconds_per_key if len(self.times) else 0.0
+        elif len(self.times) and time <= self.times[-1]:
+            raise ValueError("keyframes are added in time order")
+        self.times = np.append(self.times, time)
+        self.euler_keys = np.vstack([self.euler_keys, [yaw, pitch, roll]])
+        self._build()
+
+    def clear(self):
+        self.times = np.zeros(0)
+        self.euler_keys = np.zeros((0, 3))
+        self._build()
+
+    def _build(self):
+        self.version += 1
+        self._cache = {}
+        q = rotations.euler_to_quaternion(self.euler_keys, rotations.APP_SEQUENCE, degrees=True)
+        # q and -q are the same rotation, keep neighbours on one hemisphere so
+        # every segment takes the short way round
+        if len(q) > 1:
+            dots = np.einsum('ij,ij->i', q[1:], q[:-1])
+            q[1:] *= np.cumprod(np.where(dots < 0.0, -1.0, 1.0))[:, None]
+        self.quaternions = q
+        self.segment_seconds = np.diff(self.times)
+        self.theta = np.arccos(np.clip(np.einsum('ij,ij->i', q[1:], q[:-1]), -1.0, 1.0))
+        # squad control points s_i = q_i exp(-(log(q_i^-1 q_i+1) + log(q_i^-1 q_i-1)) / 4),
+        # the end keys are their own control points
+        s = q.copy()
+        if len(q) > 2:
+            inverse = _conjugate(q[1:-1])
+            tangent = (_log(rotations.multiply(inverse, q[2:]))
+                       + _log(rotations.multiply(inverse, q[:-2])))
+            s[1:-1] = rotations.multiply(q[1:-1], _exp(-0.25 * tangent))
+        self.controls = s
+        self.control_theta = np.arccos(np.clip(np.einsum('ij,ij->i', s[1:], s[:-1]), -1.0, 1.0))
+
+    def _segments(self, t):
+        # segment index and 0..1 position within it for (N,) times, clamped to the path
+        t = np.asarray(t, dtype=np.float64).reshape(-1)
+        segment = np.clip(np.searchsorted(self.times, t, side='right') - 1, 0, len(self.times) - 2)
+        u = np.clip((t - self.times[segment]) / self.segment_seconds[segment], 0.0, 1.0)
+        return segment, u
+
+    def evaluate(self, t, method='slerp'):
+        # (N,4) unit quaternions at (N,) times
+        if method not in METHODS:
+            raise ValueError(f"unknown interpolation {method!r}, expected one of {', '.join(METHODS)}")
+        if len(self.times) == 0:
+            raise ValueError("path has no keyframes")
+        n = np.size(t)
+        if len(self.times) == 1:
+            return np.repeat(self.quaternions, n, axis=0)
+        if method == 'euler':
+            return rotations.euler_to_quaternion(self.euler(t, 'euler'), rotations.APP_SEQUENCE, degrees=True)
+        segment, u = self._segments(t)
+        q = self.quaternions
+        arc = _slerp(q[segment], q[segment + 1], u, self.theta[segment])
+        if method == 'slerp':
+            return arc
+        s = self.controls
+        control = _slerp(s[segment], s[segment + 1], u, self.control_theta[segment])
+        return _slerp(arc, control, 2.0 * u * (1.0 - u))
+
+    def euler(self, t, method='euler'):
+        # (N,3) [yaw, pitch, roll] degrees at (N,) times
+        if method != 'euler':
+            return rotations.quaternion_to_euler(self.evaluate(t, method), rotations.APP_SEQUENCE, degrees=True)
+        if len(self.times) == 1:
+            return np.repeat(self.euler_keys, np.size(t), axis=0)
+        segment, u = self._segments(t)
+        keys = self.euler_keys
+        return keys[segment] + u[:, None] * (keys[segment + 1] - keys[segment])
+
+    def trace(self, method, samples=1024, radius=1.0, axis=(1.0, 0.0, 0.0)):
+        '''
+            (samples,3) float32 points swept by the body axis scaled to radius
+            over the whole path, the plane's nose for the default x axis.
+            cached until the keys change
+        '''
+        key = ('trace', method, samples, radius, tuple(axis))
+        points = self._cache.get(key)
+        if points is None:
+            t = np.linspace(0.0, self.duration, samples)
+            m = rotations.quaternion_to_matrix(self.evaluate(t, method))
+            points = np.ascontiguousarray(radius * (m @ np.asarray(axis, dtype=np.float64)), dtype=np.float32)
+            self._cache[key] = points
+        return points
+
+    def compare(self, samples=4096):
+        '''
+            per method: degrees of rotation travelled and the worst peak over
+            mean angular speed within a segment (1.0 is constant speed, what
+            slerp gives). for euler also the closest the interpolated pitch
+            comes to gimbal lock, nan for the quaternion methods, which never
+            go through the angles. cached until the keys change
+        '''
+        key = ('compare', samples)
+        if key in self._cache:
+            return self._cache[key]
+        t = np.linspace(0.0, self.duration, samples)
+        segment = self._segments(t)[0]
+        # steps across a key mix two segments' speeds, leave them out of the rates
+        inside = segment[1:] == segment[:-1]
+        segment = segment[:-1][inside]
+        count = len(self.times) - 1
+        out = {}
+        for method in METHODS:
+            q = self.evaluate(t, method)
+            # angle of each step from the relative rotation, atan2 is exact for small steps
+            relative = rotations.multiply(_conjugate(q[:-1]), q[1:])
+            steps = 2.0 * np.degrees(np.arctan2(np.linalg.norm(relative[:, 1:], axis=1), np.abs(relative[:, 0])))
+            peak = np.zeros(count)
+            np.maximum.at(peak, segment, steps[inside])
+            mean = np.bincount(segment, steps[inside], count) / np.maximum(np.bincount(segment, minlength=count), 1)
+            moving = mean > 1e-9
+            lock = np.nan
+            if method == 'euler':
+                lock = float(distance_to_singularity(self.euler(t, method)[:, 1]).min())
+            out[method] = {
+                'rotation': float(steps.sum()),
+                'peak_rate': float((peak[moving] / mean[moving]).max()) if moving.any() else 1.0,
+                'lock_distance': lock,
+            }
+        self._cache[key] = out
+        return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="compare euler, slerp and squad over a keyframe path")
+    parser.add_argument("--samples", type=int, default=4096)
+    args = parser.parse_args()
+    path = KeyframePath(DEMO_KEYFRAMES)
+    print(f"{len(path)} keyframes over {path.duration:.1f} s, {args.samples} samples")
+    print(f"{'method':<8}{'rotation (deg)':>16}{'peak / mean speed':>20}{'lock distance':>16}")
+    for method, stats in path.compare(args.samples).items():
+        lock = "-" if np.isnan(stats['lock_distance']) else f"{stats['lock_distance']:.2f}"
+        print(f"{method:<8}{stats['rotation']:>16.1f}{stats['peak_rate']:>20.2f}{lock:>16}")
+
+
+if __name__ == "__main__":
+    main()
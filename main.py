@@ -1,8 +1,58 @@
+import argparse
+import os
 import traceback
 import sys
-from window import Window
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="gimbal lock simulator")
+    parser.add_argument("--headless", action="store_true",
+                        help="render offscreen with no window (no gpu or display needed)")
+    parser.add_argument("--platform", choices=["egl", "osmesa"], default="egl",
+                        help="headless gl platform, osmesa is pure software")
+    parser.add_argument("--frames", type=int, default=None,
+                        help="number of frames to render (headless default 60, replay default all)")
+    parser.add_argument("--output", default=None,
+                        help="directory to write headless frames to")
+    parser.add_argument("--format", choices=["png", "raw"], default="png",
+                        help="png sequence or raw rgba video")
+    parser.add_argument("--record", default=None,
+                        help="write every frame's input to this script file")
+    parser.add_argument("--replay", default=None,
+                        help="drive the session from a recorded input script, uncapped")
+    parser.add_argument("--profile", action="store_true",
+                        help="time each part of the frame from the start")
+    parser.add_argument("--profile-out", default=None,
+                        help="write per frame timings here on exit (.csv or .json)")
+    parser.add_argument("--instances", type=int, default=0,
+                        help="draw this many instanced copies of the model, half euler, half quaternion")
+    parser.add_argument("--sim-rate", type=float, default=60.0,
+                        help="simulation steps per second, independent of the frame rate")
+    parser.add_argument("--texture-size", type=int, default=2048,
+                        help="downscale textures larger than this")
+    parser.add_argument("--mipmaps", choices=["offline", "gpu", "none"], default="offline",
+                        help="build mip levels on the cpu (cached), with glGenerateMipmap, or not at all")
+    parser.add_argument("--compress-textures", action="store_true",
+                        help="let the driver store textures in a compressed format")
+    parser.add_argument("--obj", default=None,
+                        help="also load this obj file and show it, large files stream in")
+    parser.add_argument("--trajectory-out", default=None,
+                        help="write each frame's orientation and camera to this trajectory file")
+    parser.add_argument("--trajectory", default=None,
+                        help="play back a trajectory file instead of simulating (headless default all frames)")
+    parser.add_argument("--continuous", action="store_true",
+                        help="redraw every frame instead of only when something changed")
+    return parser.parse_args()
 
 def main():
+    args = parse_args()
+    if args.headless:
+        # has to be set before anything imports OpenGL.GL
+        os.environ["PYOPENGL_PLATFORM"] = args.platform
+        if args.platform == "egl":
+            # lets mesa use llvmpipe when there is no gpu or display
+            os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+    from window import Window
+
     print("init window")
     # CONFIGURATION
     WIN_WIDTH = 1280
@@ -13,9 +63,28 @@ def main():
         width=WIN_WIDTH,
         height=WIN_HEIGHT,
         title=WINDOW_TITLE,
+        headless=args.headless,
+        output_dir=args.output,
+        output_format=args.format,
+        frames=args.frames if (args.frames or not args.headless or args.replay or args.trajectory) else 60,
+        record_path=args.record,
+        replay_path=args.replay,
+        profile=args.profile or bool(args.profile_out),
+        profile_path=args.profile_out,
+        instances=args.instances,
+        sim_rate=args.sim_rate,
+        texture_options={
+            'max_size': args.texture_size,
+            'mipmaps': args.mipmaps,
+            'compress': args.compress_textures,
+        },
+        model_path=args.obj,
+        trajectory_out=args.trajectory_out,
+        trajectory_in=args.trajectory,
+        continuous=args.continuous,
     )
     print("run window")
     window.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,160 @@
+'''
+    on disk cache of parsed meshes
+    one file per source obj:
+        4 bytes   magic 'GLMC'
+        4 bytes   format version (uint32 little endian)
+        4 bytes   header length (uint32 little endian)
+        header    utf-8 json: source signature, array table, material
+        arrays    raw little endian data, each aligned to 64 bytes
+    arrays are opened with numpy.memmap so a cache hit only pages data in
+'''
+import hashlib
+import json
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b'GLMC'
+VERSION = 1
+ALIGN = 64
+
+
+class MeshCache:
+    def __init__(self, cache_dir="./.mesh_cache", max_bytes=256 * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _entry_path(self, obj_filepath):
+        name = hashlib.sha1(os.path.abspath(obj_filepath).encode('utf-8')).hexdigest()[:20]
+        return os.path.join(self.cache_dir, name + '.mesh')
+
+    def signature(self, *filepaths):
+        # (path, size, mtime) of every source file, missing files count too
+        sig = []
+        for path in filepaths:
+            if path and os.path.exists(path):
+                st = os.stat(path)
+                sig.append([os.path.abspath(path), st.st_size, st.st_mtime_ns])
+            else:
+                sig.append([path, None, None])
+        return sig
+
+    def load(self, obj_filepath, signature):
+        '''
+            returns (arrays, meta) on a hit, None on a miss
+            stale entries (source size or mtime changed) are deleted
+        '''
+        path = self._entry_path(obj_filepath)
+        try:
+            with open(path, 'rb') as f:
+                magic, version, header_len = struct.unpack('<4sII', f.read(12))
+                if magic != MAGIC or version != VERSION:
+                    raise ValueError("bad cache header")
+                header = json.loads(f.read(header_len).decode('utf-8'))
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except (ValueError, struct.error, UnicodeDecodeError):
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        if header['signature'] != signature:
+            # source changed since this entry was written
+            self._remove(path)
+            self.misses += 1
+            return None
+
+        arrays = {}
+        for name, info in header['arrays'].items():
+            if info is None:
+                arrays[name] = None
+                continue
+            shape = tuple(info['shape'])
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.zeros(shape, dtype=info['dtype'])
+            else:
+                arrays[name] = np.memmap(path, dtype=info['dtype'], mode='r',
+                                         offset=info['offset'], shape=shape)
+        # bump recency for lru eviction
+        os.utime(path)
+        self.hits += 1
+        return arrays, header['meta']
+
+    def store(self, obj_filepath, signature, arrays, meta):
+        path = self._entry_path(obj_filepath)
+        table = {}
+        blobs = []
+        offset = 0
+        for name, array in arrays.items():
+            if array is None:
+                table[name] = None
+                continue
+            array = np.ascontiguousarray(array)
+            array = array.astype(array.dtype.newbyteorder('<'), copy=False)
+            table[name] = {
+                'dtype': array.dtype.str,
+                'shape': list(array.shape),
+                'offset': offset,
+            }
+            blobs.append((offset, array))
+            offset += _aligned(array.nbytes)
+
+        # offsets are relative to the data section until the header size is known
+        data_start = 0
+        while True:
+            shifted = {name: None if info is None else dict(info, offset=info['offset'] + data_start)
+                       for name, info in table.items()}
+            header = {'signature': signature, 'arrays': shifted, 'meta': meta}
+            header_bytes = json.dumps(header).encode('utf-8')
+            if 12 + len(header_bytes) <= data_start:
+                break
+            data_start = _aligned(12 + len(header_bytes))
+        header_bytes += b' ' * (data_start - 12 - len(header_bytes))
+
+        # write to a temp file then rename, readers never see a half written entry
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(struct.pack('<4sII', MAGIC, VERSION, len(header_bytes)))
+            f.write(header_bytes)
+            for rel_offset, array in blobs:
+                f.seek(data_start + rel_offset)
+                f.write(array.tobytes())
+            f.truncate(data_start + offset)
+        os.replace(tmp_path, path)
+        self._evict(keep=path)
+
+    def _evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith('.mesh'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        # least recently used first
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if path == keep:
+                continue
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses}
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
@@ -0,0 +1,261 @@
+'''
+    mesh preprocessing for ModelLoader draw arrays: post-transform vertex
+    cache ordering (tipsify), vertex fetch ordering, ACMR measurement and a
+    chain of decimated levels of detail by vertex clustering.
+    results are stored with the mesh in the mesh cache, so the python loops
+    here only run once per source file.
+
+    cost, on a worker before the first draw of an uncached mesh, once per
+    material: tipsify and acmr are per triangle python loops, about 7 us a
+    triangle for the ordering and 3 us for each acmr pass. the lod search
+    runs cluster_decimate ~8 times per level in numpy. optimize() takes
+    about 3 s on a 180k triangle grid. above CACHE_OPTIMIZE_MAX_TRIANGLES
+    the cache ordering and acmr are skipped (mesh_stats cache_optimized
+    False), fetch ordering and lods still run, about 0.6 s per 100k triangles.
+
+    offline report:
+        python mesh_optimize.py assets/lowpolyplane.obj
+'''
+import sys
+
+import numpy as np
+
+# fifo size the orderings are tuned for and measured with, typical of gpus
+CACHE_SIZE = 16
+
+# triangle budget of each level relative to the full mesh, each level costs
+# a binary search of cluster_decimate calls over the full mesh
+LOD_RATIOS = (0.5, 0.25, 0.1)
+
+# sub-meshes with more triangles keep their file order, tipsify and acmr
+# would take seconds per 100k triangles
+CACHE_OPTIMIZE_MAX_TRIANGLES = 200_000
+
+# bounding radius / camera distance below which each coarser level is used.
+# with the 90 degree fov that is the fraction of half the screen height
+LOD_COVERAGE = (0.25, 0.1, 0.04)
+
+
+def acmr(indices, cache_size=CACHE_SIZE):
+    # average cache miss ratio, vertex shader runs per triangle with a fifo cache
+    indices = np.asarray(indices).reshape(-1)
+    if len(indices) < 3:
+        return 0.0
+    # a vertex is cached if it was loaded within the last cache_size misses
+    loaded_at = {}
+    misses = 0
+    for v in indices.tolist():
+        at = loaded_at.get(v)
+        if at is None or misses - at >= cache_size:
+            loaded_at[v] = misses
+            misses += 1
+    return misses / (len(indices) // 3)
+
+
+def _vertex_triangles(tris, vertex_count):
+    # csr adjacency, triangles using each vertex
+    flat = tris.reshape(-1)
+    order = np.argsort(flat, kind='stable')
+    counts = np.bincount(flat, minlength=vertex_count)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    return (order // 3).tolist(), offsets.tolist(), counts.tolist()
+
+
+def optimize_vertex_cache(indices, vertex_count, cache_size=CACHE_SIZE):
+    '''
+        reorder triangles for the post-transform cache, tipsify
+        (Sander, Nehab, Barczak 2007): fan around a vertex, then move to the
+        neighbour that is still in the cache and has the most work left
+    '''
+    indices = np.asarray(indices, dtype=np.uint32).reshape(-1)
+    tris = indices.reshape(-1, 3)
+    if len(tris) == 0:
+        return indices
+    adjacency, offsets, live = _vertex_triangles(tris, vertex_count)
+    tri_list = tris.tolist()
+    stamp = [0] * vertex_count
+    emitted = [False] * len(tri_list)
+    out = []
+    dead_end = []
+    time = cache_size + 1
+    cursor = 0
+    fan = int(tris[0, 0])
+    while fan >= 0:
+        candidates = []
+        for t in adjacency[offsets[fan]:offsets[fan + 1]]:
+            if emitted[t]:
+                continue
+            emitted[t] = True
+            out.append(t)
+            for v in tri_list[t]:
+                dead_end.append(v)
+                candidates.append(v)
+                live[v] -= 1
+                if time - stamp[v] > cache_size:
+                    stamp[v] = time
+                    time += 1
+
+        # best candidate that will still be in the cache after its fan
+        fan = -1
+        best = -1
+        for v in candidates:
+            if live[v] > 0:
+                priority = 0
+                if time - stamp[v] + 2 * live[v] <= cache_size:
+                    priority = time - stamp[v]
+                if priority > best:
+                    best = priority
+                    fan = v
+        if fan < 0:
+            # recently used vertices with work left, then any vertex at all
+            while dead_end:
+                v = dead_end.pop()
+                if live[v] > 0:
+                    fan = v
+                    break
+            else:
+                while cursor < vertex_count:
+                    if live[cursor] > 0:
+                        fan = cursor
+                        break
+                    cursor += 1
+    return tris[np.array(out, dtype=np.int64)].reshape(-1)
+
+
+def optimize_vertex_fetch(vertices, indices):
+    # renumber vertices in order of first use, unused vertices are dropped
+    used, first = np.unique(indices, return_index=True)
+    order = used[np.argsort(first)]
+    remap = np.empty(len(vertices), dtype=np.uint32)
+    remap[order] = np.arange(len(order), dtype=np.uint32)
+    return vertices[order], remap[indices]
+
+
+def cluster_decimate(vertices, indices, resolution):
+    '''
+        vertex clustering: snap positions to a resolution^3 grid over the
+        bounds, every cell keeps one of its vertices (with its uv and normal),
+        collapsed and duplicate triangles are dropped
+    '''
+    positions = vertices[:, :3]
+    mins = positions.min(axis=0)
+    extent = np.maximum(positions.max(axis=0) - mins, 1e-9)
+    cells = np.minimum(((positions - mins) / extent * resolution).astype(np.int64), resolution - 1)
+    # one int64 key per cell, unique over rows (axis=0) is several times slower
+    keys = (cells[:, 0] * resolution + cells[:, 1]) * resolution + cells[:, 2]
+    _, first, cell_of = np.unique(keys, return_index=True, return_inverse=True)
+    cell_of = cell_of.reshape(-1)
+    tris = cell_of[indices.reshape(-1, 3)]
+    keep = (tris[:, 0] != tris[:, 1]) & (tris[:, 1] != tris[:, 2]) & (tris[:, 0] != tris[:, 2])
+    tris = tris[keep]
+    # the same cell triangle can come from several source triangles
+    corners = np.sort(tris, axis=1)
+    count = len(first)
+    if count < 2 ** 21:
+        # three cell ids below 2^21 pack into one int64
+        _, unique_rows = np.unique((corners[:, 0] * count + corners[:, 1]) * count + corners[:, 2],
+                                   return_index=True)
+    else:
+        _, unique_rows = np.unique(corners, axis=0, return_index=True)
+    tris = tris[np.sort(unique_rows)]
+    return optimize_vertex_fetch(vertices[first], tris.reshape(-1).astype(np.uint32))
+
+
+def build_lods(vertices, indices, ratios=LOD_RATIOS, cache_size=CACHE_SIZE, cache_order=True):
+    '''
+        list of (vertices, indices) for each ratio of the triangle count,
+        each cache (unless cache_order is False) and fetch optimized. levels
+        that cannot get smaller than the previous one are left out.
+    '''
+    lods = []
+    target_tris = len(indices) // 3
+    previous = target_tris
+    for ratio in ratios:
+        target = max(int(target_tris * ratio), 1)
+        # coarsest grid that still keeps at least the target triangle count
+        lo, hi = 2, 256
+        best = None
+        while lo <= hi:
+            resolution = (lo + hi) // 2
+            lod_vertices, lod_indices = cluster_decimate(vertices, indices, resolution)
+            if len(lod_indices) // 3 >= target:
+                best = (lod_vertices, lod_indices)
+                hi = resolution - 1
+            else:
+                lo = resolution + 1
+        if best is None or len(best[1]) // 3 >= previous or len(best[1]) == 0:
+            continue
+        lod_vertices, lod_indices = best
+        if cache_order:
+            lod_indices = optimize_vertex_cache(lod_indices, len(lod_vertices), cache_size)
+        lod_vertices, lod_indices = optimize_vertex_fetch(lod_vertices, lod_indices)
+        lods.append((lod_vertices, lod_indices))
+        previous = len(lod_indices) // 3
+    return lods
+
+
+def optimize(vertices, indices, ratios=LOD_RATIOS, cache_size=CACHE_SIZE,
+             max_cache_triangles=CACHE_OPTIMIZE_MAX_TRIANGLES):
+    '''
+        full pipeline for welded draw arrays. returns (vertices, indices,
+        lod_ranges, stats): every level packed into one vertex and index
+        array, lod_ranges[i] = (first index, index count), finest first.
+        above max_cache_triangles the triangle order is kept and the acmr
+        stats are None
+    '''
+    cache_order = len(indices) // 3 <= max_cache_triangles
+    before = after = None
+    if cache_order:
+        before = acmr(indices, cache_size)
+        indices = optimize_vertex_cache(indices, len(vertices), cache_size)
+    vertices, indices = optimize_vertex_fetch(vertices, indices)
+    if cache_order:
+        after = acmr(indices, cache_size)
+    levels = [(vertices, indices)] + build_lods(vertices, indices, ratios, cache_size, cache_order)
+
+    packed_vertices = []
+    packed_indices = []
+    lod_ranges = []
+    base = 0
+    first = 0
+    for level_vertices, level_indices in levels:
+        packed_vertices.append(level_vertices)
+        packed_indices.append(level_indices.astype(np.uint32) + np.uint32(base))
+        lod_ranges.append((first, len(level_indices)))
+        base += len(level_vertices)
+        first += len(level_indices)
+    stats = {
+        'acmr_before': before,
+        'acmr_after': after,
+        'cache_optimized': cache_order,
+        'cache_size': cache_size,
+        'lod_triangles': [count // 3 for _, count in lod_ranges],
+    }
+    return (np.concatenate(packed_vertices), np.concatenate(packed_indices), lod_ranges, stats)
+
+
+def select_lod(radius, camera_distance, lod_count):
+    # level for how large the model is on screen, bounding radius over distance
+    coverage = radius / max(camera_distance, 1e-6)
+    for level, threshold in enumerate(LOD_COVERAGE[:lod_count - 1]):
+        if coverage >= threshold:
+            return level
+    return lod_count - 1
+
+
+def main():
+    from model_loader import ModelLoader
+    for path in sys.argv[1:]:
+        model = ModelLoader([path, None, None], load=False)
+        model.prepare()
+        stats = model.mesh_stats
+        print(f"{path}: {len(model.faces)} triangles")
+        if stats.get('cache_optimized', True):
+            print(f"  acmr (fifo {stats['cache_size']}): {stats['acmr_before']:.3f} -> {stats['acmr_after']:.3f}")
+        else:
+            print(f"  cache ordering skipped, a sub-mesh is over {CACHE_OPTIMIZE_MAX_TRIANGLES} triangles")
+        print(f"  lod triangles: {stats['lod_triangles']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,63 +1,259 @@
 from OpenGL.GL import *
-from PIL import Image
+import numpy as np
 
+import ctypes
 import os
 import sys
+import time
 
+from obj_parser import parse_obj
+from mesh_cache import MeshCache
+import mesh_optimize
+from normals import fill_missing_normals
+from texture import decode_texture, upload_texture, MAX_TEXTURE_SIZE
 
-class ModelLoader:
+# floats per interleaved vertex: position(3) uv(2) normal(3)
+VERTEX_FLOATS = 8
+
+# bumped when the cached draw arrays change meaning, old entries are rebuilt
+MESH_FORMAT = 4
+
+# material used by faces without a usemtl, or by every face when there is no mtl
+DEFAULT_MATERIAL = ''
+
+# base color of untextured faces when a model has a single material
+UNTEXTURED_COLOR = (0.6, 0.7, 0.8)
+
+
+def default_material():
+    return {
+        'diffuse': [0.8, 0.8, 0.8, 1.0],
+        'ambient': [0.2,0.2,0.2,1.0],
+        'specular': [0.0,0.0,0.0,1.0],
+        'shininess': 0.0,
+        'diffuse_map': None,
+    }
+
+
+class DrawStats:
+    '''
+        draw calls and state changes (material or texture switches) issued
+        by the renderers, counted per frame. last_* hold the finished frame
+    '''
     def __init__(self):
-        self.vertices = []
-        self.faces = []
-        self.normals = []
-        self.tex_coords = []
+        self.draw_calls = 0
+        self.state_changes = 0
+        self.last_draw_calls = 0
+        self.last_state_changes = 0
+
+    def new_frame(self):
+        self.last_draw_calls = self.draw_calls
+        self.last_state_changes = self.state_changes
+        self.draw_calls = 0
+        self.state_changes = 0
+
+
+class ModelLoader:
+    def __init__(self, config=None, mesh_cache=None, load=True, texture_options=None):
+        self.vertices = np.zeros((0, 3), dtype=np.float32)
+        self.faces = np.zeros((0, 3), dtype=np.int32)
+        self.normals = np.zeros((0, 3), dtype=np.float32)
+        self.tex_coords = np.zeros((0, 2), dtype=np.float32)
+        self.face_texcoords = None
+        self.face_normals = None
+        self.material_names = []
+        self.face_materials = None
+        self.group_names = []
+        self.face_groups = None
+        self.draw_vertices = np.zeros((0, VERTEX_FLOATS), dtype=np.float32)
+        self.draw_indices = np.zeros(0, dtype=np.uint32)
+        self.draw_has_uvs = False
+        self.draw_has_normals = False
+        # one per material, {'material': name, 'lod_ranges': [(first index, index count), ...]}
+        # finest level first. sorted by diffuse map so draws sharing a texture are adjacent
+        self.submeshes = []
+        self.lod = 0
+        self.radius = 1.0
+        self.mesh_stats = None
+        self._immediate_corners = None
         self.has_model = False
-        self.texture_id = None
+        # diffuse map path -> gl texture, texture is the first one for display
+        self.texture_ids = {}
+        self.texture_bytes = 0
+        self.texture = None
+        # max_size, mipmaps ('offline', 'gpu', 'none') and compress, see texture.py
+        self.texture_options = {'max_size': MAX_TEXTURE_SIZE, 'mipmaps': 'offline', 'compress': False}
+        self.texture_options.update(texture_options or {})
+        # gpu buffers, immediate mode is used when they are unavailable
+        self.use_buffers = True
+        self.vbo = None
+        self.ebo = None
+        self.vao = None
+        self.last_submit_ms = 0.0
+        self.avg_submit_ms = 0.0
+        # set by prepare(), read by the render thread to show progress
+        self.load_stage = "queued"
+        self.load_progress = 0.0
+        # diffuse map path -> TextureData decoded by prepare(), uploaded by upload()
+        self._pending_images = {}
+        # parsed meshes are reused across set_config calls and runs
+        self.mesh_cache = mesh_cache if mesh_cache is not None else MeshCache()
 
         self.obj_filepath = "./assets/lowpolyplane.obj"
         self.mtl_filepath = "./assets/airplane.mtl"
         self.diffuse_filepath = "./assets/textures/diffuse.tga"
+        if config is not None:
+            self.obj_filepath = config[0]
+            self.mtl_filepath = config[1]
+            self.diffuse_filepath = config[2]
 
-        self.material = {
-            'diffuse': [0.8, 0.8, 0.8, 1.0],
-            'ambient': [0.2,0.2,0.2,1.0],
-            'specular': [0.0,0.0,0.0,1.0],
-            'shininess': 0.0
-        }
+        # name -> material from the mtl, material is the first one
+        self.materials = {}
+        self.material = default_material()
 
-        self._load_model()
+        if load:
+            self._load_model()
 
     def _clear_model(self):
-        self.vertices = []
-        self.faces = []
-        self.normals = []
-        self.tex_coords = []
+        self.vertices = np.zeros((0, 3), dtype=np.float32)
+        self.faces = np.zeros((0, 3), dtype=np.int32)
+        self.normals = np.zeros((0, 3), dtype=np.float32)
+        self.tex_coords = np.zeros((0, 2), dtype=np.float32)
+        self.face_texcoords = None
+        self.face_normals = None
+        self.material_names = []
+        self.face_materials = None
+        self.group_names = []
+        self.face_groups = None
+        self.release()
+        self.draw_vertices = np.zeros((0, VERTEX_FLOATS), dtype=np.float32)
+        self.draw_indices = np.zeros(0, dtype=np.uint32)
+        self.draw_has_uvs = False
+        self.draw_has_normals = False
+        self.submeshes = []
+        self.lod = 0
+        self.radius = 1.0
+        self.mesh_stats = None
+        self._immediate_corners = None
+        self._pending_images = {}
         self.has_model = False
-        self.texture_id = None
-        self.material = {
-            'diffuse': [0.8, 0.8, 0.8, 1.0],
-            'ambient': [0.2,0.2,0.2,1.0],
-            'specular': [0.0,0.0,0.0,1.0],
-            'shininess': 0.0
-        }
+        self.materials = {}
+        self.material = default_material()
 
     def _load_model(self):
-        if (self.obj_filepath and os.path.exists(self.obj_filepath)):
+        try:
+            self.prepare()
+        except FileNotFoundError:
+            print(f"{self.obj_filepath}: Model not found")
+            print(f"Exiting")
+            sys.exit()
+        self.upload()
+
+    def _set_stage(self, stage, progress):
+        self.load_stage = stage
+        self.load_progress = progress
+
+    def prepare(self):
+        '''
+            cpu side of loading, no gl calls so it can run on a worker thread
+            parse obj / mtl (or hit the mesh cache), make uvs, build and
+            optimize the interleaved draw arrays and decode the textures
+        '''
+        if not (self.obj_filepath and os.path.exists(self.obj_filepath)):
+            raise FileNotFoundError(self.obj_filepath)
+        has_mtl = self.mtl_filepath and os.path.exists(self.mtl_filepath)
+        signature = self.mesh_cache.signature(self.obj_filepath,
+                                              self.mtl_filepath,
+                                              self.diffuse_filepath)
+        signature.append(['format', MESH_FORMAT])
+        self._set_stage("parsing", 0.0)
+        if not self._load_cached(signature):
             self._load_obj()
 
-            if not self.tex_coords:
+            self._set_stage("normals", 0.2)
+            self._generate_normals()
+
+            self._set_stage("uvs", 0.3)
+            if self.face_texcoords is None:
                 self._generate_uvs()
 
-            if (self.mtl_filepath and os.path.exists(self.mtl_filepath)):
-                self._load_mtl()
-            elif (self.diffuse_filepath and os.path.exists(self.diffuse_filepath)):
-                self._load_texture()
-            print(f"Loaded: {self.obj_filepath}")
-            self.has_model = True
-        else:
-            print(f"{self.obj_filepath}: Model not found")
-            print(f"Exiting")
-            sys.exit()
+            self._set_stage("material", 0.4)
+            self._load_materials(has_mtl)
+            self._set_stage("vertex data", 0.5)
+            self._build_draw_arrays()
+            self._store_cached(signature)
+        self._set_bounds()
+
+        self._set_stage("texture", 0.8)
+        self._decode_textures()
+        self._set_stage("upload", 0.9)
+
+    def upload(self):
+        # gl side of loading, must run on the thread that owns the context
+        if self._pending_images:
+            self._upload_textures()
+        if self.use_buffers:
+            self._upload_buffers()
+        print(f"Loaded: {self.obj_filepath}")
+        self.has_model = True
+        self._set_stage("done", 1.0)
+
+    def _load_cached(self, signature):
+        cached = self.mesh_cache.load(self.obj_filepath, signature)
+        if cached is None:
+            return False
+        arrays, meta = cached
+        self.vertices = arrays['vertices']
+        self.tex_coords = arrays['tex_coords']
+        self.normals = arrays['normals']
+        self.faces = arrays['faces']
+        self.face_texcoords = arrays['face_texcoords']
+        self.face_normals = arrays['face_normals']
+        self.face_materials = arrays['face_materials']
+        self.face_groups = arrays['face_groups']
+        self.draw_vertices = arrays['draw_vertices']
+        self.draw_indices = arrays['draw_indices']
+        self.material_names = meta['material_names']
+        self.group_names = meta['group_names']
+        self.materials = meta['materials']
+        self.material = next(iter(self.materials.values()))
+        self.draw_has_uvs = meta['draw_has_uvs']
+        self.draw_has_normals = meta['draw_has_normals']
+        self.submeshes = [{'material': submesh['material'],
+                           'lod_ranges': [tuple(r) for r in submesh['lod_ranges']]}
+                          for submesh in meta['submeshes']]
+        self.mesh_stats = meta['mesh_stats']
+        self._immediate_corners = None
+        print(f"mesh cache hit: {self.obj_filepath} "
+              f"({self.mesh_cache.hits} hits / {self.mesh_cache.misses} misses)")
+        return True
+
+    def _store_cached(self, signature):
+        arrays = {
+            'vertices': self.vertices,
+            'tex_coords': self.tex_coords,
+            'normals': self.normals,
+            'faces': self.faces,
+            'face_texcoords': self.face_texcoords,
+            'face_normals': self.face_normals,
+            'face_materials': self.face_materials,
+            'face_groups': self.face_groups,
+            'draw_vertices': self.draw_vertices,
+            'draw_indices': self.draw_indices,
+        }
+        meta = {
+            'material_names': self.material_names,
+            'group_names': self.group_names,
+            'materials': self.materials,
+            'draw_has_uvs': self.draw_has_uvs,
+            'draw_has_normals': self.draw_has_normals,
+            'submeshes': self.submeshes,
+            'mesh_stats': self.mesh_stats,
+        }
+        try:
+            self.mesh_cache.store(self.obj_filepath, signature, arrays, meta)
+        except OSError as e:
+            print(f"failed to write mesh cache: {e}")
 
     def set_config(self,config):
         self.obj_filepath = config[0]
@@ -67,39 +263,259 @@ class ModelLoader:
         self._load_model()
 
     def _generate_uvs(self):
-        if not self.vertices:
+        if not len(self.vertices):
             return
         # find bounds
-        min_x = min(v[0] for v in self.vertices)
-        max_x = max(v[0] for v in self.vertices)
-        min_z = min(v[2] for v in self.vertices)
-        max_z = max(v[2] for v in self.vertices)
-        
-        range_x = max_x - min_x if max_x != min_x else 1.0
-        range_z = max_z - min_z if max_z != min_z else 1.0
-        
-        # make uvs for each vertex
-        self.tex_coords = []
-        for vertex in self.vertices:
-            u = (vertex[0] - min_x) / range_x
-            v = (vertex[2] - min_z) / range_z
-            self.tex_coords.append([u, v])
-        
-        # make faces use uvs 
-        for face in self.faces:
-            verts = face['vertices']
-            face['texcoords'] = verts  # Use same indices as vertices
-        
+        mins = self.vertices.min(axis=0)
+        maxs = self.vertices.max(axis=0)
+        ranges = np.where(maxs != mins, maxs - mins, 1.0)
+
+        # planar projection onto xz for each vertex
+        self.tex_coords = ((self.vertices[:, [0, 2]] - mins[[0, 2]]) / ranges[[0, 2]]).astype(np.float32)
+
+        # make faces use uvs, same indices as vertices
+        self.face_texcoords = self.faces.copy()
+
         print(f"Generated {len(self.tex_coords)} UV coordinates")
 
+    def _generate_normals(self):
+        # smooth normals for corners the obj gave none, lighting needs every vertex to have one
+        if not len(self.faces):
+            return
+        normals, face_normals = fill_missing_normals(self.normals, self.face_normals,
+                                                     self.vertices, self.faces)
+        if normals is not self.normals:
+            print(f"Generated {len(normals) - len(self.normals)} normals")
+        self.normals = normals
+        self.face_normals = face_normals
+
+    def _build_draw_arrays(self):
+        # weld identical (position, uv, normal) corners into one shared vertex
+        corners = np.full((len(self.faces) * 3, 3), -1, dtype=np.int64)
+        corners[:, 0] = self.faces.reshape(-1)
+        if self.face_texcoords is not None and len(self.tex_coords):
+            corners[:, 1] = self.face_texcoords.reshape(-1)
+        if self.face_normals is not None and len(self.normals):
+            corners[:, 2] = self.face_normals.reshape(-1)
+        unique, inverse = np.unique(corners, axis=0, return_inverse=True)
+
+        # interleaved position(3) uv(2) normal(3), missing attributes are zero
+        interleaved = np.zeros((len(unique), VERTEX_FLOATS), dtype=np.float32)
+        interleaved[:, 0:3] = self.vertices[unique[:, 0]]
+        has_uv = unique[:, 1] >= 0
+        interleaved[has_uv, 3:5] = self.tex_coords[unique[has_uv, 1]]
+        has_normal = unique[:, 2] >= 0
+        interleaved[has_normal, 5:8] = self.normals[unique[has_normal, 2]]
+
+        # one sub-mesh per material, however many groups and usemtl runs it
+        # is spread over, so a material costs a single draw. each is cache
+        # ordered with its levels of detail packed after it
+        triangles = inverse.reshape(-1, 3).astype(np.uint32)
+        face_material = self._face_material_ids()
+        names = list(self.materials)
+        used = sorted(np.unique(face_material).tolist(),
+                      key=lambda m: (self.materials[names[m]]['diffuse_map'] or '', names[m]))
+        packed_vertices = [np.zeros((0, VERTEX_FLOATS), dtype=np.float32)]
+        packed_indices = [np.zeros(0, dtype=np.uint32)]
+        self.submeshes = []
+        acmr_before = acmr_after = 0.0
+        # false when a sub-mesh was too large for the cache ordering
+        cache_optimized = True
+        base = 0
+        first = 0
+        for m in used:
+            selected = triangles[face_material == m]
+            vertices, indices, lod_ranges, stats = mesh_optimize.optimize(interleaved, selected.reshape(-1))
+            packed_vertices.append(vertices)
+            packed_indices.append(indices + np.uint32(base))
+            self.submeshes.append({'material': names[m],
+                                   'lod_ranges': [(first + start, count) for start, count in lod_ranges]})
+            if stats['cache_optimized']:
+                acmr_before += stats['acmr_before'] * len(selected) / len(triangles)
+                acmr_after += stats['acmr_after'] * len(selected) / len(triangles)
+            cache_optimized = cache_optimized and stats['cache_optimized']
+            base += len(vertices)
+            first += len(indices)
+        self.draw_vertices = np.concatenate(packed_vertices)
+        self.draw_indices = np.concatenate(packed_indices)
+        self.draw_has_uvs = bool(has_uv.any())
+        self.draw_has_normals = bool(has_normal.any())
+        # a sub-mesh with fewer levels draws its coarsest one at the levels it lacks
+        lod_triangles = [sum(s['lod_ranges'][min(level, len(s['lod_ranges']) - 1)][1] // 3
+                             for s in self.submeshes)
+                         for level in range(self.lod_count())]
+        if not cache_optimized:
+            acmr_before = acmr_after = None
+        self.mesh_stats = {
+            'acmr_before': acmr_before,
+            'acmr_after': acmr_after,
+            'cache_optimized': cache_optimized,
+            'cache_size': mesh_optimize.CACHE_SIZE,
+            'lod_triangles': lod_triangles,
+            'submeshes': len(self.submeshes),
+        }
+        print(f"{self.obj_filepath}: {len(self.faces) * 3} corners welded to {len(unique)} vertices, "
+              f"{len(self.submeshes)} sub-meshes from {len(self.group_names)} groups, "
+              + (f"acmr {acmr_before:.3f} -> {acmr_after:.3f}" if cache_optimized
+                 else f"cache ordering skipped (over {mesh_optimize.CACHE_OPTIMIZE_MAX_TRIANGLES} triangles)")
+              + f", lod triangles {lod_triangles}")
+        # immediate mode corner list is only built if that path is used
+        self._immediate_corners = None
+
+    def _set_bounds(self):
+        # bounding radius around the origin, the point the model rotates about
+        if len(self.draw_vertices):
+            self.radius = float(np.linalg.norm(self.draw_vertices[:, :3], axis=1).max()) or 1.0
+        self.lod = 0
+
+    def _face_material_ids(self):
+        # (F,) index into self.materials per triangle, faces without a known usemtl get the first one
+        names = list(self.materials)
+        if self.face_materials is None:
+            return np.zeros(len(self.faces), dtype=np.int64)
+        missing = [name for name in self.material_names if name not in self.materials]
+        if missing:
+            print(f"materials not in mtl, using {names[0] or 'default'}: {', '.join(missing)}")
+        # the extra entry catches -1, faces before the first usemtl
+        lookup = np.array([names.index(name) if name in self.materials else 0
+                           for name in self.material_names] + [0], dtype=np.int64)
+        return lookup[self.face_materials]
+
+    def lod_count(self):
+        return max((len(s['lod_ranges']) for s in self.submeshes), default=1)
+
+    def lod_level(self, radius, camera_distance):
+        # level for a copy of this model scaled to radius world units
+        return mesh_optimize.select_lod(radius, camera_distance, self.lod_count())
+
+    def select_lod(self, camera_distance):
+        self.lod = self.lod_level(self.radius, camera_distance)
+        return self.lod
+
+    def draw_batches(self, level=None):
+        '''
+            one (material, texture id or None, base color, byte offset into
+            the index buffer, index count) per sub-mesh at a level of detail,
+            in texture order so a renderer only rebinds when the texture changes
+        '''
+        level = self.lod if level is None else level
+        batches = []
+        for submesh in self.submeshes:
+            lod_ranges = submesh['lod_ranges']
+            first, count = lod_ranges[min(level, len(lod_ranges) - 1)]
+            material = self.materials.get(submesh['material'], self.material)
+            texture_id = self.texture_ids.get(material['diffuse_map']) if self.draw_has_uvs else None
+            if texture_id:
+                color = (1.0, 1.0, 1.0)
+            elif len(self.submeshes) > 1:
+                # kd tells several materials apart, a single one keeps the usual tint
+                color = tuple(material['diffuse'][:3])
+            else:
+                color = UNTEXTURED_COLOR
+            batches.append((material, texture_id, color, first * 4, count))
+        return batches
+
+    def _upload_buffers(self):
+        if not bool(glGenBuffers):
+            print("buffer objects not supported, using immediate mode")
+            self.use_buffers = False
+            return
+        try:
+            self.vbo = glGenBuffers(1)
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.draw_vertices.nbytes, self.draw_vertices, GL_STATIC_DRAW)
+            self.ebo = glGenBuffers(1)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.draw_indices.nbytes, self.draw_indices, GL_STATIC_DRAW)
+            # vao records the pointer setup so a frame is bind + draw
+            if bool(glGenVertexArrays):
+                self.vao = glGenVertexArrays(1)
+                glBindVertexArray(self.vao)
+                self._bind_vertex_arrays()
+                glBindVertexArray(0)
+        except Exception as e:
+            print(f"failed to create buffers, using immediate mode: {e}")
+            self._release_buffers()
+            self.use_buffers = False
+        finally:
+            # unbound buffers keep client side arrays (imgui) working
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def set_use_buffers(self, use_buffers):
+        self.use_buffers = use_buffers
+        if use_buffers and not self.vbo and self.has_model:
+            self._upload_buffers()
+
+    def _bind_vertex_arrays(self):
+        stride = VERTEX_FLOATS * 4
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, stride, ctypes.c_void_p(0))
+        if self.draw_has_uvs:
+            glEnableClientState(GL_TEXTURE_COORD_ARRAY)
+            glTexCoordPointer(2, GL_FLOAT, stride, ctypes.c_void_p(3 * 4))
+        if self.draw_has_normals:
+            glEnableClientState(GL_NORMAL_ARRAY)
+            glNormalPointer(GL_FLOAT, stride, ctypes.c_void_p(5 * 4))
+
+    def _unbind_vertex_arrays(self):
+        glDisableClientState(GL_VERTEX_ARRAY)
+        glDisableClientState(GL_TEXTURE_COORD_ARRAY)
+        glDisableClientState(GL_NORMAL_ARRAY)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def vram_bytes(self):
+        # estimate of what this model keeps resident on the gpu
+        total = self.texture_bytes
+        if self.vbo:
+            total += self.draw_vertices.nbytes
+        if self.ebo:
+            total += self.draw_indices.nbytes
+        return total
+
+    def release(self):
+        # free every gpu resource owned by this model
+        self._release_buffers()
+        if self.texture_ids:
+            glDeleteTextures(len(self.texture_ids), list(self.texture_ids.values()))
+        self.texture_ids = {}
+        self.texture_bytes = 0
+        self.texture = None
+
+    def _release_buffers(self):
+        if self.vao:
+            glDeleteVertexArrays(1, [self.vao])
+        if self.vbo:
+            glDeleteBuffers(1, [self.vbo])
+        if self.ebo:
+            glDeleteBuffers(1, [self.ebo])
+        self.vao = None
+        self.vbo = None
+        self.ebo = None
+
+    def _load_materials(self, has_mtl):
+        self.materials = {}
+        if has_mtl:
+            self._load_mtl()
+        if not self.materials:
+            # without mtl materials the configured texture covers the whole model
+            material = default_material()
+            if self.diffuse_filepath and os.path.exists(self.diffuse_filepath):
+                material['diffuse_map'] = self.diffuse_filepath
+            self.materials[DEFAULT_MATERIAL] = material
+        self.material = next(iter(self.materials.values()))
+
     def _load_mtl(self):
         if not os.path.exists(self.mtl_filepath):
             print(f"No MTL file found at {self.mtl_filepath}")
             return
 
         print(f"loading mtl: {self.mtl_filepath}")
-        obj_dir = os.path.dirname(self.obj_filepath)
-        diffuse_map = None
+        # values before the first newmtl only count when there is no newmtl at all
+        material = default_material()
 
         with open(self.mtl_filepath, 'r', encoding='utf-8', errors='ignore') as f:
             for line in f:
@@ -107,184 +523,110 @@ class ModelLoader:
                 if not line or line.startswith('#'):
                     continue
                 parts = line.split()
-                if parts[0] == 'Kd':
-                    self.material['diffuse'] = [float(parts[1]),
+                if parts[0] == 'newmtl':
+                    material = self.materials.setdefault(' '.join(parts[1:]), default_material())
+                elif parts[0] == 'Kd':
+                    material['diffuse'] = [float(parts[1]),
                                            float(parts[2]),
                                            float(parts[3]),
                                            1.0]
                 elif parts[0] == 'Ka':
-                    self.material['ambient'] = [float(parts[1]),
-                                                float(parts[2]),
-                                                float(parts[3]),
-                                                1.0]
+                    material['ambient'] = [float(parts[1]),
+                                           float(parts[2]),
+                                           float(parts[3]),
+                                           1.0]
                 elif parts[0] == 'Ks':
-                    self.material['specular'] = [float(parts[1]),
-                                                float(parts[2]),
-                                                float(parts[3]),
-                                                1.0]
+                    material['specular'] = [float(parts[1]),
+                                            float(parts[2]),
+                                            float(parts[3]),
+                                            1.0]
                 elif parts[0] == 'Ns':
-                    self.material['shininess'] = min(max(float(parts[1]),0.0), 128.0)
+                    material['shininess'] = min(max(float(parts[1]),0.0), 128.0)
                 elif parts[0] == 'map_Kd':
-                    texture_path = ' '.join(parts[1:])
-                    texture_filename = os.path.basename(texture_path.replace('\\','/'))
-                    if self.diffuse_filepath and os.path.exists(self.diffuse_filepath):
-                        diffuse_map = self.diffuse_filepath
-                    else:
-                        textures_dir_path = os.path.join(obj_dir, 'textures', texture_filename)
-                        if os.path.exists(textures_dir_path):
-                            diffuse_map = textures_dir_path
-                        else:
-                            print(f"texture not found: {texture_filename}")
-        if diffuse_map:
-            print("using diffuse")
-            self._load_texture()
-
-    def _load_texture(self):
-        if not self.diffuse_filepath or not os.path.exists(self.diffuse_filepath):
-            return
-        try:
-            image = Image.open(self.diffuse_filepath)
-            if image.mode != 'RGBA':
-                image = image.convert('RGBA')
-            # opengl expects origin at bottom left
-            image = image.transpose(Image.FLIP_TOP_BOTTOM)
-            # make opengl texture
-            img_data = image.tobytes()
-            width, height = image.size
-            # opengl texture
-            self.texture_id = glGenTextures(1)
-            glBindTexture(GL_TEXTURE_2D, self.texture_id)
-            # set tex parameters
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-
-            # upload tex data to GPU (?)
-            glTexImage2D(
-                GL_TEXTURE_2D,
-                0, # mipmap level
-                GL_RGBA, # internal format
-                width,
-                height,
-                0, # border
-                GL_RGBA, # format
-                GL_UNSIGNED_BYTE, # data type
-                img_data
-            )
-            print(f"texture loaded")
-        except Exception as e:
-            print(f"failed to load texture: {e}")
-            self.texture_id = None
+                    material['diffuse_map'] = self._find_texture(' '.join(parts[1:]))
+        if not self.materials:
+            self.materials[DEFAULT_MATERIAL] = material
+        print(f"{len(self.materials)} materials: {', '.join(name or 'default' for name in self.materials)}")
+
+    def _find_texture(self, texture_path):
+        # map_Kd paths are often absolute paths on the exporter's machine,
+        # try next to the mtl, then a textures folder next to the obj
+        texture_path = texture_path.replace('\\', '/')
+        texture_filename = os.path.basename(texture_path)
+        candidates = [os.path.join(os.path.dirname(self.mtl_filepath), texture_path),
+                      os.path.join(os.path.dirname(self.obj_filepath), 'textures', texture_filename)]
+        for candidate in candidates:
+            if os.path.exists(candidate):
+                return candidate
+        if self.diffuse_filepath and os.path.exists(self.diffuse_filepath):
+            return self.diffuse_filepath
+        print(f"texture not found: {texture_filename}")
+        return None
+
+    def _decode_textures(self):
+        # every diffuse map a sub-mesh uses, decoded once however many materials share it
+        self._pending_images = {}
+        options = self.texture_options
+        for submesh in self.submeshes:
+            path = self.materials[submesh['material']]['diffuse_map']
+            if not path or path in self._pending_images or not os.path.exists(path):
+                continue
+            try:
+                self._pending_images[path] = decode_texture(path, self.mesh_cache,
+                                                            options['max_size'], options['mipmaps'])
+            except Exception as e:
+                print(f"failed to load texture: {e}")
+
+    def _upload_textures(self):
+        pending = self._pending_images
+        self._pending_images = {}
+        options = self.texture_options
+        for path, texture in pending.items():
+            try:
+                if path in self.texture_ids:
+                    glDeleteTextures(1, [self.texture_ids.pop(path)])
+                self.texture_ids[path] = upload_texture(texture, options['mipmaps'], options['compress'])
+            except Exception as e:
+                print(f"failed to load texture: {e}")
+                continue
+            self.texture_bytes += texture.gpu_bytes
+            if self.texture is None:
+                self.texture = texture
+            print(f"texture loaded: {path} {texture.report()}")
 
     def _load_obj(self):
-        with open(self.obj_filepath, 'r') as o:
-            # read file
-            for line in o:
-                # strip whitespace
-                line = line.strip()
-                # skip empty lines
-                if (not line or 
-                    line.startswith('usemtl') or 
-                    line.startswith('g') or
-                    line.startswith('#')):
-                    continue
-                parts = line.split()
-                if parts[0] == 'v':
-                    vertex = [float(parts[1]), 
-                              float(parts[2]), 
-                              float(parts[3])]
-                    self.vertices.append(vertex)
-                elif parts[0] == 'vt':
-                    tex_coord = [float(parts[1]),
-                              float(parts[2])]
-                    self.tex_coords.append(tex_coord)
-                elif parts[0] == 'vn':
-                    normal = [float(parts[1]),
-                              float(parts[2]),
-                              float(parts[3])]
-                    self.normals.append(normal)
-                elif parts[0] == "f":
-                    face_verts = []
-                    face_texs = []
-                    face_norms = []
-                    for vertex_data in parts[1:]:
-                        indices = vertex_data.split('/')
-                        vertex_index = int(indices[0]) - 1
-                        face_verts.append(vertex_index)
-                        if len(indices) > 1 and indices[1]:
-                            tex_index = int(indices[1]) - 1
-                            face_texs.append(tex_index)
-                        if len(indices) > 2 and indices[2]:
-                            norm_index = int(indices[2]) - 1
-                            face_norms.append(norm_index)
-                    if len(face_verts) == 3:
-                        self.faces.append({
-                            'vertices': face_verts,
-                            'texcoords': face_texs if face_texs else None
-                        })
-                    elif len(face_verts) == 4:
-                        self.faces.append({
-                            'vertices': [face_verts[0], face_verts[1], face_verts[2]],
-                            'texcoords': [face_texs[0], face_texs[1], face_texs[2]] if face_texs else None,
-                            'normals': [face_norms[0], face_norms[1], face_norms[2]] if face_norms else None
-                        })
-                        self.faces.append({
-                            'vertices': [face_verts[0], face_verts[2], face_verts[3]],
-                            'texcoords': [face_texs[0], face_texs[2], face_texs[3]] if face_texs else None,
-                            'normals': [face_norms[0], face_norms[2], face_norms[3]] if face_norms else None
-                        })
-                elif parts[0] == 'l':
-                    continue
-        self.has_model = True
+        mesh = parse_obj(self.obj_filepath)
+        self.vertices = mesh.positions
+        self.tex_coords = mesh.tex_coords
+        self.normals = mesh.normals
+        self.faces = mesh.faces
+        self.face_texcoords = mesh.face_texcoords
+        self.face_normals = mesh.face_normals
+        self.material_names = mesh.material_names
+        self.face_materials = mesh.face_materials
+        self.group_names = mesh.group_names
+        self.face_groups = mesh.face_groups
 
-    def render(self):
+    def render(self, stats=None):
         '''
             draw model
             steps:
             1. push matrix / save cur transformation
-            2. set color
-            3. Draw all triangles
-            4. Draw wireframe overlay
-            5. pop matrix / restore transformations 
+            2. per sub-mesh: set material and texture, draw its triangles
+            3. pop matrix / restore transformations
+            stats: DrawStats that counts the draws and state changes
         '''
         if not self.has_model:
             return
+        start = time.perf_counter()
         # show all faces
         glDisable(GL_CULL_FACE)
-        # apply material properties
-        if self.material:
-            glMaterialfv(GL_FRONT_AND_BACK, GL_DIFFUSE, self.material['diffuse'])
-            glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT, self.material['ambient'])
-            glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, self.material['specular'])
-            glMaterialf(GL_FRONT_AND_BACK, GL_SHININESS, self.material['shininess'])
-        #check if textures 
-        if (self.texture_id):
-            glBindTexture(GL_TEXTURE_2D, self.texture_id)
-            glColor3f(1,1,1)
-        else:
-            glColor3f(0.6, 0.7, 0.8)
         # save cur transofrmation matrix
         glPushMatrix()
-        # draw solid model
-        # set material color
-        # begin drawing triangles
-        glBegin(GL_TRIANGLES)
-        #draw all faces
-        for face in self.faces:
-            vertices = face.get('vertices', face if isinstance(face, list) else [])
-            texcoords = face.get('texcoords',None) if isinstance(face, dict) else []
-            for i, vertex_index in enumerate(vertices):
-                if vertex_index < len(self.vertices):
-                    if texcoords and i < len(texcoords):
-                        tex_index = texcoords[i]
-                        if tex_index < len(self.tex_coords):
-                            glTexCoord2fv(self.tex_coords[tex_index])
-                    vertex = self.vertices[vertex_index]
-                    # send vertex to opengl
-                    glVertex3fv(vertex)
-        # stop drawing triangles
-        glEnd()
+        if self.use_buffers and self.vbo:
+            self._render_buffers(stats)
+        else:
+            self._render_immediate(stats)
 
         # restore polygon to be filled (?)
         glPolygonMode(GL_FRONT_AND_BACK, GL_FILL)
@@ -292,3 +634,63 @@ class ModelLoader:
 
         # Restore transformation mateix
         glPopMatrix()
+        self.last_submit_ms = (time.perf_counter() - start) * 1000.0
+        # smoothed value for display, a single frame is noisy
+        self.avg_submit_ms += (self.last_submit_ms - self.avg_submit_ms) * 0.05
+
+    def _batches(self, stats):
+        '''
+            draw_batches() with their material and texture applied, a texture
+            is only bound when it differs from the previous batch
+        '''
+        bound = -1
+        for material, texture_id, color, offset, count in self.draw_batches():
+            if (texture_id or 0) != bound:
+                bound = texture_id or 0
+                glBindTexture(GL_TEXTURE_2D, bound)
+                if stats is not None:
+                    stats.state_changes += 1
+            glMaterialfv(GL_FRONT_AND_BACK, GL_DIFFUSE, material['diffuse'])
+            glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT, material['ambient'])
+            glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, material['specular'])
+            glMaterialf(GL_FRONT_AND_BACK, GL_SHININESS, material['shininess'])
+            glColor3f(*color)
+            if stats is not None:
+                stats.state_changes += 1
+                stats.draw_calls += 1
+            yield offset, count
+
+    def _render_buffers(self, stats=None):
+        # retained mode, everything already lives on the gpu
+        if self.vao:
+            glBindVertexArray(self.vao)
+        else:
+            self._bind_vertex_arrays()
+        for offset, count in self._batches(stats):
+            glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, ctypes.c_void_p(offset))
+        if self.vao:
+            glBindVertexArray(0)
+        self._unbind_vertex_arrays()
+
+    def _render_immediate(self, stats=None):
+        # fallback for contexts without buffer objects
+        if self._immediate_corners is None or self._immediate_corners[0] != self.lod:
+            # corner lists per sub-mesh, in draw_batches() order
+            corners = [self.draw_vertices[self.draw_indices[offset // 4:offset // 4 + count]].tolist()
+                       for _, _, _, offset, count in self.draw_batches()]
+            self._immediate_corners = (self.lod, corners)
+        has_uvs = self.draw_has_uvs
+        has_normals = self.draw_has_normals
+        for submesh_corners, _ in zip(self._immediate_corners[1], self._batches(stats)):
+            # begin drawing triangles
+            glBegin(GL_TRIANGLES)
+            #draw all faces, one entry per triangle corner
+            for corner in submesh_corners:
+                if has_uvs:
+                    glTexCoord2f(corner[3], corner[4])
+                if has_normals:
+                    glNormal3f(corner[5], corner[6], corner[7])
+                # send vertex to opengl
+                glVertex3f(corner[0], corner[1], corner[2])
+            # stop drawing triangles
+            glEnd()
@@ -0,0 +1,139 @@
+'''
+    smooth vertex normals for meshes that come without them.
+    every face adds its cross product (length = twice its area) to the
+    corners it touches, so large faces count more than slivers. a corner only
+    takes in the faces around its vertex that are within the crease angle of
+    its own face, so hard edges stay hard and the vertex is split there.
+    everything runs as numpy scatter-adds over the face index array.
+'''
+import numpy as np
+
+# faces meeting at more than this many degrees get a hard edge
+CREASE_ANGLE = 60.0
+
+# corner pairs compared per pass at split vertices, bounds temporary memory
+PAIR_CHUNK = 1 << 22
+
+
+def _scatter(index, values, size):
+    # (size, 3) sums of values rows grouped by index
+    out = np.empty((size, 3), dtype=np.float64)
+    for axis in range(3):
+        out[:, axis] = np.bincount(index, weights=values[:, axis], minlength=size)
+    return out
+
+
+def _unique_rows(rows):
+    # np.unique(rows, axis=0, return_inverse=True) for (N,3) floats, without its slow void sort
+    order = np.lexsort(rows.T[::-1])
+    ordered = rows[order]
+    new = np.concatenate([[True], (ordered[1:] != ordered[:-1]).any(axis=1)])
+    inverse = np.empty(len(rows), dtype=np.int64)
+    inverse[order] = np.cumsum(new) - 1
+    return ordered[new], inverse
+
+
+def _normalize(vectors):
+    length = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.where(length > 0, length, 1.0)).astype(np.float32)
+
+
+def face_normals(positions, faces):
+    # (F,3) area weighted face normals and the (F,3) unit ones
+    p0 = positions[faces[:, 0]]
+    e1 = (positions[faces[:, 1]] - p0).T
+    e2 = (positions[faces[:, 2]] - p0).T
+    # spelled out, np.cross is several times slower on (F,3) inputs
+    weighted = np.empty((len(faces), 3), dtype=np.float64)
+    weighted[:, 0] = e1[1] * e2[2] - e1[2] * e2[1]
+    weighted[:, 1] = e1[2] * e2[0] - e1[0] * e2[2]
+    weighted[:, 2] = e1[0] * e2[1] - e1[1] * e2[0]
+    return weighted, _normalize(weighted)
+
+
+def smooth_normals(positions, faces, crease_angle=CREASE_ANGLE):
+    '''
+        returns (normals (N,3) float32, face_normals (F,3) int32) in the
+        ObjMesh layout. the first len(positions) normals are the fully smooth
+        ones, normal i belongs to vertex i; split corners index extra normals
+        after them.
+    '''
+    faces = np.asarray(faces, dtype=np.int64)
+    vertex_count = len(positions)
+    weighted, unit = face_normals(np.asarray(positions, dtype=np.float32), faces)
+    # corner c is corner c % 3 of face c // 3
+    corner_vertex = faces.reshape(-1)
+    vertex_sum = _scatter(faces[:, 0], weighted, vertex_count)
+    vertex_sum += _scatter(faces[:, 1], weighted, vertex_count)
+    vertex_sum += _scatter(faces[:, 2], weighted, vertex_count)
+    face_index = faces.astype(np.int32)
+    if crease_angle >= 180.0 or not len(faces):
+        return _normalize(vertex_sum), face_index
+
+    # a vertex whose faces are all within half the crease angle of their
+    # average is smooth, any two of them are within the full angle
+    cos_crease = np.cos(np.radians(crease_angle))
+    average = _normalize(vertex_sum)
+    deviation = np.einsum('fj,fkj->fk', unit, average[faces]).reshape(-1)
+    off = deviation < np.cos(np.radians(crease_angle) / 2)
+    split = np.zeros(vertex_count, dtype=bool)
+    split[corner_vertex[off]] = True
+    corners = np.flatnonzero(split[corner_vertex])
+    if not len(corners):
+        return average, face_index
+
+    # compare every corner of a split vertex with every other corner of it
+    # any order inside a group works, every corner of it sees the others in the same order
+    corners = corners[np.argsort(corner_vertex[corners])]
+    sorted_vertex = corner_vertex[corners]
+    start = np.flatnonzero(np.concatenate([[True], sorted_vertex[1:] != sorted_vertex[:-1]]))
+    valence = np.diff(np.append(start, len(corners)))
+    group = np.repeat(np.arange(len(start)), valence)
+    reps = valence[group]
+    # face data gathered once in corner order, the pairs index these small arrays
+    corner_unit = unit[corners // 3]
+    corner_weighted = weighted[corners // 3]
+    pair_end = np.cumsum(reps)
+    corner_sum = np.empty((len(corners), 3), dtype=np.float64)
+    smooth = np.empty(len(corners), dtype=bool)
+    first = 0
+    while first < len(corners):
+        done = pair_end[first - 1] if first else 0
+        last = max(int(np.searchsorted(pair_end, done + PAIR_CHUNK, side='right')), first + 1)
+        counts = reps[first:last]
+        left = np.repeat(np.arange(first, last), counts)
+        offsets = np.arange(len(left)) - np.repeat(np.cumsum(counts) - counts, counts)
+        right = start[group[left]] + offsets
+        keep = np.einsum('ij,ij->i', corner_unit[left], corner_unit[right]) >= cos_crease
+        local = left - first
+        corner_sum[first:last] = _scatter(local[keep], corner_weighted[right[keep]], last - first)
+        smooth[first:last] = np.bincount(local, weights=keep, minlength=last - first) == counts
+        first = last
+
+    # corners that kept every face use the vertex normal, the rest share
+    # one extra normal per distinct set of faces
+    creased = corners[~smooth]
+    extra, inverse = _unique_rows(corner_sum[~smooth])
+    corner_normal = corner_vertex.astype(np.int32)
+    corner_normal[creased] = vertex_count + inverse
+    normals = _normalize(np.concatenate([vertex_sum, extra]))
+    return normals, corner_normal.reshape(-1, 3)
+
+
+def fill_missing_normals(mesh_normals, mesh_face_normals, positions, faces, crease_angle=CREASE_ANGLE):
+    '''
+        generated normals for the corners an obj left without one, given
+        normals are kept. returns (normals, face_normals) in the ObjMesh layout
+    '''
+    if mesh_face_normals is not None and len(mesh_normals):
+        missing = mesh_face_normals < 0
+        if not missing.any():
+            return mesh_normals, mesh_face_normals
+    else:
+        missing = None
+    normals, face_index = smooth_normals(positions, faces, crease_angle)
+    if missing is None:
+        return normals, face_index
+    combined = mesh_face_normals.copy()
+    combined[missing] = face_index[missing] + len(mesh_normals)
+    return np.concatenate([mesh_normals, normals]).astype(np.float32), combined
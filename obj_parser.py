@@ -0,0 +1,217 @@
+import numpy as np
+
+
+class ObjMesh:
+    '''
+        parsed obj data as flat numpy arrays
+        positions:      (V,3) float32
+        tex_coords:     (T,2) float32
+        normals:        (N,3) float32
+        faces:          (F,3) int32 indices into positions
+        face_texcoords: (F,3) int32 indices into tex_coords (-1 = missing) or None
+        face_normals:   (F,3) int32 indices into normals (-1 = missing) or None
+        material_names: usemtl names in order of first use
+        face_materials: (F,) int32 indices into material_names (-1 = before any usemtl) or None
+        group_names:    g / o names in order of first use
+        face_groups:    (F,) int32 indices into group_names (-1 = before any g / o) or None
+    '''
+    def __init__(self):
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.tex_coords = np.zeros((0, 2), dtype=np.float32)
+        self.normals = np.zeros((0, 3), dtype=np.float32)
+        self.faces = np.zeros((0, 3), dtype=np.int32)
+        self.face_texcoords = None
+        self.face_normals = None
+        self.material_names = []
+        self.face_materials = None
+        self.group_names = []
+        self.face_groups = None
+
+
+def parse_obj(filepath):
+    # read everything at once, parsing happens on the whole buffer
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    return parse_obj_bytes(data)
+
+
+def parse_obj_bytes(data):
+    mesh = ObjMesh()
+    block = parse_obj_block(data)
+    mesh.positions = block.positions
+    mesh.tex_coords = block.tex_coords
+    mesh.normals = block.normals
+    mesh.material_names = block.material_names
+    mesh.group_names = block.group_names
+    if block.faces is None:
+        return mesh
+
+    # drop triangles that point outside the vertex list
+    keep = ((block.faces >= 0) & (block.faces < len(mesh.positions))).all(axis=1)
+    mesh.faces = block.faces[keep].astype(np.int32)
+    if block.face_texcoords is not None:
+        t_idx = block.face_texcoords[keep]
+        t_idx[(t_idx < 0) | (t_idx >= len(mesh.tex_coords))] = -1
+        mesh.face_texcoords = t_idx.astype(np.int32)
+    if block.face_normals is not None:
+        n_idx = block.face_normals[keep]
+        n_idx[(n_idx < 0) | (n_idx >= len(mesh.normals))] = -1
+        mesh.face_normals = n_idx.astype(np.int32)
+    if block.face_materials is not None:
+        mesh.face_materials = block.face_materials[keep]
+    if block.face_groups is not None:
+        mesh.face_groups = block.face_groups[keep]
+    return mesh
+
+
+class ObjBlock:
+    '''
+        one run of whole obj lines, parsed on its own
+        positions, tex_coords, normals: elements defined in this block
+        faces, face_texcoords, face_normals: (F,3) int64 0-based indices into
+            the whole file's lists (-1 = missing), None when absent.
+            not range checked, they may point at elements of earlier blocks
+        material_names, group_names: usemtl and g / o names used in this block
+        face_materials, face_groups: (F,) int32 indices into those names,
+            -1 for faces before the first one in this block, None when absent
+    '''
+    def __init__(self):
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.tex_coords = np.zeros((0, 2), dtype=np.float32)
+        self.normals = np.zeros((0, 3), dtype=np.float32)
+        self.faces = None
+        self.face_texcoords = None
+        self.face_normals = None
+        self.material_names = []
+        self.face_materials = None
+        self.group_names = []
+        self.face_groups = None
+
+
+def parse_obj_block(data, base=(0, 0, 0)):
+    '''
+        data: whole lines of an obj file
+        base: (v, vt, vn) counts of the lines before data, for indices
+              relative to the end of the lists (negative indices)
+    '''
+    lines = data.splitlines()
+    # only copy the (rare) lines that need their indentation removed
+    lines = [line.lstrip() if line[:1] in (b' ', b'\t') else line for line in lines]
+    # two byte line heads ('v ', 'vt', 'vn', 'f ') tell us what each line is
+    heads = np.array([line[:2] for line in lines], dtype='S2')
+    is_v = (heads == b'v ') | (heads == b'v\t')
+    is_vt = heads == b'vt'
+    is_vn = heads == b'vn'
+    is_f = (heads == b'f ') | (heads == b'f\t')
+    # usemtl switches the material, g and o both start a named group
+    is_usemtl = heads == b'us'
+    is_group = (heads == b'g ') | (heads == b'g\t') | (heads == b'o ') | (heads == b'o\t')
+    del heads
+
+    block = ObjBlock()
+    block.positions = _parse_floats(lines, is_v, 3)
+    block.tex_coords = _parse_floats(lines, is_vt, 2)
+    block.normals = _parse_floats(lines, is_vn, 3)
+
+    face_line_ids = np.flatnonzero(is_f)
+    face_lines = [lines[i][2:] for i in face_line_ids]
+    if not face_lines:
+        return block
+    counts = np.fromiter(map(len, map(bytes.split, face_lines)), dtype=np.int64, count=len(face_lines))
+    tri_counts = np.maximum(counts - 2, 0)
+    usemtl_ids = np.array([i for i in np.flatnonzero(is_usemtl) if lines[i].startswith(b'usemtl')], dtype=np.int64)
+    block.material_names, block.face_materials = _face_names(
+        lines, usemtl_ids, len(b'usemtl'), face_line_ids, tri_counts)
+    block.group_names, block.face_groups = _face_names(
+        lines, np.flatnonzero(is_group), 1, face_line_ids, tri_counts)
+    del lines
+    # (K,3) 1-based v/vt/vn index per corner, 0 where a component is missing
+    corners = _parse_face_corners(face_lines, int(counts.sum()))
+    del face_lines
+
+    # obj allows negative indices relative to the last element read so far
+    if (corners < 0).any():
+        corner_line_ids = np.repeat(face_line_ids, counts)
+        for col, mask in enumerate((is_v, is_vt, is_vn)):
+            seen = np.cumsum(mask)[corner_line_ids] + base[col]
+            neg = corners[:, col] < 0
+            corners[neg, col] += seen[neg] + 1
+
+    tris = fan_triangulate(counts)
+    block.faces = corners[:, 0][tris] - 1
+    if corners[:, 1].any():
+        block.face_texcoords = corners[:, 1][tris] - 1
+    if corners[:, 2].any():
+        block.face_normals = corners[:, 2][tris] - 1
+    return block
+
+
+def _face_names(lines, name_line_ids, skip, face_line_ids, tri_counts):
+    '''
+        names of the state lines at name_line_ids (usemtl, g, o) and, per
+        triangle, the index of the last one before its face line
+    '''
+    if not len(name_line_ids):
+        return [], None
+    names = {}
+    ids = np.array([names.setdefault(lines[i][skip:].strip().decode('utf-8', 'replace'), len(names))
+                    for i in name_line_ids], dtype=np.int32)
+    latest = np.searchsorted(name_line_ids, face_line_ids) - 1
+    per_face = np.where(latest >= 0, ids[latest], -1).astype(np.int32)
+    return list(names), np.repeat(per_face, tri_counts)
+
+
+def fan_triangulate(counts):
+    '''
+        counts: number of corners per polygon
+        returns (F,3) indices into the flat corner list,
+        polygon [a,b,c,d,e] -> (a,b,c) (a,c,d) (a,d,e)
+    '''
+    counts = np.asarray(counts, dtype=np.int64)
+    starts = np.cumsum(counts) - counts
+    tri_counts = np.maximum(counts - 2, 0)
+    total = int(tri_counts.sum())
+    poly_ids = np.repeat(np.arange(len(counts)), tri_counts)
+    # position of each triangle inside its own fan, starting at 1
+    fan_pos = np.arange(total) - np.repeat(np.cumsum(tri_counts) - tri_counts, tri_counts) + 1
+    first = starts[poly_ids]
+    return np.stack([first, first + fan_pos, first + fan_pos + 1], axis=1)
+
+
+def _parse_floats(lines, mask, width):
+    rows = [lines[i][2:] for i in np.flatnonzero(mask)]
+    if not rows:
+        return np.zeros((0, width), dtype=np.float32)
+    values = np.fromstring(b' '.join(rows), dtype=np.float32, sep=' ')
+    if values.size == len(rows) * width:
+        return values.reshape(-1, width)
+    # some lines carry extra components (w, vertex colors, 3d uvs), keep the first ones
+    out = np.zeros((len(rows), width), dtype=np.float32)
+    for i, row in enumerate(rows):
+        parts = row.split()[:width]
+        out[i, :len(parts)] = [float(p) for p in parts]
+    return out
+
+
+def _parse_face_corners(face_lines, n):
+    joined = b' '.join(face_lines)
+    first = joined.split(None, 1)[0]
+    slashes = first.count(b'/')
+    doubles = first.count(b'//')
+    # fast path, every corner uses the same v, v/t, v//n or v/t/n layout
+    if joined.count(b'/') == slashes * n and joined.count(b'//') == doubles * n:
+        text = joined.replace(b'//', b'/0/').replace(b'/', b' ')
+        del joined
+        values = np.fromstring(text, dtype=np.int64, sep=' ')
+        width = slashes + 1
+        if values.size == n * width:
+            corners = np.zeros((n, 3), dtype=np.int64)
+            corners[:, :width] = values.reshape(n, width)
+            return corners
+    # mixed layouts, normalize each corner to v/t/n
+    corners = np.zeros((n, 3), dtype=np.int64)
+    for i, tok in enumerate(b' '.join(face_lines).split()):
+        for col, part in enumerate(tok.split(b'/')[:3]):
+            if part:
+                corners[i, col] = int(part)
+    return corners
@@ -0,0 +1,412 @@
+'''
+    streaming obj loading for meshes too large to parse in one piece.
+    a worker thread parses the file in fixed size byte chunks with
+    obj_parser.parse_obj_block and hands the blocks to the render thread
+    through a queue capped in bytes, when the gpu side falls behind the
+    reader waits instead of piling up parsed data.
+    StreamingModel appends each block to gpu buffers with glBufferSubData,
+    so the part loaded so far is drawn while the rest streams in.
+
+    streamed meshes skip the mesh cache, uv generation, optimization and
+    lod stages of ModelLoader and draw positions and normals only. normals
+    come from the file when faces index them like positions (the way
+    scanners write them), otherwise they are summed area weighted from the
+    faces as they arrive.
+
+    only the queue is capped in memory. the per vertex arrays later faces
+    need (positions, file normals, normal sums, 36 bytes a vertex) grow with
+    the mesh, they live in unlinked temp files mapped with numpy.memmap so
+    the os can write them back and evict them under memory pressure instead
+    of the whole mesh staying resident. the files take disk space for the
+    whole mesh and are closed once streaming finishes.
+'''
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+
+import numpy as np
+from OpenGL.GL import *
+
+from obj_parser import parse_obj_block
+from model_loader import ModelLoader, VERTEX_FLOATS, DEFAULT_MATERIAL
+from normals import face_normals
+
+# obj files larger than this are streamed instead of loaded in one piece
+STREAM_THRESHOLD = 64 * 1024 * 1024
+
+CHUNK_BYTES = 4 * 1024 * 1024
+
+# parsed blocks waiting for upload, the reader blocks above this
+MAX_QUEUED_BYTES = 64 * 1024 * 1024
+
+# gl upload time per frame while streaming
+UPLOAD_BUDGET_MS = 4.0
+
+# first gpu allocation, buffers double from here
+INITIAL_VERTICES = 1 << 16
+
+
+def read_blocks(path, chunk_bytes=CHUNK_BYTES):
+    # yields (ObjBlock, bytes read so far), every block ends on a line boundary
+    counts = [0, 0, 0]
+    carry = b''
+    done = 0
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(chunk_bytes)
+            done += len(data)
+            if data:
+                data = carry + data
+                cut = data.rfind(b'\n') + 1
+                # a line longer than a chunk waits for the next read
+                data, carry = data[:cut], data[cut:]
+                if not data:
+                    continue
+            elif carry:
+                data, carry = carry, b''
+            else:
+                return
+            block = parse_obj_block(data, counts)
+            counts[0] += len(block.positions)
+            counts[1] += len(block.tex_coords)
+            counts[2] += len(block.normals)
+            yield block, done
+
+
+def block_bytes(block):
+    arrays = (block.positions, block.tex_coords, block.normals,
+              block.faces, block.face_texcoords, block.face_normals)
+    return sum(a.nbytes for a in arrays if a is not None)
+
+
+class BlockQueue:
+    # fifo between the reader and the render thread, put() waits while max_bytes are queued
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.queued_bytes = 0
+        self.peak_bytes = 0
+        self.closed = False
+        self._items = deque()
+        self._cond = threading.Condition()
+
+    def put(self, item, nbytes):
+        # False once the queue is closed, the reader should stop
+        with self._cond:
+            # one block always fits so a block larger than the cap cannot stall
+            while self._items and self.queued_bytes + nbytes > self.max_bytes and not self.closed:
+                self._cond.wait()
+            if self.closed:
+                return False
+            self._items.append((item, nbytes))
+            self.queued_bytes += nbytes
+            self.peak_bytes = max(self.peak_bytes, self.queued_bytes)
+            return True
+
+    def get(self):
+        # next item or None, never waits
+        with self._cond:
+            if not self._items:
+                return None
+            item, nbytes = self._items.popleft()
+            self.queued_bytes -= nbytes
+            self._cond.notify_all()
+            return item
+
+    def empty(self):
+        with self._cond:
+            return not self._items
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._items.clear()
+            self.queued_bytes = 0
+            self._cond.notify_all()
+
+
+class SpillRows:
+    '''
+        (rows, columns) float32 array in an unlinked temp file mapped into
+        memory, zero filled, capacity doubles like the gpu buffers.
+        array is remapped when it grows, slices of it must not be kept
+    '''
+    def __init__(self, columns=3):
+        self.columns = columns
+        self.array = np.zeros((0, columns), dtype=np.float32)
+        self._file = None
+
+    def reserve(self, rows):
+        if rows <= len(self.array):
+            return
+        capacity = max(rows, 2 * len(self.array), INITIAL_VERTICES)
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix='gimbal_stream_')
+        # the old mapping goes first, a mapped file cannot grow on windows.
+        # the rows stay in the file, the new mapping sees them
+        self.array = None
+        self._file.truncate(capacity * self.columns * 4)
+        self.array = np.memmap(self._file, dtype=np.float32, mode='r+', shape=(capacity, self.columns))
+
+    @property
+    def nbytes(self):
+        return self.array.nbytes
+
+    def close(self):
+        self.array = np.zeros((0, self.columns), dtype=np.float32)
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def _grow_buffer(buffer, used_bytes, new_bytes):
+    # bigger storage under the same buffer id, so vaos that point at it stay valid
+    if not used_bytes:
+        glBindBuffer(GL_COPY_WRITE_BUFFER, buffer)
+        glBufferData(GL_COPY_WRITE_BUFFER, new_bytes, None, GL_STATIC_DRAW)
+        return
+    temp = glGenBuffers(1)
+    glBindBuffer(GL_COPY_READ_BUFFER, buffer)
+    glBindBuffer(GL_COPY_WRITE_BUFFER, temp)
+    glBufferData(GL_COPY_WRITE_BUFFER, used_bytes, None, GL_STREAM_COPY)
+    glCopyBufferSubData(GL_COPY_READ_BUFFER, GL_COPY_WRITE_BUFFER, 0, 0, used_bytes)
+    glBufferData(GL_COPY_READ_BUFFER, new_bytes, None, GL_STATIC_DRAW)
+    glBindBuffer(GL_COPY_READ_BUFFER, temp)
+    glBindBuffer(GL_COPY_WRITE_BUFFER, buffer)
+    glCopyBufferSubData(GL_COPY_READ_BUFFER, GL_COPY_WRITE_BUFFER, 0, 0, used_bytes)
+    glDeleteBuffers(1, [temp])
+
+
+class StreamingModel(ModelLoader):
+    '''
+        ModelLoader filled block by block. prepare() is the reader and runs
+        on a worker thread, pump() uploads queued blocks on the gl thread
+        within a time budget and is called every frame until finished.
+    '''
+    def __init__(self, config=None, mesh_cache=None, texture_options=None,
+                 chunk_bytes=CHUNK_BYTES, max_queued_bytes=MAX_QUEUED_BYTES):
+        super().__init__(config, mesh_cache, load=False, texture_options=texture_options)
+        self.chunk_bytes = chunk_bytes
+        self.blocks = BlockQueue(max_queued_bytes)
+        self.file_bytes = os.path.getsize(self.obj_filepath)
+        self.bytes_read = 0
+        self.parse_seconds = 0.0
+        self.reader_done = False
+        self.finished = False
+        self.error = None
+        self.start_time = time.perf_counter()
+        self.draw_has_normals = True
+        # disk backed copies, the gpu rows are rebuilt from these when normals change
+        self.vertex_count = 0
+        self.index_count = 0
+        self.positions = SpillRows()
+        self.file_normals = SpillRows()
+        self.file_normal_count = 0
+        self.normal_sum = SpillRows()
+        # faces that referenced vertices not streamed yet, never drawn
+        self.dropped_triangles = 0
+        # None until the first face block shows whether faces index vn like v
+        self.given_normals = None
+        self.vertex_capacity = 0
+        self.index_capacity = 0
+
+    def prepare(self):
+        # reader, parses chunks into the queue until the file ends or release()
+        try:
+            blocks = read_blocks(self.obj_filepath, self.chunk_bytes)
+            while True:
+                start = time.perf_counter()
+                item = next(blocks, None)
+                self.parse_seconds += time.perf_counter() - start
+                if item is None:
+                    break
+                block, self.bytes_read = item
+                if not self.blocks.put(block, block_bytes(block)):
+                    break
+        except Exception as e:
+            self.error = e
+            raise
+        finally:
+            self.reader_done = True
+
+    def upload(self):
+        # blocking, everything the reader produces is uploaded before returning
+        while not self.finished:
+            if not self.pump(budget_ms=float('inf')) and not self.finished:
+                time.sleep(0.001)
+        print(f"Loaded: {self.obj_filepath}")
+
+    def pump(self, budget_ms=UPLOAD_BUDGET_MS):
+        # returns how many blocks were uploaded
+        if self.finished:
+            return 0
+        if self.blocks.closed:
+            # released while streaming
+            self.finished = True
+            return 0
+        if self.error is not None:
+            self.finished = True
+            self._set_stage("failed", self.load_progress)
+            return 0
+        if not self.vbo:
+            self._create_buffers()
+        # read before draining, a block queued after this check is picked up next frame
+        reader_done = self.reader_done
+        start = time.perf_counter()
+        uploaded = 0
+        while (time.perf_counter() - start) * 1000.0 < budget_ms:
+            block = self.blocks.get()
+            if block is None:
+                break
+            self._append(block)
+            uploaded += 1
+        if uploaded:
+            self.has_model = self.index_count > 0
+        elapsed = time.perf_counter() - self.start_time
+        self._set_stage(f"streaming {self.bytes_read / max(elapsed, 1e-9) / 1e6:.0f} MB/s",
+                        self.bytes_read / max(self.file_bytes, 1))
+        if reader_done and self.blocks.empty():
+            self._finish()
+        return uploaded
+
+    def _finish(self):
+        self.finished = True
+        spilled = self.spilled_bytes()
+        # no later block can touch the rows on the gpu
+        self._close_spill()
+        self.has_model = self.index_count > 0
+        self._set_stage("done", 1.0)
+        elapsed = time.perf_counter() - self.start_time
+        print(f"streamed {self.obj_filepath}: {self.file_bytes / 1e6:.1f} MB in {elapsed:.2f} s "
+              f"({self.file_bytes / max(self.parse_seconds, 1e-9) / 1e6:.1f} MB/s parsed, "
+              f"{self.file_bytes / max(elapsed, 1e-9) / 1e6:.1f} MB/s end to end), "
+              f"{self.vertex_count} vertices, {self.index_count // 3} triangles "
+              f"({self.dropped_triangles} dropped for indexing vertices not streamed), "
+              f"peak queued {self.blocks.peak_bytes / 1e6:.1f} MB, "
+              f"spill files {spilled / 1e6:.1f} MB")
+
+    def _create_buffers(self):
+        self.vbo = glGenBuffers(1)
+        self.ebo = glGenBuffers(1)
+        self._reserve(INITIAL_VERTICES, INITIAL_VERTICES * 6)
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+        self._bind_vertex_arrays()
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+
+    def _reserve(self, vertices, indices):
+        # the whole old storage is copied, counts may already include rows not uploaded yet
+        stride = VERTEX_FLOATS * 4
+        if vertices > self.vertex_capacity:
+            capacity = max(vertices, 2 * self.vertex_capacity)
+            _grow_buffer(self.vbo, self.vertex_capacity * stride, capacity * stride)
+            self.vertex_capacity = capacity
+        if indices > self.index_capacity:
+            capacity = max(indices, 2 * self.index_capacity)
+            _grow_buffer(self.ebo, self.index_capacity * 4, capacity * 4)
+            self.index_capacity = capacity
+        glBindBuffer(GL_COPY_READ_BUFFER, 0)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+
+    def _append(self, block):
+        # dirty vertex rows [lo, hi) are rewritten on the gpu at the end
+        lo, hi = self.vertex_count, self.vertex_count
+        count = len(block.positions)
+        if count:
+            self.positions.reserve(self.vertex_count + count)
+            self.positions.array[self.vertex_count:self.vertex_count + count] = block.positions
+            self.vertex_count += count
+            hi = self.vertex_count
+            self.radius = max(self.radius, float(np.linalg.norm(block.positions, axis=1).max()))
+
+        count = len(block.normals)
+        if count:
+            first = self.file_normal_count
+            self.file_normals.reserve(first + count)
+            self.file_normals.array[first:first + count] = block.normals
+            self.file_normal_count += count
+            if self.given_normals:
+                lo, hi = min(lo, first), max(hi, min(first + count, self.vertex_count))
+
+        if block.faces is not None:
+            faces = block.faces
+            # only faces whose vertices are already on the gpu
+            keep = ((faces >= 0) & (faces < self.vertex_count)).all(axis=1)
+            faces = faces[keep]
+            self.dropped_triangles += len(keep) - len(faces)
+            if self.given_normals is None and len(faces):
+                normals = block.face_normals
+                self.given_normals = bool(normals is not None and (normals[keep] == faces).all())
+                if self.given_normals:
+                    lo, hi = 0, self.vertex_count
+            if len(faces) and not self.given_normals:
+                # scatter-add over the range of vertices this block touches
+                first, last = int(faces.min()), int(faces.max()) + 1
+                self.normal_sum.reserve(self.vertex_count)
+                weighted, _ = face_normals(self.positions.array, faces)
+                local = faces - first
+                target = self.normal_sum.array[first:last]
+                for axis in range(3):
+                    for corner in range(3):
+                        target[:, axis] += np.bincount(local[:, corner], weights=weighted[:, axis],
+                                                       minlength=last - first).astype(np.float32)
+                lo, hi = min(lo, first), max(hi, last)
+            if len(faces):
+                indices = faces.astype(np.uint32).reshape(-1)
+                self._reserve(self.vertex_count, self.index_count + len(indices))
+                glBindBuffer(GL_COPY_WRITE_BUFFER, self.ebo)
+                glBufferSubData(GL_COPY_WRITE_BUFFER, self.index_count * 4, indices.nbytes, indices)
+                glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+                self.index_count += len(indices)
+                self.submeshes = [{'material': DEFAULT_MATERIAL, 'lod_ranges': [(0, self.index_count)]}]
+
+        if hi > lo:
+            self._upload_vertices(lo, hi)
+
+    def _upload_vertices(self, lo, hi):
+        self._reserve(hi, self.index_count)
+        rows = np.zeros((hi - lo, VERTEX_FLOATS), dtype=np.float32)
+        rows[:, 0:3] = self.positions.array[lo:hi]
+        if self.given_normals:
+            end = min(hi, self.file_normal_count)
+            if end > lo:
+                rows[:end - lo, 5:8] = self.file_normals.array[lo:end]
+        elif len(self.normal_sum.array) >= hi:
+            normals = self.normal_sum.array[lo:hi]
+            length = np.linalg.norm(normals, axis=1, keepdims=True)
+            rows[:, 5:8] = normals / np.where(length > 0, length, 1.0)
+        stride = VERTEX_FLOATS * 4
+        glBindBuffer(GL_COPY_WRITE_BUFFER, self.vbo)
+        glBufferSubData(GL_COPY_WRITE_BUFFER, lo * stride, rows.nbytes, rows)
+        glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+
+    def resident_bytes(self):
+        # cpu memory held for this mesh outside the spill files, the parsed blocks waiting
+        return self.blocks.queued_bytes
+
+    def spilled_bytes(self):
+        # size of the mapped per vertex files, on disk and paged in as used
+        return self.positions.nbytes + self.file_normals.nbytes + self.normal_sum.nbytes
+
+    def _close_spill(self):
+        self.positions.close()
+        self.file_normals.close()
+        self.normal_sum.close()
+
+    def vram_bytes(self):
+        return self.vertex_capacity * VERTEX_FLOATS * 4 + self.index_capacity * 4
+
+    def set_use_buffers(self, use_buffers):
+        # streamed meshes only exist in buffers
+        self.use_buffers = True
+
+    def release(self):
+        # stops the reader too
+        self.blocks.close()
+        self._close_spill()
+        super().release()
+        self.vertex_capacity = 0
+        self.index_capacity = 0
@@ -0,0 +1,222 @@
+'''
+    headless rendering: gl context without a window, framebuffer object
+    render target, pixel buffer readback and a background frame writer.
+
+    PYOPENGL_PLATFORM ('egl' or 'osmesa') has to be set before this
+    module (or anything else using OpenGL.GL) is imported, main.py does
+    this for --headless. 'egl' works on gpu drivers and on mesa's
+    software llvmpipe, 'osmesa' is the pure software fallback.
+'''
+from OpenGL.GL import *
+import numpy as np
+
+import ctypes
+import os
+import queue
+import threading
+
+
+class HeadlessContext:
+    '''
+        gl context with no window. the default framebuffer is tiny or
+        missing, everything is drawn into a FrameTarget instead.
+    '''
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.platform = os.environ.get('PYOPENGL_PLATFORM', 'egl')
+        self._osmesa_buffer = None
+        if self.platform == 'osmesa':
+            self._create_osmesa()
+        else:
+            self._create_egl()
+
+    def _create_egl(self):
+        # platform modules are only importable on their own platform
+        from OpenGL import EGL
+        self._egl = EGL
+        self.display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self.display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError("eglInitialize failed")
+        attribs = (EGL.EGLint * 15)(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RED_SIZE, 8,
+            EGL.EGL_GREEN_SIZE, 8,
+            EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_ALPHA_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_NONE,
+        )
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        if not EGL.eglChooseConfig(self.display, attribs, ctypes.pointer(config), 1, ctypes.pointer(count)) \
+                or count.value == 0:
+            raise RuntimeError("no EGL config with pbuffer + desktop gl support")
+        # fixed function pipeline needs desktop gl, not gles
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        surface_attribs = (EGL.EGLint * 5)(EGL.EGL_WIDTH, 1, EGL.EGL_HEIGHT, 1, EGL.EGL_NONE)
+        self.surface = EGL.eglCreatePbufferSurface(self.display, config, surface_attribs)
+        self.context = EGL.eglCreateContext(self.display, config, EGL.EGL_NO_CONTEXT, None)
+        if not self.context:
+            raise RuntimeError("eglCreateContext failed")
+        self.make_current()
+
+    def _create_osmesa(self):
+        from OpenGL import osmesa
+        self._osmesa = osmesa
+        self.context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+        if not self.context:
+            raise RuntimeError("OSMesaCreateContextExt failed")
+        # osmesa needs a client side color buffer even though we draw to an fbo
+        self._osmesa_buffer = np.zeros((self.height, self.width, 4), dtype=np.uint8)
+        self.make_current()
+
+    def make_current(self):
+        if self.platform == 'osmesa':
+            self._osmesa.OSMesaMakeCurrent(self.context, self._osmesa_buffer,
+                                           GL_UNSIGNED_BYTE, self.width, self.height)
+        else:
+            egl = self._egl
+            egl.eglMakeCurrent(self.display, self.surface, self.surface, self.context)
+
+    def destroy(self):
+        if self.platform == 'osmesa':
+            self._osmesa.OSMesaDestroyContext(self.context)
+        else:
+            egl = self._egl
+            egl.eglMakeCurrent(self.display, egl.EGL_NO_SURFACE, egl.EGL_NO_SURFACE, egl.EGL_NO_CONTEXT)
+            egl.eglDestroySurface(self.display, self.surface)
+            egl.eglDestroyContext(self.display, self.context)
+            egl.eglTerminate(self.display)
+
+
+class FrameTarget:
+    # framebuffer object with rgba8 color and 24 bit depth renderbuffers
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        self.color = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color)
+        self.depth = glGenRenderbuffers(1)
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"framebuffer incomplete: {status:#x}")
+
+    def bind(self):
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, self.width, self.height)
+
+    def release(self):
+        glDeleteFramebuffers(1, [self.fbo])
+        glDeleteRenderbuffers(2, [self.color, self.depth])
+
+
+class AsyncReadback:
+    '''
+        ring of pixel pack buffers. glReadPixels into a pbo returns right
+        away, the pixels are mapped a few frames later when the copy is done,
+        so the gpu never has to drain before the next frame is drawn.
+    '''
+    def __init__(self, width, height, depth=3):
+        self.width = width
+        self.height = height
+        self.nbytes = width * height * 4
+        self.pbos = list(glGenBuffers(depth)) if depth > 1 else [glGenBuffers(1)]
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, self.nbytes, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        # frame indices waiting in each pbo, oldest first
+        self.in_flight = []
+        self.next = 0
+
+    def read(self, frame_index):
+        '''
+            queue a read of the bound framebuffer, returns a list of
+            (frame_index, (h,w,4) uint8 array) for reads that are complete
+        '''
+        done = []
+        if len(self.in_flight) == len(self.pbos):
+            done.append(self._map_oldest())
+        pbo = self.pbos[self.next]
+        self.next = (self.next + 1) % len(self.pbos)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.in_flight.append((frame_index, pbo))
+        return done
+
+    def flush(self):
+        done = []
+        while self.in_flight:
+            done.append(self._map_oldest())
+        return done
+
+    def _map_oldest(self):
+        frame_index, pbo = self.in_flight.pop(0)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        ptr = glMapBuffer(GL_PIXEL_PACK_BUFFER, GL_READ_ONLY)
+        pixels = np.ctypeslib.as_array((ctypes.c_ubyte * self.nbytes).from_address(ptr)).copy()
+        glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return frame_index, pixels.reshape(self.height, self.width, 4)
+
+    def release(self):
+        glDeleteBuffers(len(self.pbos), self.pbos)
+
+
+class FrameWriter:
+    '''
+        writes frames on a background thread.
+        'png': one file per frame, frame_000000.png ...
+        'raw': every frame appended to frames.rgba, play back with e.g.
+               ffmpeg -f rawvideo -pix_fmt rgba -s WxH -i frames.rgba -vf vflip out.mp4
+    '''
+    def __init__(self, output_dir, width, height, fmt='png', max_queue=16):
+        if fmt not in ('png', 'raw'):
+            raise ValueError(f"unknown frame format: {fmt}")
+        self.output_dir = output_dir
+        self.width = width
+        self.height = height
+        self.fmt = fmt
+        self.frames_written = 0
+        os.makedirs(output_dir, exist_ok=True)
+        self._raw = open(os.path.join(output_dir, 'frames.rgba'), 'wb') if fmt == 'raw' else None
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="frame-writer", daemon=True)
+        self._thread.start()
+
+    def write(self, frame_index, pixels):
+        self._queue.put((frame_index, pixels))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            frame_index, pixels = item
+            if self._raw is not None:
+                # raw frames stay bottom-up like gl, vflip when encoding
+                self._raw.write(pixels.tobytes())
+            else:
+                # gl rows start at the bottom, images at the top, alpha is dropped
+                # since the window shows the clear color as opaque
+                from PIL import Image
+                Image.fromarray(pixels[::-1, :, :3]).save(
+                    os.path.join(self.output_dir, f"frame_{frame_index:06d}.png"))
+            self.frames_written += 1
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+        if self._raw is not None:
+            self._raw.close()
@@ -0,0 +1,200 @@
+'''
+    per frame cpu (and gpu, where timer queries exist) timings of named
+    sections of the render loop, kept in a rolling window for percentiles
+    and exportable as csv / json.
+    when disabled start/stop return right away, the cost is one attribute
+    check per call.
+'''
+from OpenGL.GL import *
+import numpy as np
+
+import csv
+import ctypes
+import json
+import time
+
+
+def _query_ns(query):
+    # pyopengl has no output array type for 64 bit results, read into a ctypes value
+    value = ctypes.c_uint64()
+    glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(value))
+    return value.value
+
+
+def _nanpercentile(values, q):
+    # per column percentiles, all nan columns (section never ran) give nan
+    out = np.full((len(q), values.shape[1]), np.nan)
+    has = ~np.isnan(values).all(axis=0)
+    if has.any():
+        out[:, has] = np.nanpercentile(values[:, has], q, axis=0)
+    return out
+
+
+class FrameProfiler:
+    def __init__(self, sections, history=600, enabled=False, gpu_frames_in_flight=4):
+        self.sections = list(sections)
+        self.index = {name: i for i, name in enumerate(self.sections)}
+        self.history = history
+        self.enabled = enabled
+        # rolling window, one row per frame, one column per section (ms)
+        self.cpu = np.full((history, len(self.sections)), np.nan)
+        self.gpu = np.full((history, len(self.sections)), np.nan)
+        self.frame_ms = np.full(history, np.nan)
+        self.frames = 0
+        self._row = 0
+        self._starts = [0.0] * len(self.sections)
+        self._frame_start = 0.0
+        # every finished frame is kept for export, not just the window
+        self._log = []
+        self.gpu_supported = None
+        self._gpu_frames_in_flight = gpu_frames_in_flight
+        self._query_sets = []
+        self._pending = []
+        self._queries = None
+        self._gpu_used = [False] * len(self.sections)
+        self._enable_next = enabled
+
+    def _init_gpu(self):
+        # timestamp queries (gl 3.3 / ARB_timer_query), freely interleaved unlike GL_TIME_ELAPSED
+        try:
+            self.gpu_supported = bool(glQueryCounter) and bool(glGenQueries)
+            if self.gpu_supported:
+                count = 2 * len(self.sections)
+                for _ in range(self._gpu_frames_in_flight):
+                    self._query_sets.append(list(np.atleast_1d(glGenQueries(count))))
+        except Exception:
+            self.gpu_supported = False
+        if not self.gpu_supported:
+            print("gpu timer queries not available, profiling cpu only")
+
+    def set_enabled(self, enabled):
+        # takes effect at the next frame so no frame is half measured
+        self._enable_next = enabled
+
+    def begin_frame(self):
+        self.enabled = self._enable_next
+        if not self.enabled:
+            return
+        if self.gpu_supported is None:
+            self._init_gpu()
+        # sections that did not run this frame stay nan
+        self.cpu[self._row] = np.nan
+        self.gpu[self._row] = np.nan
+        self._gpu_used = [False] * len(self.sections)
+        self._queries = None
+        if self.gpu_supported:
+            self._collect_gpu(block=False)
+            if len(self._pending) < len(self._query_sets):
+                used = {id(q) for _, q in self._pending}
+                self._queries = next(q for q in self._query_sets if id(q) not in used)
+        self._frame_start = time.perf_counter()
+
+    def start(self, name):
+        if not self.enabled:
+            return
+        i = self.index[name]
+        if self._queries is not None:
+            glQueryCounter(self._queries[2 * i], GL_TIMESTAMP)
+        self._starts[i] = time.perf_counter()
+
+    def stop(self, name):
+        if not self.enabled:
+            return
+        i = self.index[name]
+        ms = (time.perf_counter() - self._starts[i]) * 1000.0
+        row = self.cpu[self._row]
+        # a section may run more than once a frame, the times add up
+        row[i] = ms if np.isnan(row[i]) else row[i] + ms
+        if self._queries is not None:
+            glQueryCounter(self._queries[2 * i + 1], GL_TIMESTAMP)
+            self._gpu_used[i] = True
+
+    def end_frame(self):
+        if not self.enabled:
+            return
+        self.frame_ms[self._row] = (time.perf_counter() - self._frame_start) * 1000.0
+        if self._queries is not None:
+            self._pending.append(((self._row, self.frames, list(self._gpu_used)), self._queries))
+        # gpu columns are filled in once the queries of this frame come back
+        self._log.append([self.frames, float(self.frame_ms[self._row])]
+                         + self.cpu[self._row].tolist() + [float('nan')] * len(self.sections))
+        self.frames += 1
+        self._row = (self._row + 1) % self.history
+
+    def _collect_gpu(self, block):
+        # read back timestamps of earlier frames whose queries are done
+        while self._pending:
+            (row, frame, used), queries = self._pending[0]
+            last = queries[2 * max(i for i, u in enumerate(used) if u) + 1] if any(used) else None
+            if last is not None and not block and not glGetQueryObjectiv(last, GL_QUERY_RESULT_AVAILABLE):
+                break
+            self._pending.pop(0)
+            # the row may have been reused if the window wrapped
+            in_window = self.frames - frame < self.history
+            for i, u in enumerate(used):
+                if u:
+                    ms = (_query_ns(queries[2 * i + 1]) - _query_ns(queries[2 * i])) / 1e6
+                    self._log[frame][2 + len(self.sections) + i] = ms
+                    if in_window:
+                        self.gpu[row, i] = ms
+
+    def percentiles(self, q=(50, 95, 99)):
+        # {section: {'cpu': [p50, p95, p99], 'gpu': [...]}} over the rolling window
+        filled = min(self.frames, self.history)
+        out = {}
+        if filled == 0:
+            return out
+        cpu = self.cpu[:filled] if self.frames < self.history else self.cpu
+        gpu = self.gpu[:filled] if self.frames < self.history else self.gpu
+        cpu_p = _nanpercentile(cpu, q)
+        gpu_p = _nanpercentile(gpu, q)
+        for name, i in self.index.items():
+            out[name] = {'cpu': cpu_p[:, i].tolist(), 'gpu': gpu_p[:, i].tolist()}
+        frame = self.frame_ms[~np.isnan(self.frame_ms)]
+        out['frame'] = {'cpu': np.percentile(frame, q).tolist(), 'gpu': [float('nan')] * len(q)}
+        return out
+
+    def histogram(self, bins=40, max_ms=50.0):
+        frame = self.frame_ms[~np.isnan(self.frame_ms)]
+        counts, _ = np.histogram(np.minimum(frame, max_ms), bins=bins, range=(0.0, max_ms))
+        return counts.astype(np.float32)
+
+    def export_csv(self, path):
+        self._collect_gpu(block=True)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['frame', 'frame_ms']
+                            + [f"{name}_cpu_ms" for name in self.sections]
+                            + [f"{name}_gpu_ms" for name in self.sections])
+            writer.writerows(self._log)
+        print(f"profile written to {path}")
+
+    def export_json(self, path):
+        self._collect_gpu(block=True)
+        # nan (not measured) becomes null so the file is strict json
+        def clean(values):
+            return [None if v != v else v for v in values]
+        stats = {name: {kind: clean(v) for kind, v in entry.items()}
+                 for name, entry in self.percentiles().items()}
+        data = {
+            'sections': self.sections,
+            'frames': self.frames,
+            'percentiles': {'q': [50, 95, 99], 'ms': stats},
+            'frame_log': [clean(row) for row in self._log],
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+        print(f"profile written to {path}")
+
+    def export(self, path):
+        if path.endswith('.json'):
+            self.export_json(path)
+        else:
+            self.export_csv(path)
+
+    def release(self):
+        if self._query_sets:
+            self._collect_gpu(block=True)
+            for queries in self._query_sets:
+                glDeleteQueries(len(queries), queries)
+            self._query_sets = []
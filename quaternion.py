@@ -1,13 +1,24 @@
 import numpy as np
 import math
+
+import rotations
+
+# products of unit quaternions stay within rounding of unit length, |q|^2
+# this close to 1 is left as is (drift_study.py: lazy:1e-12 drifts no more
+# than renormalizing every step)
+NORMALIZE_TOLERANCE = 1e-12
+
 class Quaternion():
     
     def __init__(self, r, i, j, k):
-        mag = math.sqrt((r * r) + (i * i) + (j * j) + (k * k))
-        self.r = r / mag
-        self.i = i / mag
-        self.j = j / mag
-        self.k = k / mag
+        mag_sq = (r * r) + (i * i) + (j * j) + (k * k)
+        if abs(mag_sq - 1.0) > NORMALIZE_TOLERANCE:
+            mag = math.sqrt(mag_sq)
+            r, i, j, k = r / mag, i / mag, j / mag, k / mag
+        self.r = r
+        self.i = i
+        self.j = j
+        self.k = k
 
     def times(self, q2):
         return Quaternion (
@@ -17,4 +28,144 @@ class Quaternion():
             (self.r * q2.k) + (self.k * q2.r) + (self.i * q2.j) - (self.j * q2.i),
         )
     def inverse(self):
-        return Quaternion (self.r, -self.i, -self.j, -self.k)
\ No newline at end of file
+        return Quaternion (self.r, -self.i, -self.j, -self.k)
+
+class QuaternionArray():
+    '''
+        batch of quaternions stored as an (N,4) float64 array of [r, i, j, k],
+        same component order as Quaternion. operations work on the whole
+        batch at once and broadcast a single quaternion against N.
+    '''
+
+    def __init__(self, data, normalize=True):
+        data = np.array(data, dtype=np.float64).reshape(-1, 4)
+        if normalize:
+            data /= np.linalg.norm(data, axis=1, keepdims=True)
+        self.data = data
+
+    @classmethod
+    def identity(cls, n):
+        data = np.zeros((n, 4))
+        data[:, 0] = 1.0
+        return cls(data, normalize=False)
+
+    @classmethod
+    def from_quaternions(cls, quaternions):
+        return cls([[q.r, q.i, q.j, q.k] for q in quaternions], normalize=False)
+
+    @classmethod
+    def from_axis_angle(cls, axes, angles):
+        # angles in radians, axes (N,3) or (3,)
+        axes = np.asarray(axes, dtype=np.float64).reshape(-1, 3)
+        angles = np.asarray(angles, dtype=np.float64).reshape(-1)
+        return cls(rotations.axis_angle_to_quaternion(axes, angles), normalize=False)
+
+    def to_quaternion(self, index):
+        r, i, j, k = self.data[index]
+        return Quaternion(r, i, j, k)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        return QuaternionArray(self.data[index], normalize=False)
+
+    @property
+    def r(self):
+        return self.data[:, 0]
+
+    @property
+    def i(self):
+        return self.data[:, 1]
+
+    @property
+    def j(self):
+        return self.data[:, 2]
+
+    @property
+    def k(self):
+        return self.data[:, 3]
+
+    def norms(self):
+        return np.linalg.norm(self.data, axis=1)
+
+    def normalized(self):
+        return QuaternionArray(self.data, normalize=True)
+
+    def times(self, q2):
+        # batched hamilton product, self * q2
+        a1, b1, c1, d1 = self.data.T
+        a2, b2, c2, d2 = q2.data.T
+        out = np.empty((max(len(self.data), len(q2.data)), 4))
+        out[:, 0] = a1 * a2 - b1 * b2 - c1 * c2 - d1 * d2
+        out[:, 1] = a1 * b2 + b1 * a2 + c1 * d2 - d1 * c2
+        out[:, 2] = a1 * c2 + c1 * a2 + d1 * b2 - b1 * d2
+        out[:, 3] = a1 * d2 + d1 * a2 + b1 * c2 - c1 * b2
+        return QuaternionArray(out, normalize=False)
+
+    def conjugate(self):
+        return QuaternionArray(self.data * [1.0, -1.0, -1.0, -1.0], normalize=False)
+
+    def inverse(self):
+        norm_sq = np.einsum('ij,ij->i', self.data, self.data)[:, None]
+        return QuaternionArray(self.data * [1.0, -1.0, -1.0, -1.0] / norm_sq, normalize=False)
+
+    def slerp(self, q2, t):
+        '''
+            spherical interpolation from self to q2, t scalar or (N,)
+            takes the short way round and falls back to lerp when the
+            two rotations are almost the same
+        '''
+        q1 = self.data
+        q2 = q2.data.copy()
+        t = np.asarray(t, dtype=np.float64).reshape(-1, 1)
+        dot = np.einsum('ij,ij->i', np.broadcast_to(q1, np.broadcast_shapes(q1.shape, q2.shape)),
+                        np.broadcast_to(q2, np.broadcast_shapes(q1.shape, q2.shape)))[:, None]
+        q2 = np.where(dot < 0.0, -q2, q2)
+        dot = np.abs(dot)
+        close = dot > 0.9995
+        theta = np.arccos(np.clip(dot, -1.0, 1.0))
+        sin_theta = np.where(close, 1.0, np.sin(theta))
+        w1 = np.where(close, 1.0 - t, np.sin((1.0 - t) * theta) / sin_theta)
+        w2 = np.where(close, t, np.sin(t * theta) / sin_theta)
+        return QuaternionArray(w1 * q1 + w2 * q2, normalize=True)
+
+    def to_matrices(self):
+        # (N,3,3) rotation matrices of the unit quaternions
+        return rotations.quaternion_to_matrix(self.data)
+
+    @classmethod
+    def from_matrices(cls, m):
+        # (N,3,3) rotation matrices -> quaternions, see rotations.matrix_to_quaternion
+        return cls(rotations.matrix_to_quaternion(np.asarray(m).reshape(-1, 3, 3)), normalize=False)
+
+    @classmethod
+    def from_euler(cls, yaw, pitch, roll, degrees=True):
+        '''
+            same composition as the euler path in Window._draw_model:
+            rotate yaw about z, then pitch about y, then roll about x
+            (R = Rz(yaw) Ry(pitch) Rx(roll), rotations.APP_SEQUENCE)
+        '''
+        angles = np.stack(np.broadcast_arrays(*(np.asarray(a, dtype=np.float64).reshape(-1)
+                                                for a in (yaw, pitch, roll))), axis=1)
+        return cls(rotations.euler_to_quaternion(angles, degrees=degrees), normalize=False)
+
+    def to_euler(self, degrees=True):
+        '''
+            inverse of from_euler, returns (N,3) [yaw, pitch, roll]
+            at pitch = +-90 only yaw - roll (or yaw + roll) is defined,
+            roll is set to 0 there and yaw carries the whole rotation
+        '''
+        return rotations.quaternion_to_euler(self.data, degrees=degrees)
+
+    def rotate(self, points):
+        '''
+            rotate (M,3) points, one quaternion for all points or one per point
+            v' = v + 2r(q x v) + 2 q x (q x v), no matrices built
+        '''
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        q = self.normalized().data
+        r = q[:, :1]
+        u = q[:, 1:]
+        t = 2.0 * np.cross(u, points)
+        return points + r * t + np.cross(u, t)
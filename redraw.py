@@ -0,0 +1,84 @@
+'''
+    render on demand for the window loop. a frame is drawn when what it
+    shows changed since the last one, when something is animating, or for a
+    few frames after any input event (imgui reacts to clicks and hovers one
+    frame later). when none of that holds the loop blocks on the event queue
+    instead of redrawing an identical frame 60 times a second.
+
+    the window describes what it draws as a tuple of plain values (angles,
+    camera, model, toggles), any difference from the last drawn tuple marks
+    the frame dirty, so nothing has to remember to set a flag.
+
+    continuous mode draws every frame, as the window always did.
+'''
+import time
+
+# frames drawn after an input event, the event itself, the imgui reaction
+# to it and the action a click queued
+INPUT_REDRAW_FRAMES = 3
+
+# longest block on the event queue, background work that posts no events
+# (asset loads) is noticed within this
+IDLE_WAIT_SECONDS = 0.5
+
+# seconds the cpu and idle percentages are averaged over
+METER_SECONDS = 1.0
+
+
+class RedrawTracker:
+    def __init__(self, on_demand=True):
+        self.on_demand = on_demand
+        self.frames_drawn = 0
+        # frame slots at the target fps that were not drawn, blocked time included
+        self.frames_skipped = 0
+        # process cpu over the last METER_SECONDS as % of one core, and the
+        # share of that time the loop spent blocked waiting for input
+        self.cpu_percent = 0.0
+        self.idle_percent = 0.0
+        self._state = None
+        # the first frame is always drawn
+        self._owed = 1
+        self._meter_wall = time.perf_counter()
+        self._meter_cpu = time.process_time()
+        self._meter_idle = 0.0
+
+    def set_on_demand(self, on_demand):
+        self.on_demand = on_demand
+        self._owed = max(self._owed, 1)
+
+    def touch(self, frames=INPUT_REDRAW_FRAMES):
+        # input arrived, draw at least the next frames
+        self._owed = max(self._owed, frames)
+
+    def needs_redraw(self, state, animating):
+        # state: tuple of everything the frame shows, compared to the last drawn one
+        changed = state != self._state
+        self._state = state
+        if not self.on_demand or changed or animating or self._owed:
+            self._owed = max(self._owed - 1, 0)
+            self.frames_drawn += 1
+            return True
+        self.frames_skipped += 1
+        return False
+
+    def idle(self, animating):
+        # nothing will change until the next event, the loop can block
+        return self.on_demand and not animating and not self._owed
+
+    def waited(self, seconds, fps):
+        # time blocked on the event queue, every frame slot in it was skipped
+        self.frames_skipped += int(seconds * fps)
+        self._meter_idle += seconds
+
+    def sample(self):
+        # once per loop iteration, refreshes the percentages every METER_SECONDS
+        wall = time.perf_counter()
+        elapsed = wall - self._meter_wall
+        if elapsed < METER_SECONDS:
+            return
+        cpu = time.process_time()
+        self.cpu_percent = 100.0 * (cpu - self._meter_cpu) / elapsed
+        self.idle_percent = 100.0 * min(self._meter_idle / elapsed, 1.0)
+        self._meter_wall = wall
+        self._meter_cpu = cpu
+        self._meter_idle = 0.0
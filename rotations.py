@@ -0,0 +1,284 @@
+'''
+    conversions between euler angles, quaternions, rotation matrices and
+    axis-angle, vectorized over leading dimensions:
+        euler angles    (...,3) in the order of the sequence
+        quaternions     (...,4) [r, i, j, k], same order as Quaternion
+        matrices        (...,3,3), column vectors (v' = m @ v)
+        axis-angle      (...,3) unit axes and (...) angles
+    angles are radians unless degrees=True.
+
+    euler sequences are three axis letters, the 6 tait-bryan ones ('zyx',
+    ...) and the 6 proper euler ones ('zxz', ...). intrinsic rotations turn
+    about the already rotated axes, like a chain of glRotatef calls:
+    intrinsic 'zyx' [a, b, c] is Rz(a) Ry(b) Rx(c), the app's
+    [yaw, pitch, roll]. extrinsic rotations turn about the fixed axes,
+    extrinsic 'xyz' [c, b, a] is the same rotation.
+
+    quaternion_to_euler uses the direct quaternion method of bernardes and
+    viollet (2022): every angle comes from atan2, no asin or acos, so it
+    stays accurate right up to the gimbal singularity (middle angle +-90
+    for tait-bryan, 0 or 180 for proper euler sequences). at the singularity
+    only the sum or difference of the outer angles is defined, the last
+    angle of the sequence (the first one for extrinsic) is set to 0 and the
+    other outer angle carries the whole rotation.
+
+    benchmark and validation against the glRotatef chain:
+        python -m benchmarks.bench_rotations
+'''
+import numpy as np
+
+AXES = 'xyz'
+
+TAIT_BRYAN = ('xyz', 'xzy', 'yxz', 'yzx', 'zxy', 'zyx')
+PROPER_EULER = ('xyx', 'xzx', 'yxy', 'yzy', 'zxz', 'zyz')
+SEQUENCES = TAIT_BRYAN + PROPER_EULER
+
+# [yaw, pitch, roll] as Window._draw_model applies them: z, then y, then x
+APP_SEQUENCE = 'zyx'
+
+# radians of the middle angle from the singularity below which the outer
+# angles are not split, only their sum or difference is kept. closer than
+# this atan2 of the tiny off-axis terms is rounding noise. any split that
+# is made stays an exact decomposition, so the tolerance only costs its
+# own size in accuracy
+SINGULAR_TOLERANCE = 1e-12
+
+
+def _axes(sequence):
+    sequence = sequence.lower()
+    if sequence not in SEQUENCES:
+        raise ValueError(f"unknown euler sequence {sequence!r}, expected one of {', '.join(SEQUENCES)}")
+    return [AXES.index(axis) for axis in sequence]
+
+
+def multiply(q1, q2):
+    # hamilton product q1 * q2 of (...,4) arrays, broadcasting
+    q1 = np.asarray(q1, dtype=np.float64)
+    q2 = np.asarray(q2, dtype=np.float64)
+    a1, b1, c1, d1 = np.moveaxis(q1, -1, 0)
+    a2, b2, c2, d2 = np.moveaxis(q2, -1, 0)
+    return np.stack([a1 * a2 - b1 * b2 - c1 * c2 - d1 * d2,
+                     a1 * b2 + b1 * a2 + c1 * d2 - d1 * c2,
+                     a1 * c2 + c1 * a2 + d1 * b2 - b1 * d2,
+                     a1 * d2 + d1 * a2 + b1 * c2 - c1 * b2], axis=-1)
+
+
+def normalize(q):
+    q = np.asarray(q, dtype=np.float64)
+    return q / np.linalg.norm(q, axis=-1, keepdims=True)
+
+
+def euler_to_quaternion(angles, sequence=APP_SEQUENCE, intrinsic=True, degrees=False):
+    angles = np.asarray(angles, dtype=np.float64)
+    if degrees:
+        angles = np.radians(angles)
+    axes = _axes(sequence)
+    half = 0.5 * angles
+    result = None
+    for n, axis in enumerate(axes):
+        q = np.zeros(angles.shape[:-1] + (4,))
+        q[..., 0] = np.cos(half[..., n])
+        q[..., 1 + axis] = np.sin(half[..., n])
+        if result is None:
+            result = q
+        elif intrinsic:
+            result = multiply(result, q)
+        else:
+            result = multiply(q, result)
+    return result
+
+
+def quaternion_to_euler(q, sequence=APP_SEQUENCE, intrinsic=True, degrees=False):
+    '''
+        (...,4) quaternions, unit or not, -> (...,3) angles in (-pi, pi].
+        the middle angle is in [-pi/2, pi/2] (tait-bryan) or [0, pi] (proper)
+    '''
+    q = np.asarray(q, dtype=np.float64)
+    axes = _axes(sequence)
+    # the method is written for extrinsic sequences, intrinsic a b c is
+    # extrinsic c b a with the angles reversed
+    if intrinsic:
+        axes = axes[::-1]
+    i, j, k = axes
+    proper = i == k
+    if proper:
+        k = 3 - i - j
+    # +1 for cyclic axis orders (xyz, yzx, zxy), -1 otherwise
+    sign = (i - j) * (j - k) * (k - i) // 2
+    w = q[..., 0]
+    qi = q[..., 1 + i]
+    qj = q[..., 1 + j]
+    qk = q[..., 1 + k] * sign
+    if proper:
+        a, b, c, d = w, qi, qj, qk
+    else:
+        # rotated by 90 degrees about j, the tait-bryan case becomes a proper one
+        a, b, c, d = w - qj, qi + qk, qj + w, qk - qi
+
+    middle = 2.0 * np.arctan2(np.hypot(c, d), np.hypot(a, b))
+    half_sum = np.arctan2(b, a)
+    half_diff = np.arctan2(d, c)
+    low = middle < SINGULAR_TOLERANCE
+    high = middle > np.pi - SINGULAR_TOLERANCE
+    first = np.where(low | high, 0.0, half_sum - half_diff)
+    third = np.where(low, 2.0 * half_sum, np.where(high, 2.0 * half_diff, half_sum + half_diff))
+    if not proper:
+        third = third * sign
+        middle = middle - 0.5 * np.pi
+    angles = np.stack([first, middle, third], axis=-1)
+    if intrinsic:
+        angles = angles[..., ::-1]
+    # wrap into (-pi, pi]
+    angles = np.pi - np.mod(np.pi - angles, 2.0 * np.pi)
+    return np.degrees(angles) if degrees else angles
+
+
+def quaternion_to_matrix(q):
+    # (...,4) -> (...,3,3), normalized first
+    r, i, j, k = np.moveaxis(normalize(q), -1, 0)
+    m = np.empty(r.shape + (3, 3))
+    m[..., 0, 0] = 1 - 2 * (j * j + k * k)
+    m[..., 0, 1] = 2 * (i * j - k * r)
+    m[..., 0, 2] = 2 * (i * k + j * r)
+    m[..., 1, 0] = 2 * (i * j + k * r)
+    m[..., 1, 1] = 1 - 2 * (i * i + k * k)
+    m[..., 1, 2] = 2 * (j * k - i * r)
+    m[..., 2, 0] = 2 * (i * k - j * r)
+    m[..., 2, 1] = 2 * (j * k + i * r)
+    m[..., 2, 2] = 1 - 2 * (i * i + j * j)
+    return m
+
+
+def matrix_to_quaternion(m):
+    '''
+        (...,3,3) rotation matrices -> unit quaternions
+        picks the largest of r, i, j, k per matrix to avoid dividing by
+        a tiny number (shepperd's method)
+    '''
+    m = np.asarray(m, dtype=np.float64)
+    shape = m.shape[:-2]
+    m = m.reshape(-1, 3, 3)
+    trace = m[:, 0, 0] + m[:, 1, 1] + m[:, 2, 2]
+    cases = np.stack([trace, m[:, 0, 0], m[:, 1, 1], m[:, 2, 2]], axis=1)
+    pick = np.argmax(cases, axis=1)
+    out = np.empty((len(m), 4))
+
+    s = pick == 0
+    t = np.sqrt(1.0 + trace[s]) * 2
+    out[s] = np.stack([0.25 * t,
+                       (m[s, 2, 1] - m[s, 1, 2]) / t,
+                       (m[s, 0, 2] - m[s, 2, 0]) / t,
+                       (m[s, 1, 0] - m[s, 0, 1]) / t], axis=1)
+    s = pick == 1
+    t = np.sqrt(1.0 + m[s, 0, 0] - m[s, 1, 1] - m[s, 2, 2]) * 2
+    out[s] = np.stack([(m[s, 2, 1] - m[s, 1, 2]) / t,
+                       0.25 * t,
+                       (m[s, 0, 1] + m[s, 1, 0]) / t,
+                       (m[s, 0, 2] + m[s, 2, 0]) / t], axis=1)
+    s = pick == 2
+    t = np.sqrt(1.0 + m[s, 1, 1] - m[s, 0, 0] - m[s, 2, 2]) * 2
+    out[s] = np.stack([(m[s, 0, 2] - m[s, 2, 0]) / t,
+                       (m[s, 0, 1] + m[s, 1, 0]) / t,
+                       0.25 * t,
+                       (m[s, 1, 2] + m[s, 2, 1]) / t], axis=1)
+    s = pick == 3
+    t = np.sqrt(1.0 + m[s, 2, 2] - m[s, 0, 0] - m[s, 1, 1]) * 2
+    out[s] = np.stack([(m[s, 1, 0] - m[s, 0, 1]) / t,
+                       (m[s, 0, 2] + m[s, 2, 0]) / t,
+                       (m[s, 1, 2] + m[s, 2, 1]) / t,
+                       0.25 * t], axis=1)
+    return normalize(out).reshape(shape + (4,))
+
+
+def axis_angle_to_quaternion(axes, angles, degrees=False):
+    # axes (...,3), normalized here, angles (...)
+    axes = normalize(axes)
+    angles = np.asarray(angles, dtype=np.float64)
+    if degrees:
+        angles = np.radians(angles)
+    half = 0.5 * angles[..., None]
+    return np.concatenate([np.cos(half), np.sin(half) * axes], axis=-1)
+
+
+def quaternion_to_axis_angle(q, degrees=False):
+    '''
+        (...,4) -> (axes (...,3), angles (...)) with angles in [0, pi].
+        the angle comes from atan2 of the vector and scalar parts, exact
+        for small rotations where acos(r) is not. rotations close enough to
+        the identity to have no direction get the x axis and angle 0
+    '''
+    q = normalize(q)
+    # q and -q are the same rotation, r >= 0 gives the short way round
+    q = np.where(q[..., :1] < 0.0, -q, q)
+    vector = q[..., 1:]
+    length = np.linalg.norm(vector, axis=-1)
+    angles = 2.0 * np.arctan2(length, q[..., 0])
+    axes = np.where(length[..., None] > 0.0, vector / np.where(length > 0.0, length, 1.0)[..., None],
+                    [1.0, 0.0, 0.0])
+    return axes, (np.degrees(angles) if degrees else angles)
+
+
+def axis_angle_to_matrix(axes, angles, degrees=False):
+    '''
+        (...,3,3) written out the way the opengl spec defines glRotate,
+        so a chain of these is exactly what a chain of glRotatef calls makes
+    '''
+    x, y, z = np.moveaxis(normalize(axes), -1, 0)
+    angles = np.asarray(angles, dtype=np.float64)
+    if degrees:
+        angles = np.radians(angles)
+    c = np.cos(angles)
+    s = np.sin(angles)
+    t = 1.0 - c
+    m = np.empty(np.broadcast_shapes(x.shape, c.shape) + (3, 3))
+    m[..., 0, 0] = x * x * t + c
+    m[..., 0, 1] = x * y * t - z * s
+    m[..., 0, 2] = x * z * t + y * s
+    m[..., 1, 0] = y * x * t + z * s
+    m[..., 1, 1] = y * y * t + c
+    m[..., 1, 2] = y * z * t - x * s
+    m[..., 2, 0] = x * z * t - y * s
+    m[..., 2, 1] = y * z * t + x * s
+    m[..., 2, 2] = z * z * t + c
+    return m
+
+
+def matrix_to_axis_angle(m, degrees=False):
+    return quaternion_to_axis_angle(matrix_to_quaternion(m), degrees)
+
+
+def euler_to_matrix(angles, sequence=APP_SEQUENCE, intrinsic=True, degrees=False):
+    # product of the three axis matrices, same factors as the glRotatef chain
+    angles = np.asarray(angles, dtype=np.float64)
+    if degrees:
+        angles = np.radians(angles)
+    axes = _axes(sequence)
+    result = None
+    for n, axis in enumerate(axes):
+        c = np.cos(angles[..., n])
+        s = np.sin(angles[..., n])
+        m = np.zeros(angles.shape[:-1] + (3, 3))
+        u, v = (axis + 1) % 3, (axis + 2) % 3
+        m[..., axis, axis] = 1.0
+        m[..., u, u] = c
+        m[..., v, v] = c
+        m[..., u, v] = -s
+        m[..., v, u] = s
+        if result is None:
+            result = m
+        elif intrinsic:
+            result = result @ m
+        else:
+            result = m @ result
+    return result
+
+
+def matrix_to_euler(m, sequence=APP_SEQUENCE, intrinsic=True, degrees=False):
+    return quaternion_to_euler(matrix_to_quaternion(m), sequence, intrinsic, degrees)
+
+
+def gl_rotation(m):
+    # one (3,3) rotation as the 16 column major floats glMultMatrixf takes
+    out = np.eye(4, dtype=np.float32)
+    out[:3, :3] = m
+    return out.T.reshape(-1)
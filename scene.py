@@ -0,0 +1,226 @@
+'''
+    many independently rotating copies of one model, drawn with hardware
+    instancing. orientations live in packed arrays: every even instance
+    integrates euler angles, the odd one next to it composes quaternion
+    steps at the same rates, so the two methods can be compared side by side.
+
+    SceneRenderer draws both this grid and the single model through the
+    glsl program in shaders.py, the orientation goes to the gpu as a
+    quaternion and camera matrices come from pyglm.
+'''
+import ctypes
+
+import numpy as np
+from OpenGL.GL import *
+
+from quaternion import QuaternionArray
+from shaders import (ShaderProgram, gl_matrix, MODEL_VERTEX, MODEL_FRAGMENT, ATTRIB_POSITION, ATTRIB_UV,
+                     ATTRIB_NORMAL, ATTRIB_INSTANCE_ORIENTATION, ATTRIB_INSTANCE_OFFSET,
+                     ATTRIB_INSTANCE_COLOR)
+from model_loader import VERTEX_FLOATS
+
+EULER_COLOR = (1.0, 0.75, 0.75)
+QUATERNION_COLOR = (0.75, 0.85, 1.0)
+
+
+class InstancedScene:
+    '''
+        count objects on a square grid in the xy plane, extent world units wide.
+        euler: (N,3) [yaw, pitch, roll] degrees, rows of quaternion instances unused
+        quaternions: QuaternionArray (N,), rows of euler instances unused
+    '''
+    def __init__(self, count, extent=250.0, max_rate=2.0, seed=0):
+        self.count = count
+        rng = np.random.default_rng(seed)
+        side = max(1, int(np.ceil(np.sqrt(count))))
+        self.spacing = extent / side
+        # every model is scaled to fit this radius, one grid cell
+        self.instance_radius = 0.45 * self.spacing
+        grid = np.arange(count)
+        self.offsets = np.zeros((count, 3), dtype=np.float32)
+        self.offsets[:, 0] = (grid % side - (side - 1) / 2) * self.spacing
+        self.offsets[:, 1] = (grid // side - (side - 1) / 2) * self.spacing
+
+        self.is_quaternion = (grid % 2) == 1
+        # degrees per step, pairs share the same rates
+        rates = rng.uniform(-max_rate, max_rate, size=((count + 1) // 2, 3))
+        self.rates = np.repeat(rates, 2, axis=0)[:count]
+        self.euler = np.zeros((count, 3))
+        self.quaternions = QuaternionArray.identity(count)
+        # body frame increment per step, same composition as Window's i/j/k quats
+        self.quaternion_steps = QuaternionArray.from_euler(
+            self.rates[:, 0], self.rates[:, 1], self.rates[:, 2])
+        self.steps = 0
+
+        self.colors = np.where(self.is_quaternion[:, None], QUATERNION_COLOR, EULER_COLOR).astype(np.float32)
+        # [r, i, j, k] per instance, rewritten every frame
+        self.orientations = np.zeros((count, 4), dtype=np.float32)
+
+    def step(self, steps=1):
+        for _ in range(steps):
+            self.euler += self.rates
+            self.quaternions = self.quaternions.times(self.quaternion_steps).normalized()
+        self.euler %= 360.0
+        self.steps += steps
+
+    def instance_orientations(self):
+        # one vectorized pass, (N,4) float32. euler rows go through
+        # Rz(yaw) Ry(pitch) Rx(roll) like the glRotatef chain
+        euler = self.euler[~self.is_quaternion]
+        self.orientations[self.is_quaternion] = self.quaternions.data[self.is_quaternion]
+        self.orientations[~self.is_quaternion] = QuaternionArray.from_euler(
+            euler[:, 0], euler[:, 1], euler[:, 2]).data
+        return self.orientations
+
+    def rotation_matrices(self):
+        # (N,3,3) for analysis, rendering only needs the quaternions
+        return QuaternionArray(self.instance_orientations(), normalize=False).to_matrices()
+
+
+class SceneRenderer:
+    '''
+        glsl path for ModelLoader buffers. begin() sets the camera once per
+        frame, then draw_model() or draw_instances(). vertex arrays are
+        rebuilt when the model (or scene) changes.
+    '''
+    def __init__(self):
+        self.program = ShaderProgram(MODEL_VERTEX, MODEL_FRAGMENT)
+        self.orientation_vbo = glGenBuffers(1)
+        self.offset_vbo = glGenBuffers(1)
+        self.color_vbo = glGenBuffers(1)
+        # (model, vao) and (model, scene, vao) of the last draws
+        self._single = (None, None)
+        self._instanced = (None, None, None)
+        self._radius = 1.0
+
+    def _create_vao(self, model):
+        if not model.vbo:
+            model.set_use_buffers(True)
+        vao = glGenVertexArrays(1)
+        glBindVertexArray(vao)
+        stride = VERTEX_FLOATS * 4
+        glBindBuffer(GL_ARRAY_BUFFER, model.vbo)
+        glEnableVertexAttribArray(ATTRIB_POSITION)
+        glVertexAttribPointer(ATTRIB_POSITION, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(0))
+        if model.draw_has_uvs:
+            glEnableVertexAttribArray(ATTRIB_UV)
+            glVertexAttribPointer(ATTRIB_UV, 2, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(3 * 4))
+        if model.draw_has_normals:
+            glEnableVertexAttribArray(ATTRIB_NORMAL)
+            glVertexAttribPointer(ATTRIB_NORMAL, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(5 * 4))
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, model.ebo)
+        return vao
+
+    def _single_vao(self, model):
+        cached, vao = self._single
+        if cached is not model:
+            if vao:
+                glDeleteVertexArrays(1, [vao])
+            vao = self._create_vao(model)
+            glBindVertexArray(0)
+            self._single = (model, vao)
+        return vao
+
+    def _instanced_vao(self, model, scene):
+        cached_model, cached_scene, vao = self._instanced
+        if cached_model is model and cached_scene is scene:
+            return vao
+        if vao:
+            glDeleteVertexArrays(1, [vao])
+        vao = self._create_vao(model)
+        # fit the model into one grid cell
+        offsets = np.empty((scene.count, 4), dtype=np.float32)
+        offsets[:, :3] = scene.offsets
+        offsets[:, 3] = scene.instance_radius / model.radius
+        for location, vbo, data, usage in (
+                (ATTRIB_INSTANCE_ORIENTATION, self.orientation_vbo, scene.orientations, GL_STREAM_DRAW),
+                (ATTRIB_INSTANCE_OFFSET, self.offset_vbo, offsets, GL_STATIC_DRAW),
+                (ATTRIB_INSTANCE_COLOR, self.color_vbo, scene.colors, GL_STATIC_DRAW)):
+            glBindBuffer(GL_ARRAY_BUFFER, vbo)
+            glBufferData(GL_ARRAY_BUFFER, data.nbytes, data, usage)
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, data.shape[1], GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+            glVertexAttribDivisor(location, 1)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self._instanced = (model, scene, vao)
+        return vao
+
+    def begin(self, projection, view):
+        # glm matrices, shared with the fixed function stack for the rings
+        program = self.program
+        program.use()
+        glUniformMatrix4fv(program.uniform("projection"), 1, GL_FALSE, gl_matrix(projection))
+        glUniformMatrix4fv(program.uniform("view"), 1, GL_FALSE, gl_matrix(view))
+        # same values as GL_LIGHT0 in Window._init_opengl, ambient includes
+        # the default 0.2 global ambient of the fixed function pipeline
+        glUniform3f(program.uniform("light_position"), 5.0, 5.0, 5.0)
+        glUniform3f(program.uniform("ambient"), 0.4, 0.4, 0.4)
+        glUniform3f(program.uniform("light_diffuse"), 0.8, 0.8, 0.8)
+        glUniform1i(program.uniform("diffuse"), 0)
+
+    def _draw_batches(self, model, level, stats, instances=None):
+        # one draw per sub-mesh, the texture is only rebound when it changes
+        program = self.program
+        bound = -1
+        for material, texture_id, color, offset, count in model.draw_batches(level):
+            if (texture_id or 0) != bound:
+                bound = texture_id or 0
+                glBindTexture(GL_TEXTURE_2D, bound)
+                glUniform1i(program.uniform("use_texture"), bool(texture_id))
+                if stats is not None:
+                    stats.state_changes += 1
+            glUniform3f(program.uniform("base_color"), *color)
+            glUniform3f(program.uniform("specular"), *material['specular'][:3])
+            glUniform1f(program.uniform("shininess"), material['shininess'])
+            if instances is None:
+                glDrawElements(GL_TRIANGLES, count, GL_UNSIGNED_INT, ctypes.c_void_p(offset))
+            else:
+                glDrawElementsInstanced(GL_TRIANGLES, count, GL_UNSIGNED_INT,
+                                        ctypes.c_void_p(offset), instances)
+            if stats is not None:
+                stats.state_changes += 1
+                stats.draw_calls += 1
+
+    def draw_model(self, model, orientation, stats=None):
+        # orientation: [r, i, j, k], rotated on the gpu
+        # stats: DrawStats that counts the draws and state changes
+        if not model.has_model:
+            return
+        glUniform4f(self.program.uniform("orientation"), *orientation)
+        glBindVertexArray(self._single_vao(model))
+        # instance attributes are disabled in this vao, these constants apply
+        glVertexAttrib4f(ATTRIB_INSTANCE_ORIENTATION, 1.0, 0.0, 0.0, 0.0)
+        glVertexAttrib4f(ATTRIB_INSTANCE_OFFSET, 0.0, 0.0, 0.0, 1.0)
+        glVertexAttrib3f(ATTRIB_INSTANCE_COLOR, 1.0, 1.0, 1.0)
+        self._draw_batches(model, None, stats)
+        glBindVertexArray(0)
+
+    def draw_instances(self, model, scene, lod=None, stats=None):
+        # lod: level of detail for the copies, the model's own level if None
+        if not model.has_model:
+            return
+        vao = self._instanced_vao(model, scene)
+        orientations = scene.instance_orientations()
+        # orphan the old storage so the driver does not wait on last frame's draw
+        glBindBuffer(GL_ARRAY_BUFFER, self.orientation_vbo)
+        glBufferData(GL_ARRAY_BUFFER, orientations.nbytes, None, GL_STREAM_DRAW)
+        glBufferSubData(GL_ARRAY_BUFFER, 0, orientations.nbytes, orientations)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+        glUniform4f(self.program.uniform("orientation"), 1.0, 0.0, 0.0, 0.0)
+        glBindVertexArray(vao)
+        self._draw_batches(model, lod, stats, scene.count)
+        glBindVertexArray(0)
+
+    def end(self):
+        glUseProgram(0)
+
+    def release(self):
+        for vao in (self._single[1], self._instanced[2]):
+            if vao:
+                glDeleteVertexArrays(1, [vao])
+        glDeleteBuffers(3, [self.orientation_vbo, self.offset_vbo, self.color_vbo])
+        self.program.release()
+        self._single = (None, None)
+        self._instanced = (None, None, None)
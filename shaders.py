@@ -0,0 +1,155 @@
+'''
+    glsl program helpers and the shader sources used by the renderers.
+    attribute locations are fixed so vertex array setup does not need to
+    look them up per program:
+        0 position, 1 uv, 2 normal,
+        3 instance orientation, 4 instance offset + scale, 5 instance color
+'''
+from OpenGL.GL import *
+import numpy as np
+
+ATTRIB_POSITION = 0
+ATTRIB_UV = 1
+ATTRIB_NORMAL = 2
+ATTRIB_INSTANCE_ORIENTATION = 3
+ATTRIB_INSTANCE_OFFSET = 4
+ATTRIB_INSTANCE_COLOR = 5
+
+ATTRIBUTES = {
+    'position': ATTRIB_POSITION,
+    'uv': ATTRIB_UV,
+    'normal': ATTRIB_NORMAL,
+    'instance_orientation': ATTRIB_INSTANCE_ORIENTATION,
+    'instance_offset': ATTRIB_INSTANCE_OFFSET,
+    'instance_color': ATTRIB_INSTANCE_COLOR,
+}
+
+# one program for the single model and the instanced grid. rotation is
+# orientation * instance_orientation, both [r, i, j, k] quaternions, so no
+# matrices or trig are needed per object. a single model leaves the instance
+# attributes disabled and sets them to identity with glVertexAttrib.
+MODEL_VERTEX = '''
+#version 130
+in vec3 position;
+in vec2 uv;
+in vec3 normal;
+in vec4 instance_orientation;
+in vec4 instance_offset;     // xyz translation, w uniform scale
+in vec3 instance_color;
+uniform mat4 view;
+uniform mat4 projection;
+uniform vec4 orientation;
+out vec3 view_position;
+out vec3 view_normal;
+out vec2 frag_uv;
+out vec3 frag_color;
+
+vec3 rotate(vec4 q, vec3 v) {
+    vec3 t = 2.0 * cross(q.yzw, v);
+    return v + q.x * t + cross(q.yzw, t);
+}
+
+void main() {
+    vec3 local = rotate(orientation, rotate(instance_orientation, position));
+    vec4 world = vec4(instance_offset.xyz + instance_offset.w * local, 1.0);
+    vec4 eye = view * world;
+    gl_Position = projection * eye;
+    view_position = eye.xyz;
+    view_normal = mat3(view) * rotate(orientation, rotate(instance_orientation, normal));
+    frag_uv = uv;
+    frag_color = instance_color;
+}
+'''
+
+# per fragment version of the fixed function light0 setup in Window._init_opengl
+MODEL_FRAGMENT = '''
+#version 130
+in vec3 view_position;
+in vec3 view_normal;
+in vec2 frag_uv;
+in vec3 frag_color;
+uniform sampler2D diffuse;
+uniform bool use_texture;
+uniform vec3 base_color;
+uniform vec3 light_position;    // view space
+uniform vec3 ambient;
+uniform vec3 light_diffuse;
+uniform vec3 specular;
+uniform float shininess;
+out vec4 color;
+void main() {
+    vec3 base = (use_texture ? texture(diffuse, frag_uv).rgb : base_color) * frag_color;
+    vec3 n = normalize(view_normal);
+    // faces are drawn from both sides, light the side facing the camera
+    if (!gl_FrontFacing) n = -n;
+    vec3 l = normalize(light_position - view_position);
+    vec3 h = normalize(l - normalize(view_position));
+    float lambert = max(dot(n, l), 0.0);
+    float spec = lambert > 0.0 ? pow(max(dot(n, h), 0.0), max(shininess, 1.0)) : 0.0;
+    color = vec4(base * (ambient + light_diffuse * lambert) + specular * spec, 1.0);
+}
+'''
+
+
+def gl_matrix(m):
+    # glm matrix -> column major float32 array for glLoadMatrixf / glUniformMatrix4fv
+    return np.ascontiguousarray(np.array(m, dtype=np.float32).T)
+
+
+def _log_text(log):
+    return log.decode(errors='replace') if isinstance(log, bytes) else str(log)
+
+
+def compile_shader(source, shader_type):
+    shader = glCreateShader(shader_type)
+    glShaderSource(shader, source)
+    glCompileShader(shader)
+    if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+        log = glGetShaderInfoLog(shader)
+        glDeleteShader(shader)
+        raise RuntimeError(f"shader compile failed: {_log_text(log)}")
+    return shader
+
+
+def create_program(vertex_source, fragment_source, attributes=ATTRIBUTES):
+    # compile, bind the fixed attribute locations and link
+    vertex = compile_shader(vertex_source, GL_VERTEX_SHADER)
+    fragment = compile_shader(fragment_source, GL_FRAGMENT_SHADER)
+    program = glCreateProgram()
+    glAttachShader(program, vertex)
+    glAttachShader(program, fragment)
+    for name, location in attributes.items():
+        glBindAttribLocation(program, location, name)
+    glLinkProgram(program)
+    # the program keeps the compiled code, the shader objects can go
+    glDetachShader(program, vertex)
+    glDetachShader(program, fragment)
+    glDeleteShader(vertex)
+    glDeleteShader(fragment)
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        log = glGetProgramInfoLog(program)
+        glDeleteProgram(program)
+        raise RuntimeError(f"program link failed: {_log_text(log)}")
+    return program
+
+
+class ShaderProgram:
+    # linked program with cached uniform locations
+    def __init__(self, vertex_source, fragment_source, attributes=ATTRIBUTES):
+        self.program = create_program(vertex_source, fragment_source, attributes)
+        self._uniforms = {}
+
+    def uniform(self, name):
+        location = self._uniforms.get(name)
+        if location is None:
+            location = glGetUniformLocation(self.program, name)
+            self._uniforms[name] = location
+        return location
+
+    def use(self):
+        glUseProgram(self.program)
+
+    def release(self):
+        if self.program:
+            glDeleteProgram(self.program)
+        self.program = None
@@ -0,0 +1,154 @@
+'''
+    fixed timestep orientation simulation, independent of the render rate.
+    frames feed their elapsed time into an accumulator, the simulation runs
+    as many whole steps as fit and the display interpolates between the
+    last two states. a slow frame runs more steps instead of changing how
+    far one key press rotates the plane.
+
+    step sizes are given per 1/60 s (the rate the app used to update at) and
+    are scaled to the step length, so any simulation rate rotates at the same
+    speed.
+'''
+import math
+
+from quaternion import Quaternion
+
+BASE_RATE = 60.0
+
+# held control -> (euler index, sign, quaternion step, inverse), in the order
+# Window applied them, quaternion products do not commute
+ORIENTATION_CONTROLS = [
+    ("i", 0, -1, 'i', False),
+    ("j", 0, +1, 'i', True),
+    ("u", 1, -1, 'j', False),
+    ("h", 1, +1, 'j', True),
+    ("o", 2, -1, 'k', False),
+    ("k", 2, +1, 'k', True),
+]
+
+
+class OrientationState:
+    def __init__(self, yaw=0.0, pitch=0.0, roll=0.0, quaternion=None):
+        self.euler = [yaw, pitch, roll]
+        self.quaternion = quaternion if quaternion is not None else Quaternion(1, 0, 0, 0)
+
+    @property
+    def yaw(self):
+        return self.euler[0]
+
+    @property
+    def pitch(self):
+        return self.euler[1]
+
+    @property
+    def roll(self):
+        return self.euler[2]
+
+    def copy(self):
+        return OrientationState(*self.euler, quaternion=self.quaternion)
+
+
+def power(q, t):
+    # q^t, same axis with the angle scaled by t
+    r = max(-1.0, min(1.0, q.r))
+    imag = math.sqrt(q.i * q.i + q.j * q.j + q.k * q.k)
+    if imag < 1e-12:
+        return Quaternion(1, 0, 0, 0)
+    half = math.acos(r) * t
+    s = math.sin(half) / imag
+    return Quaternion(math.cos(half), q.i * s, q.j * s, q.k * s)
+
+
+def slerp(q1, q2, t):
+    # scalar version of QuaternionArray.slerp for the display interpolation
+    dot = q1.r * q2.r + q1.i * q2.i + q1.j * q2.j + q1.k * q2.k
+    sign = 1.0
+    if dot < 0.0:
+        dot, sign = -dot, -1.0
+    if dot > 0.9995:
+        w1, w2 = 1.0 - t, t
+    else:
+        theta = math.acos(min(dot, 1.0))
+        w1 = math.sin((1.0 - t) * theta) / math.sin(theta)
+        w2 = math.sin(t * theta) / math.sin(theta)
+    w2 *= sign
+    return Quaternion(w1 * q1.r + w2 * q2.r, w1 * q1.i + w2 * q2.i,
+                      w1 * q1.j + w2 * q2.j, w1 * q1.k + w2 * q2.k)
+
+
+class Simulation:
+    '''
+        rate: steps per simulated second
+        step_degrees: euler increment per 1/60 s of a held key
+        quaternion_steps: {'i': q, 'j': q, 'k': q} increments per 1/60 s
+        max_steps: cap per advance() so a long stall does not freeze the app
+    '''
+    def __init__(self, rate=BASE_RATE, step_degrees=2.0, quaternion_steps=None, max_steps=32):
+        self.rate = rate
+        self.dt = 1.0 / rate
+        self.max_steps = max_steps
+        scale = BASE_RATE / rate
+        self.step_degrees = step_degrees * scale
+        quaternion_steps = quaternion_steps or {
+            'i': Quaternion(.95, .02, 0, 0),
+            'j': Quaternion(.95, 0, .02, 0),
+            'k': Quaternion(.95, 0, 0, .02),
+        }
+        self.quaternion_steps = {}
+        for name, q in quaternion_steps.items():
+            q = power(q, scale)
+            self.quaternion_steps[name] = (q, q.inverse())
+        # controls held down, set from input every frame
+        self.held = set()
+        # optional InstancedScene stepped along with the plane
+        self.batch = None
+        self.state = OrientationState()
+        self.previous = self.state.copy()
+        self.accumulator = 0.0
+        self.alpha = 1.0
+        self.steps = 0
+        self.dropped_steps = 0
+
+    def reset(self, yaw=None, pitch=None, roll=None, quaternion=None):
+        # only the given parts change, no interpolation across a reset
+        for index, value in enumerate((yaw, pitch, roll)):
+            if value is not None:
+                self.state.euler[index] = value
+        if quaternion is not None:
+            self.state.quaternion = quaternion
+        self.previous = self.state.copy()
+
+    def step(self):
+        self.previous = self.state.copy()
+        state = self.state
+        q = state.quaternion
+        for name, index, sign, step, inverse in ORIENTATION_CONTROLS:
+            if name in self.held:
+                state.euler[index] += sign * self.step_degrees
+                q = q.times(self.quaternion_steps[step][1 if inverse else 0])
+        state.quaternion = q
+        if self.batch is not None:
+            self.batch.step()
+        self.steps += 1
+
+    def advance(self, seconds):
+        # run every whole step that fits, returns how many ran
+        self.accumulator += seconds
+        # the epsilon keeps frame times that are exact multiples of dt from losing a step to rounding
+        steps = int(self.accumulator / self.dt + 1e-9)
+        if steps > self.max_steps:
+            self.dropped_steps += steps - self.max_steps
+            self.accumulator -= (steps - self.max_steps) * self.dt
+            steps = self.max_steps
+        for _ in range(steps):
+            self.step()
+        self.accumulator -= steps * self.dt
+        self.alpha = min(max(self.accumulator / self.dt, 0.0), 1.0)
+        return steps
+
+    def display(self):
+        # state to draw, alpha of the way from the previous step to the current one
+        a = self.alpha
+        previous, current = self.previous, self.state
+        euler = [p + (c - p) * a for p, c in zip(previous.euler, current.euler)]
+        return OrientationState(*euler, quaternion=slerp(previous.quaternion, current.quaternion, a))
@@ -0,0 +1,328 @@
+'''
+    parameter studies over the orientation logic, no pygame or opengl.
+    every combination of the grid is run as one trial per seed on a process
+    pool and scored for quaternion drift and closeness to gimbal lock.
+
+    spec, json:
+        {
+            "seconds": 60,
+            "seeds": 2,
+            "grid": {
+                "step_degrees": [1.0, 2.0, 4.0],
+                "quaternion_step": [0.01, 0.02, 0.05],
+                "sequence": ["pitch", "tumble", "random", "script:session.jsonl"],
+                "renormalize": ["never", "always", "lazy:1e-12", "periodic:64", "approx"],
+                "sim_rate": [60.0, 240.0]
+            }
+        }
+    step_degrees is Window.plane_step_rotate, quaternion_step the 0.02 in
+    i_quat / j_quat / k_quat, renormalize a drift_study.py policy applied to
+    an extra quaternion chain that repeats the simulation's steps. drift is
+    measured against a reference chain of the same steps in long double,
+    normalized every step, for the policy chain (drift_deg) and for the
+    simulation's own lazily normalized quaternion (app_drift_deg). anything
+    left out of the grid keeps its DEFAULT_PARAMS value. seconds (simulated
+    time per trial) can be a grid entry too, seeds is a count or a list of
+    seeds, only the random sequence uses them.
+
+    each finished trial is appended to the results file (json lines) right
+    away, running the same command again skips every trial already in it,
+    so an interrupted study resumes where it stopped.
+
+    usage:
+        python study.py spec.json --out study.jsonl [--workers 8] [--summary study.csv]
+'''
+import argparse
+import bisect
+import csv
+import itertools
+import json
+import math
+import multiprocessing
+import os
+import random
+import time
+
+import numpy as np
+
+from drift_study import parse_policy
+from gimbal_sweep import distance_to_singularity
+from input_script import InputReplay
+from quaternion import Quaternion
+from simulation import Simulation, ORIENTATION_CONTROLS
+
+DEFAULT_PARAMS = {
+    'step_degrees': 2.0,
+    'quaternion_step': 0.02,
+    'sequence': 'tumble',
+    'renormalize': 'lazy:1e-12',
+    'sim_rate': 60.0,
+    'seconds': 60.0,
+}
+
+# degrees of pitch around +-90 that count as gimbal lock, as in window.py
+GIMBAL_LOCK_WINDOW = 4.0
+
+# seconds a control stays held in the built in sequences
+HOLD_SECONDS = 0.75
+
+# scores, how they combine over seeds and the column format
+SCORES = (
+    ('drift_deg', max, '.3e'),
+    ('norm_error', max, '.3e'),
+    ('app_drift_deg', max, '.3e'),
+    ('lock_distance', min, '.2f'),
+    ('locked_fraction', None, '.3f'),
+    ('seconds', None, '.2f'),
+)
+
+
+def held_controls(sequence, steps, rate, seed):
+    '''
+        list of held control sets, one per simulation step at rate
+            pitch       'u' held the whole time, straight through the lock
+            tumble      cycles through all six controls
+            random      random pairs of controls, changing every HOLD_SECONDS
+            script:PATH the keys of a recorded input script at its recorded frame times, repeated
+    '''
+    names = [control[0] for control in ORIENTATION_CONTROLS]
+    hold = max(int(round(HOLD_SECONDS * rate)), 1)
+    if sequence == 'pitch':
+        return [{'u'}] * steps
+    if sequence == 'tumble':
+        return [{names[(n // hold) % len(names)]} for n in range(steps)]
+    if sequence == 'random':
+        rng = random.Random(seed)
+        blocks = [set(rng.sample(names, 2)) for _ in range(steps // hold + 1)]
+        return [blocks[n // hold] for n in range(steps)]
+    if sequence.startswith('script:'):
+        replay = InputReplay(sequence[len('script:'):])
+        frames = [frame.keys & set(names) for frame in replay.frames]
+        if not frames:
+            raise ValueError(f"{sequence}: empty input script")
+        # script time each frame ends at, a step takes the frame it falls in
+        ends = list(itertools.accumulate(replay.frame_seconds(frame) for frame in replay.frames))
+        length = ends[-1] or 1.0
+        return [frames[min(bisect.bisect_right(ends, (n / rate) % length), len(frames) - 1)]
+                for n in range(steps)]
+    raise ValueError(f"unknown input sequence {sequence!r}")
+
+
+def _multiply(a, b):
+    # raw hamilton product of [r, i, j, k] lists, no normalization
+    return [a[0] * b[0] - a[1] * b[1] - a[2] * b[2] - a[3] * b[3],
+            a[0] * b[1] + a[1] * b[0] + a[2] * b[3] - a[3] * b[2],
+            a[0] * b[2] + a[2] * b[0] + a[3] * b[1] - a[1] * b[3],
+            a[0] * b[3] + a[3] * b[0] + a[1] * b[2] - a[2] * b[1]]
+
+
+def _drift_deg(q, reference):
+    # rotation angle between q and the unit reference, from the chord lengths
+    # as in drift_study.errors, 1 - dot^2 would cancel away anything under ~1e-6 degrees
+    norm = math.sqrt(sum(float(v) * float(v) for v in q))
+    sign = 1.0 if sum(float(a) * float(b) for a, b in zip(q, reference)) >= 0.0 else -1.0
+    diff = math.sqrt(sum(float(a / norm - sign * b) ** 2 for a, b in zip(q, reference)))
+    total = math.sqrt(sum(float(a / norm + sign * b) ** 2 for a, b in zip(q, reference)))
+    return math.degrees(4.0 * math.atan2(diff, total))
+
+
+def run_trial(params, seed):
+    '''
+        step a Simulation through the input sequence and score it.
+        drift_deg / norm_error: how far the renormalize policy's chain ends up
+        from the exact reference, in degrees and |1 - |q||.
+        app_drift_deg: the same for the simulation's own quaternion.
+        lock_distance / locked_fraction: closest the euler pitch gets to +-90
+        and the share of steps within GIMBAL_LOCK_WINDOW of it
+    '''
+    start = time.perf_counter()
+    p = dict(DEFAULT_PARAMS, **params)
+    s = p['quaternion_step']
+    sim = Simulation(p['sim_rate'], p['step_degrees'], {
+        'i': Quaternion(.95, s, 0, 0),
+        'j': Quaternion(.95, 0, s, 0),
+        'k': Quaternion(.95, 0, 0, s),
+    }, max_steps=1)
+    sim.reset(0.0, 0.0, 90.0, Quaternion(1, 0, 0, 0))
+    # the simulation's (step, inverse) increments as plain lists
+    increments = {name: [[q.r, q.i, q.j, q.k] for q in pair] for name, pair in sim.quaternion_steps.items()}
+    # the same increments exactly, multiplied in long double and normalized every
+    # step, so float64 rounding in any chain shows up against it
+    exact = {name: [[np.longdouble(v) for v in q] for q in pair] for name, pair in increments.items()}
+    policy, arg = parse_policy(p['renormalize'])
+    q = [1.0, 0.0, 0.0, 0.0]
+    ref = [np.longdouble(v) for v in q]
+    pitch = []
+    held = held_controls(p['sequence'], int(round(p['seconds'] * p['sim_rate'])), p['sim_rate'], seed)
+    for n, keys in enumerate(held, 1):
+        sim.held = keys
+        sim.step()
+        pitch.append(sim.state.euler[1])
+        # same products as Simulation.step, normalized only as the policy says
+        for name, _, _, step, inverse in ORIENTATION_CONTROLS:
+            if name in keys:
+                q = _multiply(q, increments[step][1 if inverse else 0])
+                ref = _multiply(ref, exact[step][1 if inverse else 0])
+        if keys:
+            norm = np.sqrt(sum(v * v for v in ref))
+            ref = [v / norm for v in ref]
+        if policy != 'never' and not (policy == 'periodic' and n % arg):
+            norm_sq = sum(v * v for v in q)
+            if policy == 'approx':
+                q = [v * (3.0 - norm_sq) * 0.5 for v in q]
+            elif policy != 'lazy' or abs(norm_sq - 1.0) > arg:
+                norm = math.sqrt(norm_sq)
+                q = [v / norm for v in q]
+    distance = distance_to_singularity(pitch)
+    app = sim.state.quaternion
+    return {
+        'drift_deg': _drift_deg(q, ref),
+        'norm_error': abs(1.0 - math.sqrt(sum(v * v for v in q))),
+        'app_drift_deg': _drift_deg([app.r, app.i, app.j, app.k], ref),
+        'lock_distance': float(distance.min()) if len(distance) else float('inf'),
+        'locked_fraction': float((distance <= GIMBAL_LOCK_WINDOW).mean()) if len(distance) else 0.0,
+        'seconds': time.perf_counter() - start,
+    }
+
+
+def _run_job(job):
+    # worker: one trial, returned as the line written to the results file
+    key, params, seed = job
+    return {'trial': key, 'params': params, 'seed': seed, 'scores': run_trial(params, seed)}
+
+
+def expand(spec):
+    # [(key, params, seed)] for every grid point and seed, in a fixed order
+    grid = dict(spec.get('grid', {}))
+    if 'seconds' in spec:
+        grid.setdefault('seconds', [spec['seconds']])
+    seeds = spec.get('seeds', 1)
+    seeds = range(seeds) if isinstance(seeds, int) else seeds
+    unknown = set(grid) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"unknown study parameters: {', '.join(sorted(unknown))}")
+    names = sorted(grid)
+    jobs = []
+    for values in itertools.product(*(grid[name] for name in names)):
+        params = dict(zip(names, values))
+        for seed in seeds:
+            jobs.append((json.dumps([params, seed], sort_keys=True), params, seed))
+    return jobs
+
+
+def load_results(path):
+    # trials already in a results file, a cut off last line is dropped
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                result = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[result['trial']] = result
+    return results
+
+
+def run_study(spec, out_path, workers=None):
+    '''
+        run every trial of spec that is not in out_path yet, appending each
+        result as it finishes. returns all results of the spec
+    '''
+    jobs = expand(spec)
+    results = load_results(out_path)
+    todo = [job for job in jobs if job[0] not in results]
+    print(f"{len(jobs)} trials, {len(jobs) - len(todo)} already done, {len(todo)} to run")
+    workers = min(workers or os.cpu_count() or 1, max(len(todo), 1))
+    start = time.perf_counter()
+    # rewritten without a cut off last line, then appended to. the clean copy
+    # replaces the file in one step so an interrupt here keeps every trial
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        for result in results.values():
+            f.write(json.dumps(result) + '\n')
+    os.replace(tmp_path, out_path)
+    pool = multiprocessing.Pool(workers) if workers > 1 else None
+    try:
+        finished = pool.imap_unordered(_run_job, todo) if pool else map(_run_job, todo)
+        with open(out_path, 'a') as f:
+            for count, result in enumerate(finished, 1):
+                f.write(json.dumps(result) + '\n')
+                f.flush()
+                results[result['trial']] = result
+                if count % max(len(todo) // 10, 1) == 0 or count == len(todo):
+                    print(f"  {count}/{len(todo)} trials, {time.perf_counter() - start:.1f} s")
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+    elapsed = time.perf_counter() - start
+    if todo:
+        print(f"ran {len(todo)} trials on {workers} workers in {elapsed:.2f} s "
+              f"({len(todo) / max(elapsed, 1e-9):.1f} trials / s)")
+    return [results[key] for key, _, _ in jobs]
+
+
+def aggregate(results):
+    '''
+        one row per grid point: the parameters that vary plus each score
+        combined over seeds (worst drift, closest lock, mean of the rest)
+    '''
+    groups = {}
+    for result in results:
+        key = json.dumps(result['params'], sort_keys=True)
+        groups.setdefault(key, (result['params'], []))[1].append(result['scores'])
+    rows = []
+    for params, scores in groups.values():
+        row = dict(params)
+        row['seeds'] = len(scores)
+        for name, combine, _ in SCORES:
+            values = [s[name] for s in scores]
+            row[name] = combine(values) if combine else sum(values) / len(values)
+        rows.append(row)
+    return rows
+
+
+def print_summary(rows, sort=None):
+    if not rows:
+        print("no results")
+        return
+    params = [name for name in rows[0] if name not in dict((s[0], s) for s in SCORES)]
+    if sort:
+        rows = sorted(rows, key=lambda row: row[sort])
+    widths = {name: max(len(name), *(len(str(row[name])) for row in rows)) + 2 for name in params}
+    print("".join(f"{name:<{widths[name]}}" for name in params)
+          + "".join(f"{name:>16}" for name, _, _ in SCORES))
+    for row in rows:
+        print("".join(f"{str(row[name]):<{widths[name]}}" for name in params)
+              + "".join(f"{row[name]:>16{fmt}}" for name, _, fmt in SCORES))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="multiprocess parameter study over the orientation logic")
+    parser.add_argument("spec", help="json grid spec, see the module docstring")
+    parser.add_argument("--out", default=None,
+                        help="results file, trials already in it are skipped (default: spec name + .jsonl)")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--summary", default=None, help="also write the summary table to this .csv")
+    parser.add_argument("--sort", default=None, choices=[name for name, _, _ in SCORES],
+                        help="order the summary by this score")
+    args = parser.parse_args()
+
+    with open(args.spec, 'r') as f:
+        spec = json.load(f)
+    out_path = args.out or os.path.splitext(args.spec)[0] + ".jsonl"
+    rows = aggregate(run_study(spec, out_path, args.workers))
+    print_summary(rows, args.sort)
+    print(f"results: {out_path}")
+    if args.summary and rows:
+        with open(args.summary, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"summary: {args.summary}")
+
+
+if __name__ == "__main__":
+    main()
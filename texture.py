@@ -0,0 +1,143 @@
+'''
+    texture decoding and upload.
+    decode_texture() turns an image file into pre-flipped rgba mip levels,
+    optionally downscaled to a maximum size. the levels are stored in the
+    MeshCache next to the meshes, so later loads memmap raw pixels instead of
+    running the image decoder again.
+    upload_texture() passes those arrays to glTexImage2D as they are, there
+    is no tobytes() copy in between.
+'''
+import time
+
+import numpy as np
+from OpenGL.GL import *
+
+MAX_TEXTURE_SIZE = 2048
+
+# 'offline': levels box filtered on the cpu and cached with the texture
+# 'gpu': level 0 only, the driver builds the rest with glGenerateMipmap
+# 'none': level 0 only, no mipmapping
+MIPMAP_MODES = ('offline', 'gpu', 'none')
+
+# bumped when the cached levels change, older entries are decoded again
+TEXTURE_CACHE_VERSION = 2
+
+
+class TextureData:
+    '''
+        decoded texture ready for upload
+        levels: (height, width, 4) uint8 arrays, bottom row first, largest first
+    '''
+    def __init__(self, path, levels, decode_ms, cached):
+        self.path = path
+        self.levels = levels
+        self.height, self.width = levels[0].shape[:2]
+        self.decode_ms = decode_ms
+        self.cached = cached
+        self.upload_ms = 0.0
+        self.gpu_bytes = 0
+        # levels on the gpu, more than len(levels) when the driver built them
+        self.level_count = len(levels)
+        self.compressed = False
+
+    def report(self):
+        source = "cache" if self.cached else "decoded"
+        return (f"{self.width}x{self.height}, {self.level_count} levels, {source} {self.decode_ms:.1f} ms, "
+                f"upload {self.upload_ms:.1f} ms, {self.gpu_bytes / 1024:.0f} KB"
+                f"{' compressed' if self.compressed else ''}")
+
+
+def _cache_key(path):
+    # texture entries share the mesh cache directory, keyed apart from meshes
+    return path + '?texture'
+
+
+def _flipped(image):
+    # opengl expects the bottom row first, one copy from the decoder's buffer
+    return np.ascontiguousarray(np.asarray(image)[::-1])
+
+
+def decode_texture(path, cache=None, max_size=MAX_TEXTURE_SIZE, mipmaps='offline'):
+    start = time.perf_counter()
+    signature = None
+    if cache is not None:
+        signature = cache.signature(path) + [['texture', TEXTURE_CACHE_VERSION, max_size, mipmaps == 'offline']]
+        cached = cache.load(_cache_key(path), signature)
+        if cached is not None:
+            arrays, meta = cached
+            levels = [arrays[f'level{i}'] for i in range(meta['levels'])]
+            return TextureData(path, levels, (time.perf_counter() - start) * 1000.0, True)
+
+    # pillow is only needed on a cache miss, loaded on first use
+    from PIL import Image
+    image = Image.open(path)
+    if image.mode != 'RGBA':
+        image = image.convert('RGBA')
+    if max(image.size) > max_size:
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+    levels = [_flipped(image)]
+    if mipmaps == 'offline':
+        # gl's chain: level n is max(1, w >> n) x max(1, h >> n), odd sizes
+        # round down. reduce() rounds up and leaves the texture incomplete
+        while max(image.size) > 1:
+            width, height = image.size
+            image = image.resize((max(width >> 1, 1), max(height >> 1, 1)), Image.BOX)
+            levels.append(_flipped(image))
+    texture = TextureData(path, levels, (time.perf_counter() - start) * 1000.0, False)
+
+    if cache is not None:
+        arrays = {f'level{i}': level for i, level in enumerate(levels)}
+        try:
+            cache.store(_cache_key(path), signature, arrays, {'levels': len(levels)})
+        except OSError as e:
+            print(f"failed to write texture cache: {e}")
+    return texture
+
+
+def upload_texture(texture, mipmaps='offline', compress=False):
+    '''
+        create a gl texture from TextureData, returns the texture id.
+        compress asks the driver for a compressed internal format, the real
+        size it picked is read back into texture.gpu_bytes
+    '''
+    start = time.perf_counter()
+    texture_id = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture_id)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    internal_format = GL_COMPRESSED_RGBA if compress else GL_RGBA
+
+    levels = texture.levels
+    if mipmaps == 'gpu' and not bool(glGenerateMipmap):
+        print("glGenerateMipmap not supported, texture has no mipmaps")
+        mipmaps = 'none'
+    if mipmaps != 'offline':
+        levels = levels[:1]
+    for level, pixels in enumerate(levels):
+        height, width = pixels.shape[:2]
+        # memmapped or numpy pixels go to the driver without a python copy
+        glTexImage2D(GL_TEXTURE_2D, level, internal_format, width, height, 0,
+                     GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+    if mipmaps == 'gpu':
+        glGenerateMipmap(GL_TEXTURE_2D)
+    mipmapped = mipmaps != 'none'
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER,
+                    GL_LINEAR_MIPMAP_LINEAR if mipmapped else GL_LINEAR)
+    level_count = len(texture.levels) if mipmaps == 'offline' else 1
+    if mipmaps == 'gpu':
+        level_count = max(texture.width, texture.height).bit_length()
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, level_count - 1)
+    texture.level_count = level_count
+
+    texture.gpu_bytes = 0
+    texture.compressed = bool(compress and glGetTexLevelParameteriv(GL_TEXTURE_2D, 0, GL_TEXTURE_COMPRESSED))
+    for level in range(level_count):
+        if texture.compressed:
+            texture.gpu_bytes += glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_COMPRESSED_IMAGE_SIZE)
+        else:
+            texture.gpu_bytes += (glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_WIDTH)
+                                  * glGetTexLevelParameteriv(GL_TEXTURE_2D, level, GL_TEXTURE_HEIGHT) * 4)
+    glBindTexture(GL_TEXTURE_2D, 0)
+    texture.upload_ms = (time.perf_counter() - start) * 1000.0
+    return texture_id
@@ -0,0 +1,161 @@
+'''
+    orientation session recording and playback
+    file layout:
+        4 bytes   magic 'GLTR'
+        4 bytes   format version (uint32 little endian)
+        4 bytes   header length (uint32 little endian)
+        header    utf-8 json: column names, fps, padded so records start
+                  on a 64 byte boundary
+        records   one per frame, a little endian float32 per column
+    there is no frame count in the header, it follows from the file size,
+    so a session that crashed mid recording can still be played back.
+    records are fixed width, frame n starts at data_start + n * record size
+    and the player memmaps the file: seeking is O(1) and whole columns come
+    out as strided numpy views.
+
+    summary of a recording:
+        python trajectory.py session.traj
+'''
+import json
+import os
+import queue
+import struct
+import sys
+import threading
+
+import numpy as np
+
+MAGIC = b'GLTR'
+VERSION = 1
+ALIGN = 64
+
+# one record per frame, in this order
+COLUMNS = (
+    'time',                 # simulated seconds since the recording started
+    'yaw', 'pitch', 'roll',
+    'r', 'i', 'j', 'k',     # Quaternion components
+    'camera_distance', 'camera_azimuth', 'camera_elevation',
+    'quaternion_mode',      # 1.0 when the quaternion controls were active
+)
+
+# records collected before a block is handed to the writer thread
+BLOCK_FRAMES = 4096
+
+
+def record_dtype(columns=COLUMNS):
+    # structured view of a record, data['pitch'] is the pitch column
+    return np.dtype([(name, '<f4') for name in columns])
+
+
+class TrajectoryRecorder:
+    '''
+        record() copies one frame into a preallocated block, full blocks are
+        written by a background thread so the render thread never waits on
+        the disk
+    '''
+    def __init__(self, path, fps, columns=COLUMNS, block_frames=BLOCK_FRAMES, max_queue=8):
+        self.path = path
+        self.columns = tuple(columns)
+        self.frames = 0
+        self._block_frames = block_frames
+        self._block = np.empty((block_frames, len(self.columns)), dtype='<f4')
+        self._used = 0
+        self._file = open(path, 'wb')
+        header = json.dumps({'columns': list(self.columns), 'fps': fps}).encode('utf-8')
+        data_start = -(-(12 + len(header)) // ALIGN) * ALIGN
+        header += b' ' * (data_start - 12 - len(header))
+        self._file.write(struct.pack('<4sII', MAGIC, VERSION, len(header)))
+        self._file.write(header)
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="trajectory-writer", daemon=True)
+        self._thread.start()
+
+    def record(self, values):
+        # values: one float per column, in column order
+        self._block[self._used] = values
+        self._used += 1
+        self.frames += 1
+        if self._used == self._block_frames:
+            self._queue.put(self._block)
+            self._block = np.empty_like(self._block)
+            self._used = 0
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                break
+            self._file.write(block.data)
+
+    def close(self):
+        if self._used:
+            self._queue.put(self._block[:self._used])
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        print(f"recorded {self.frames} trajectory frames to {self.path}")
+
+
+class TrajectoryPlayer:
+    '''
+        read only view of a recording. frame(n) and the columns read
+        straight from the memmap, nothing is loaded up front
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, header_len = struct.unpack('<4sII', f.read(12))
+            if magic != MAGIC:
+                raise ValueError(f"{path}: not a trajectory file")
+            if version != VERSION:
+                raise ValueError(f"{path}: unsupported trajectory version {version}")
+            header = json.loads(f.read(header_len).decode('utf-8'))
+        self.columns = tuple(header['columns'])
+        self.fps = header.get('fps', 60)
+        self.dtype = record_dtype(self.columns)
+        data_start = 12 + header_len
+        # a partly written last record is ignored
+        count = (os.path.getsize(path) - data_start) // self.dtype.itemsize
+        if count > 0:
+            self.data = np.memmap(path, dtype=self.dtype, mode='r', offset=data_start, shape=(count,))
+        else:
+            self.data = np.zeros(0, dtype=self.dtype)
+
+    def __len__(self):
+        return len(self.data)
+
+    def frame(self, index):
+        # {column: value} of one frame
+        record = self.data[min(max(index, 0), len(self.data) - 1)]
+        return {name: float(record[name]) for name in self.columns}
+
+    def column(self, name):
+        return self.data[name]
+
+    def seconds(self):
+        return len(self.data) / self.fps
+
+    def close(self):
+        # drops the mapping, the file can be replaced afterwards
+        self.data = np.zeros(0, dtype=self.dtype)
+
+
+def main():
+    for path in sys.argv[1:]:
+        player = TrajectoryPlayer(path)
+        print(f"{path}: {len(player)} frames, {player.seconds():.1f} s at {player.fps} fps, "
+              f"{os.path.getsize(path) / 1024:.0f} KB")
+        if not len(player):
+            continue
+        for name in player.columns:
+            column = player.column(name)
+            print(f"  {name:<18}{column.min():>12.3f}{column.max():>12.3f}")
+        # pitch within 4 degrees of +-90, where yaw and roll share an axis
+        pitch = player.column('pitch').astype(np.float64)
+        locked = np.abs(pitch % 180.0 - 90.0) < 4.0
+        euler = player.column('quaternion_mode') < 0.5
+        print(f"  {np.count_nonzero(locked & euler)} euler frames near gimbal lock")
+
+
+if __name__ == "__main__":
+    main()
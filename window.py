@@ -1,31 +1,113 @@
-import pygame
 import sys
 import os
 import math
-import imgui
+import time
+import glm
+
+from array import array
 
-from pygame.locals import *
-from imgui.integrations.pygame import PygameRenderer
 from OpenGL.GL import *
-from OpenGL.GLU import *
 
-from model_loader import ModelLoader
-from gimbal_rings import create_ring_vertices
+from asset_registry import AssetRegistry
+from model_loader import DrawStats
+from gimbal_rings import GimbalRings
 from quaternion import Quaternion
+import rotations
+from gimbal_sweep import analyze
+from offscreen import HeadlessContext, FrameTarget, AsyncReadback, FrameWriter
+from input_script import FrameInput, InputRecorder, InputReplay
+from trajectory import TrajectoryRecorder, TrajectoryPlayer
+from keyframes import KeyframePath, METHODS, DEMO_KEYFRAMES
+from redraw import RedrawTracker, IDLE_WAIT_SECONDS
+from profiler import FrameProfiler
+from simulation import Simulation, ORIENTATION_CONTROLS
+from scene import InstancedScene, SceneRenderer
+from shaders import gl_matrix
 
+# [obj, mtl, diffuse texture], same order as ModelLoader.set_config
 MODEL_CONFIGS = {
-                "plane" : ["./assets/lowpolyplane.obj", "./assets/textures/diffuse.tga", "./assets/airplane.mtl"],
+                "plane" : ["./assets/lowpolyplane.obj", "./assets/airplane.mtl", "./assets/textures/diffuse.tga"],
                  "rat" : ["./assets/rat.obj", None, "./assets/textures/rat_khaki.tga"]
                 }
 
+# control name -> pygame key constant, names are what input scripts store
+CONTROL_KEYS = {
+    "escape": "K_ESCAPE",
+    "left": "K_LEFT", "right": "K_RIGHT", "up": "K_UP", "down": "K_DOWN",
+    "w": "K_w", "s": "K_s",
+    "i": "K_i", "j": "K_j", "u": "K_u", "h": "K_h", "o": "K_o", "k": "K_k",
+}
+
+# timed parts of a frame, in the order they run
+PROFILE_SECTIONS = ["events", "update", "camera", "rings", "model", "gui", "flip"]
+
+# degrees of pitch around +-90 that count as gimbal lock
+GIMBAL_LOCK_WINDOW = 4.0
+
+# keyframe path curves traced on the rings, one color per interpolation
+PATH_COLORS = {'euler': (1.0, 0.5, 0.0), 'slerp': (0.0, 1.0, 1.0), 'squad': (1.0, 0.0, 1.0)}
+PATH_TRACE_SAMPLES = 2048
+
+# the gui stack is imported by _import_gui() when a window opens, headless
+# runs never load pygame or imgui
+pygame = None
+imgui = None
+PygameRenderer = None
+
+
+def _import_gui():
+    global pygame, imgui, PygameRenderer
+    import pygame
+    import imgui
+    from imgui.integrations.pygame import PygameRenderer
+
+
 class Window:
-    def __init__(self, width, height, title):
+    def __init__(self, width, height, title, headless=False,
+                 output_dir=None, output_format='png', frames=None,
+                 record_path=None, replay_path=None,
+                 profile=False, profile_path=None, instances=0, sim_rate=60.0,
+                 texture_options=None, model_path=None,
+                 trajectory_out=None, trajectory_in=None, async_load=None, continuous=False):
         self.width = width
         self.height = height
         self.title = title
+        # headless renders into an fbo with no window, input or gui
+        self.headless = headless
+        self.max_frames = frames
+        self.frame_index = 0
         self.running = True
-        self.clock = pygame.time.Clock()
+        # gui clicks are queued as actions so they can be recorded and replayed
+        self.pending_actions = []
+        self.recorder = None
+        self.replay = InputReplay(replay_path) if replay_path else None
+        # recorded orientation / camera per frame, played back instead of the simulation
+        self.trajectory = None
+        self.trajectory_frame = 0
+        self.trajectory_paused = False
+        if trajectory_in:
+            self.trajectory = TrajectoryPlayer(trajectory_in)
+            if not len(self.trajectory):
+                print(f"{trajectory_in} has no frames, simulating instead")
+                self.trajectory = None
+            elif self.max_frames is None and self.headless:
+                self.max_frames = len(self.trajectory)
+        self.trajectory_recorder = None
+        # simulated seconds, the time column of recorded trajectories
+        self.session_time = 0.0
+        # keyframe animation, the interpolation picked here drives the plane
+        self.path = KeyframePath()
+        self.path_method = 'slerp'
+        self.path_playing = False
+        self.path_time = 0.0
+        self.profiler = FrameProfiler(PROFILE_SECTIONS, enabled=profile)
+        # written on exit when set, csv or json by extension
+        self.profile_path = profile_path
         self.fps = 60
+        # windowed sessions only draw when something changed unless continuous
+        self.redraw = RedrawTracker(on_demand=not continuous)
+        # controls held this frame, anything held keeps frames coming
+        self.held_keys = set()
 
         # control settings
         # steps for cam
@@ -45,24 +127,57 @@ class Window:
         self.plane_yaw = 0.0
         self.plane_pitch = 0.0
         self.plane_roll = 90.0
+        # orientation advances in fixed steps, the values above are what is drawn
+        self.simulation = Simulation(sim_rate, self.plane_step_rotate,
+                                     {'i': self.i_quat, 'j': self.j_quat, 'k': self.k_quat})
+        self.simulation.reset(self.plane_yaw, self.plane_pitch, self.plane_roll, self.quaternion)
+        # seconds the last frame took, fed to the simulation
+        self.frame_seconds = 0.0
         # creates window
-        self._init_pygame()
+        if self.headless:
+            self._init_headless(output_dir, output_format)
+        else:
+            self._init_pygame()
         # set up 3d rendering
         self._init_opengl()
+        # glsl path, fixed function stays as the fallback
+        self.renderer = self._create_renderer()
+        self.use_shaders = self.renderer is not None
+        # draw calls and material / texture switches, shown in the gui
+        self.draw_stats = DrawStats()
 
         # load model
-        # this will return a model data structure
-        self.model = ModelLoader()
+        # models stay resident in the registry, switching back is instant
+        configs = dict(MODEL_CONFIGS)
+        if model_path:
+            # large files stream in and are drawn while they load
+            configs["file"] = [model_path, None, None]
+        self.assets = AssetRegistry(configs, vram_budget=64 * 1024 * 1024,
+                                    texture_options=texture_options)
+        # windows show the rings as a placeholder while the first model loads,
+        # headless runs and replays load it up front so every frame is reproducible
+        if async_load is None:
+            async_load = not self.headless and self.replay is None
+        self.async_load = async_load
+        self.model = None
+        # name of the model the user last picked, may still be loading
+        self.requested_model = "file" if model_path else "plane"
+        if self.async_load:
+            self._switch_model(self.requested_model)
+        else:
+            self.model = self.assets.get(self.requested_model)
 
         # create rings
         self.ring_radius_outer = 150.0
         self.ring_radius_middle = 140.0
         self.ring_radius_inner = 130.0
 
-        # create ring geometry
-        self.ring_vertices_outer = create_ring_vertices(self.ring_radius_outer, 'x')
-        self.ring_vertices_middle = create_ring_vertices(self.ring_radius_middle, 'y')
-        self.ring_vertices_inner = create_ring_vertices(self.ring_radius_inner, 'z')
+        # create ring geometry, torus meshes uploaded on first draw
+        self.rings = GimbalRings([
+            (self.ring_radius_outer, 'x'),
+            (self.ring_radius_middle, 'y'),
+            (self.ring_radius_inner, 'z'),
+        ])
 
 
         # camera setup
@@ -70,19 +185,43 @@ class Window:
         self.camera_azimuth = 0.0 # rotation about z axis
         self.camera_elevation = 30.0 #angle above horizon (degs)
 
-        # gui setup
-        self.font = imgui.create_context()
-        self.imgui_renderer = PygameRenderer()
-        self.show_ui = True
+        # optional grid of instanced copies of the model, replaces the single one
+        self.scene = None
+        # level of detail of the instanced copies, picked with the camera
+        self.instance_lod = 0
+        self._set_instances(instances)
+
+        # gui setup, the imgui context is made once the first frame is on screen
+        self.show_ui = not self.headless
+        self.imgui_renderer = None
+        if record_path:
+            self.recorder = InputRecorder(record_path, self.fps)
+        if trajectory_out:
+            self.trajectory_recorder = TrajectoryRecorder(trajectory_out, self.fps)
 
     def _init_pygame(self):
+        _import_gui()
         pygame.init()
         pygame.display.set_mode(
             (self.width, self.height),
-            DOUBLEBUF | OPENGL
+            pygame.DOUBLEBUF | pygame.OPENGL
         )
         pygame.display.set_caption(self.title)
+        self.clock = pygame.time.Clock()
+        self.control_keys = {name: getattr(pygame, key) for name, key in CONTROL_KEYS.items()}
+
+    def _init_gui(self):
+        self.font = imgui.create_context()
+        self.imgui_renderer = PygameRenderer()
     
+    def _init_headless(self, output_dir, output_format):
+        self.gl_context = HeadlessContext(self.width, self.height)
+        self.frame_target = FrameTarget(self.width, self.height)
+        self.readback = AsyncReadback(self.width, self.height)
+        self.frame_writer = None
+        if output_dir:
+            self.frame_writer = FrameWriter(output_dir, self.width, self.height, output_format)
+
     def _init_opengl(self):
         glViewport(0,0,self.width, self.height)
 
@@ -95,10 +234,10 @@ class Window:
         # matrix projection mode
         glMatrixMode(GL_PROJECTION)
         # reset to identity matrix(fresh/empty)
-        glLoadIdentity()
-        gluPerspective(
+        # same matrix feeds the fixed function stack and the shaders
+        self.projection = glm.perspective(
             #fov
-            90,
+            glm.radians(90),
             #aspect ratio (w/h)
             self.width / self.height,
             #draw distance min
@@ -106,6 +245,7 @@ class Window:
             #draw distance max
             1000.0
         )
+        glLoadMatrixf(gl_matrix(self.projection))
         # where cam position and obj transformations happen
         glMatrixMode(GL_MODELVIEW)
         glLoadIdentity()
@@ -133,10 +273,61 @@ class Window:
         # bright white color
         glLightfv(GL_LIGHT0, GL_DIFFUSE, [0.8,0.8,0.8,1])
 
+    def _create_renderer(self):
+        try:
+            return SceneRenderer()
+        except Exception as e:
+            print(f"glsl pipeline unavailable, using fixed function: {e}")
+            return None
+
     def _update_plane(self):
-        # TODO 
-        # make quaternions
-        pass
+        self.session_time += self.frame_seconds
+        if self.trajectory is not None:
+            self._play_trajectory()
+        elif self.path_playing:
+            self._play_path()
+        else:
+            # whole simulation steps for the time the last frame took, then
+            # interpolate what is drawn between the last two steps
+            self.simulation.advance(self.frame_seconds)
+            state = self.simulation.display()
+            self.plane_yaw, self.plane_pitch, self.plane_roll = state.euler
+            self.quaternion = state.quaternion
+        if self.trajectory_recorder is not None:
+            q = self.quaternion
+            self.trajectory_recorder.record((
+                self.session_time, self.plane_yaw, self.plane_pitch, self.plane_roll,
+                q.r, q.i, q.j, q.k,
+                self.camera_distance, self.camera_azimuth, self.camera_elevation,
+                float(self.quaternion_mode)))
+
+    def _play_trajectory(self):
+        # one recorded frame per update, holds on the last one
+        values = self.trajectory.frame(self.trajectory_frame)
+        self.plane_yaw = values['yaw']
+        self.plane_pitch = values['pitch']
+        self.plane_roll = values['roll']
+        self.quaternion = Quaternion(values['r'], values['i'], values['j'], values['k'])
+        self.quaternion_mode = values['quaternion_mode'] >= 0.5
+        self.camera_distance = values['camera_distance']
+        self.camera_azimuth = values['camera_azimuth']
+        self.camera_elevation = values['camera_elevation']
+        if not self.trajectory_paused and self.trajectory_frame < len(self.trajectory) - 1:
+            self.trajectory_frame += 1
+
+    def _play_path(self):
+        # loops over the keyframes, every interpolation is evaluated from the same time
+        self.path_time = (self.path_time + self.frame_seconds) % self.path.duration
+        t = [self.path_time]
+        self.plane_yaw, self.plane_pitch, self.plane_roll = self.path.euler(t, self.path_method)[0]
+        self.quaternion = Quaternion(*self.path.evaluate(t, self.path_method)[0])
+
+    def _set_instances(self, count):
+        if count > 0 and self.renderer is None:
+            print("instancing needs the glsl pipeline")
+            return
+        self.scene = InstancedScene(count) if count > 0 else None
+        self.simulation.batch = self.scene
 
 
     def _update_camera(self):
@@ -153,60 +344,129 @@ class Window:
         y = self.camera_distance * math.cos(elevation_rad) * math.cos(azimuth_rad)
         z = self.camera_distance * math.sin(elevation_rad)
 
-        gluLookAt(
+        self.view = glm.lookAt(
             # cam pos
-            x,y,z,
+            glm.vec3(x,y,z),
             # look at
-            0,0,0,
+            glm.vec3(0,0,0),
             #up vector
-            0,0,1 # z axis is up
+            glm.vec3(0,0,1) # z axis is up
         )
+        glLoadMatrixf(gl_matrix(self.view))
+
+        # level of detail from how large the model is on screen at this distance
+        if self.model is None:
+            return
+        self.model.select_lod(self.camera_distance)
+        if self.scene is not None:
+            self.instance_lod = self.model.lod_level(self.scene.instance_radius, self.camera_distance)
 
     # process inputs 
     def _handle_events(self):
-        for event in pygame.event.get():
-            self.imgui_renderer.process_event(event)
-            if event.type == QUIT:
-                self.running = False
-        keys = pygame.key.get_pressed()
+        if self.replay is not None:
+            frame_input = self.replay.next()
+            # the recorded frame time, so the simulation steps as it did live
+            self.frame_seconds = self.replay.frame_seconds(frame_input)
+            # clicks on the panel are ignored while a script drives the session
+            self.pending_actions = []
+            if self.show_ui:
+                # keep the window responsive, but input comes from the script
+                for event in pygame.event.get():
+                    if event.type == pygame.QUIT:
+                        self.running = False
+        else:
+            frame_input = self._read_live_input()
+        if self.recorder is not None:
+            self.recorder.record(frame_input)
+        self._apply_input(frame_input)
+
+    def _read_live_input(self):
+        events = pygame.event.get()
+        if events:
+            self.redraw.touch()
+        for event in events:
+            if self.imgui_renderer is not None:
+                self.imgui_renderer.process_event(event)
+            if event.type == pygame.QUIT:
+                self.pending_actions.append(["quit"])
+        pressed = pygame.key.get_pressed()
+        keys = [name for name, key in self.control_keys.items() if pressed[key]]
+        # frame_seconds is what _update_plane advances by this frame
+        frame_input = FrameInput(keys, self.pending_actions, self.frame_seconds)
+        self.pending_actions = []
+        return frame_input
+
+    def _apply_input(self, frame_input):
+        for action in frame_input.actions:
+            self._apply_action(action)
+        keys = frame_input.keys
+        self.held_keys = keys
         # exit
-        if keys[K_ESCAPE]:
+        if "escape" in keys:
             self.running = False
         # control camera
-        if keys[K_LEFT]:
+        if "left" in keys:
             self.camera_azimuth -= self.cam_step_rotate
-        if keys[K_RIGHT]:
+        if "right" in keys:
             self.camera_azimuth += self.cam_step_rotate
-        if keys[K_UP]:
+        if "up" in keys:
             self.camera_elevation -= self.cam_step_rotate
-        if keys[K_DOWN]:
+        if "down" in keys:
             self.camera_elevation += self.cam_step_rotate
-        if keys[K_w]:
+        if "w" in keys:
             self.camera_distance -= self.cam_step_zoom
-        if keys[K_s]:
+        if "s" in keys:
             self.camera_distance += self.cam_step_zoom
         # update plane
-        # yaw
-        if keys[K_i]:
-            self.quaternion = self.quaternion.times(self.i_quat)
-            self.plane_yaw -= self.plane_step_rotate
-        if keys[K_j]:
-            self.quaternion = self.quaternion.times(self.i_quat.inverse())
-            self.plane_yaw += self.plane_step_rotate
-        # pitch
-        if keys[K_u]:
-            self.quaternion = self.quaternion.times(self.j_quat)
-            self.plane_pitch -= self.plane_step_rotate
-        if keys[K_h]:
-            self.quaternion = self.quaternion.times(self.j_quat.inverse())
-            self.plane_pitch += self.plane_step_rotate
-        # roll
-        if keys[K_o]:
-            self.quaternion = self.quaternion.times(self.k_quat)
-            self.plane_roll -= self.plane_step_rotate
-        if keys[K_k]:
-            self.quaternion = self.quaternion.times(self.k_quat.inverse())
-            self.plane_roll += self.plane_step_rotate
+        # i/j yaw, u/h pitch, o/k roll, applied every simulation step while held
+        self.simulation.held = {control[0] for control in ORIENTATION_CONTROLS} & keys
+
+    def _apply_action(self, action):
+        kind = action[0]
+        if kind == "quit":
+            self.running = False
+        elif kind == "model":
+            if not self.async_load:
+                # replays load synchronously so every run sees the same frames
+                self.requested_model = action[1]
+                self.model = self.assets.get(action[1])
+            else:
+                self._switch_model(action[1])
+        elif kind == "quaternion_mode":
+            self.quaternion_mode = action[1]
+            self.simulation.reset(quaternion=self.quaternion_default)
+            print("Quaternion mode" if self.quaternion_mode else "Euler mode")
+        elif kind == "instances":
+            self._set_instances(action[1])
+        elif kind == "reset_object":
+            self.simulation.reset(0.0, 0.0, 90.0, self.quaternion_default)
+        elif kind == "reset_camera":
+            self.camera_distance = 150.0 # dist from origin
+            self.camera_azimuth = 0.0 # rotation about z axis
+            self.camera_elevation = 30.0 #angle above horizon (degs)
+        elif kind == "seek":
+            if self.trajectory is not None:
+                self.trajectory_frame = min(max(action[1], 0), len(self.trajectory) - 1)
+        elif kind == "pause":
+            self.trajectory_paused = action[1]
+        elif kind == "render_mode":
+            self.redraw.set_on_demand(action[1] == "on_demand")
+        elif kind == "keyframe":
+            self.path.add(*action[1:4])
+        elif kind == "path":
+            self.path_playing = False
+            self.path_time = 0.0
+            if action[1] == "demo":
+                self.path = KeyframePath(DEMO_KEYFRAMES)
+            else:
+                self.path.clear()
+        elif kind == "path_method":
+            self.path_method = action[1]
+        elif kind == "path_play":
+            # needs a segment to play, stopping hands the pose back to the simulation
+            self.path_playing = action[1] and len(self.path) > 1
+            if not self.path_playing:
+                self.simulation.reset(self.plane_yaw, self.plane_pitch, self.plane_roll, self.quaternion)
 
     """
     Render function is called every frame
@@ -217,86 +477,145 @@ class Window:
     4. Show what was drawn
     """
     def _render(self):
+        self._draw_scene()
+        #gui
+        if self.imgui_renderer is not None:
+            self.profiler.start("gui")
+            self._render_gui()
+            io = imgui.get_io()
+            io.font_global_scale = 1.867
+            io.display_size = self.width, self.height
+            self.profiler.stop("gui")
+        #initally we drew to a hidden 'back buffer'
+        # this swaps it to the front buffer
+        # prevents half drawn frames (called double buffering)
+        self.profiler.start("flip")
+        pygame.display.flip()
+        self.profiler.stop("flip")
+        if self.show_ui and self.imgui_renderer is None:
+            # after the first frame, the window is never blank while imgui starts
+            self._init_gui()
+
+    def _render_offscreen(self):
+        # same scene as _render, drawn into the fbo and read back a few frames later
+        self.frame_target.bind()
+        self._draw_scene()
+        for index, pixels in self.readback.read(self.frame_index):
+            if self.frame_writer:
+                self.frame_writer.write(index, pixels)
+        self.frame_index += 1
+
+    def _draw_scene(self):
+        self.draw_stats.new_frame()
         # clear color and depth buffer
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         # reset transformations to identity matrix
         glLoadIdentity()
         # position camera
+        self.profiler.start("camera")
         self._update_camera()
+        self.profiler.stop("camera")
         #gimbal rings, rotate with plane angles
         if (not self.quaternion_mode):
+            self.profiler.start("rings")
             self._draw_gimbal_rings()
+            self.profiler.stop("rings")
+        if len(self.path) > 1:
+            self._draw_paths()
         # draw everything we need to
-        #rotate plane
-        glPushMatrix()
-        if (self.quaternion_mode):
-            angle = 2 * math.acos(self.quaternion.r)
-            imag = math.sqrt(1 - (self.quaternion.r * self.quaternion.r))
-            if (imag <= .00001):
-                imag = 0.00001
-            glRotatef(180* angle / math.pi, 
-                      self.quaternion.i / imag, 
-                      self.quaternion.j / imag, 
-                      self.quaternion.k / imag)
+        if self.model is None:
+            # first model still loading, the rings and axes are the placeholder
+            pass
+        elif self.scene is not None or self.use_shaders:
+            self.profiler.start("model")
+            self.renderer.begin(self.projection, self.view)
+            if self.scene is not None:
+                # instances carry their own rotation, only the camera applies
+                self.renderer.draw_instances(self.model, self.scene, self.instance_lod, self.draw_stats)
+            else:
+                self.renderer.draw_model(self.model, self._orientation(), self.draw_stats)
+            self.renderer.end()
+            self.profiler.stop("model")
         else:
-            glRotatef(self.plane_yaw, 0,0,1)
-            glRotatef(self.plane_pitch, 0,1,0)
-            glRotatef(self.plane_roll, 1,0,0)
-        self.model.render()
-        glPopMatrix()
+            self._draw_model()
         self._draw_axes()
-        #gui
-        self._render_gui()
-        io = imgui.get_io()
-        io.font_global_scale = 1.867
-        io.display_size = self.width, self.height
-        #initally we drew to a hidden 'back buffer'
-        # this swaps it to the front buffer
-        # prevents half drawn frames (called double buffering)
-        pygame.display.flip()
+
+    def _orientation(self):
+        # [r, i, j, k] of the plane, both pipelines rotate by it
+        if self.quaternion_mode:
+            q = self.quaternion
+            return (q.r, q.i, q.j, q.k)
+        return rotations.euler_to_quaternion([self.plane_yaw, self.plane_pitch, self.plane_roll],
+                                             rotations.APP_SEQUENCE, degrees=True)
+
+    def _draw_model(self):
+        #rotate plane, the matrix the yaw / pitch / roll glRotatef chain would build
+        glPushMatrix()
+        glMultMatrixf(rotations.gl_rotation(rotations.quaternion_to_matrix(self._orientation())))
+        self.profiler.start("model")
+        self.model.render(self.draw_stats)
+        self.profiler.stop("model")
+        glPopMatrix()
 
     def _draw_gimbal_rings(self):
-        glDisable(GL_LIGHTING)
+        # geometry is static on the gpu, only the ring rotations change per frame
+        self.rings.select_lod(self.camera_distance)
         glLineWidth(3.0)
 
         # outer (yaw)
         glPushMatrix()
         glRotatef(self.plane_yaw, 0, 0, 1)
         glColor3f(1, 0, 0)
-        glBegin(GL_LINE_LOOP)
-        for vertex in self.ring_vertices_outer:
-            glVertex3fv(vertex)
-        glEnd()
+        self.rings.draw(0)
         # yaw arrow
-        glBegin(GL_LINES)
-        glVertex(0,0,-4)
-        glVertex(0,0,4)
-        glEnd()
+        self._draw_ring_arrow((0, 0, -4), (0, 0, 4))
         # pitch - affected by yaw, then pitch.
         glRotatef(self.plane_pitch, 0, 1, 0)
         glColor3f(0, 1, 0)
-        glBegin(GL_LINE_LOOP)
-        for vertex in self.ring_vertices_middle:
-            glVertex3fv(vertex)
-        glEnd()
+        self.rings.draw(1)
         # pitch arrow
-        glBegin(GL_LINES)
-        glVertex(0, -3.5, 0)
-        glVertex3f(0, 3.5, 0)
-        glEnd()
+        self._draw_ring_arrow((0, -3.5, 0), (0, 3.5, 0))
         # roll - affected by yaw, then pitch, then roll
         glRotatef(self.plane_roll, 1, 0, 0)
         glColor3f(0, 0, 1)
-        glBegin(GL_LINE_LOOP)
-        for vertex in self.ring_vertices_inner:
-            glVertex3fv(vertex)
+        self.rings.draw(2)
+        self._draw_ring_arrow((-3, 0, 0), (3, 0, 0))
+        glPopMatrix() # pop all transformations
+        glLineWidth(1.0)
+
+    def _draw_paths(self):
+        # where the nose points along each interpolation, on the sphere of the outer ring
+        glDisable(GL_LIGHTING)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glLineWidth(2.0)
+        for method in METHODS:
+            points = self.path.trace(method, PATH_TRACE_SAMPLES, self.ring_radius_outer)
+            glColor3f(*PATH_COLORS[method])
+            glVertexPointer(3, GL_FLOAT, 0, points)
+            glDrawArrays(GL_LINE_STRIP, 0, len(points))
+        glLineWidth(1.0)
+        glDisableClientState(GL_VERTEX_ARRAY)
+        # keyframes in white, the plane's nose in the color of the method driving it
+        keys = rotations.quaternion_to_matrix(self.path.quaternions)[:, :, 0] * self.ring_radius_outer
+        glPointSize(8.0)
+        glBegin(GL_POINTS)
+        glColor3f(1, 1, 1)
+        for point in keys:
+            glVertex3f(*point)
+        if self.path_playing:
+            nose = rotations.quaternion_to_matrix(self._orientation())[:, 0] * self.ring_radius_outer
+            glColor3f(*PATH_COLORS[self.path_method])
+            glVertex3f(*nose)
         glEnd()
+        glPointSize(1.0)
+        glEnable(GL_LIGHTING)
+
+    def _draw_ring_arrow(self, start, end):
+        glDisable(GL_LIGHTING)
         glBegin(GL_LINES)
-        glVertex(-3, 0, 0)
-        glVertex(3, 0, 0)
+        glVertex3f(*start)
+        glVertex3f(*end)
         glEnd()
-        glPopMatrix() # pop all transformations
-        glLineWidth(1.0)
         glEnable(GL_LIGHTING)
     
     def _render_gui(self):
@@ -305,32 +624,64 @@ class Window:
         imgui.new_frame()
         imgui.begin("Flight Controls", True)
         # main control panel
-        changed, self.quaternion_mode = imgui.checkbox("Use Quaternions", self.quaternion_mode)
+        changed, quaternion_mode = imgui.checkbox("Use Quaternions", self.quaternion_mode)
         if changed:
-            self.quaternion = self.quaternion_default
-            print("Quaternion mode" if self.quaternion_mode else "Euler mode")
+            self.pending_actions.append(["quaternion_mode", quaternion_mode])
         imgui.separator()
         if imgui.button("Plane"):
-            self.model.set_config(MODEL_CONFIGS["plane"])
+            self.pending_actions.append(["model", "plane"])
         if imgui.button("Rat"):
-            self.model.set_config(MODEL_CONFIGS["rat"])
+            self.pending_actions.append(["model", "rat"])
+        if "file" in self.assets.configs:
+            if imgui.button("File"):
+                self.pending_actions.append(["model", "file"])
+        # previous model keeps rendering while the new one loads
+        for name, (stage, progress) in self.assets.loading().items():
+            imgui.progress_bar(progress, (0, 0), f"{name}: {stage}")
+        cache = self.assets.mesh_cache
+        imgui.text(f"Mesh cache: {cache.hits} hits / {cache.misses} misses")
+        imgui.text(f"Resident: {', '.join(self.assets.resident)} "
+                   f"({self.assets.vram_bytes() / (1024 * 1024):.1f} MB)")
+        count = self.scene.count if self.scene is not None else 0
+        changed, count = imgui.slider_int("Instances", count, 0, 10000)
+        if changed:
+            self.pending_actions.append(["instances", count])
+        if self.renderer is not None:
+            changed, use_shaders = imgui.checkbox("GLSL Pipeline", self.use_shaders)
+            if changed:
+                self.use_shaders = use_shaders
+        if self.model is not None:
+            changed, use_buffers = imgui.checkbox("Vertex Buffers", self.model.use_buffers)
+            if changed:
+                self.model.set_use_buffers(use_buffers)
+            imgui.text(f"Model submit: {self.model.avg_submit_ms:.3f} ms")
+            imgui.text(f"Draw calls: {self.draw_stats.last_draw_calls}, "
+                       f"state changes: {self.draw_stats.last_state_changes} "
+                       f"({len(self.model.submeshes)} sub-meshes)")
+            stats = self.model.mesh_stats
+            if stats:
+                lod = self.instance_lod if self.scene is not None else self.model.lod
+                cache = (f"ACMR {stats['acmr_before']:.2f} -> {stats['acmr_after']:.2f}"
+                         if stats.get('cache_optimized', True) else "cache order skipped")
+                imgui.text(f"LOD {lod}: {stats['lod_triangles'][lod]} tris, {cache}")
+            if self.model.texture is not None:
+                imgui.text(f"Texture: {self.model.texture.report()}")
+        imgui.text(f"Simulation: {self.simulation.rate:.0f} Hz, {self.simulation.steps} steps "
+                   f"({self.simulation.dropped_steps} dropped)")
         if imgui.button("Reset Object"):
-            self.quaternion = self.quaternion_default
-            self.plane_yaw = 0.0
-            self.plane_pitch = 0.0
-            self.plane_roll = 90.0
+            self.pending_actions.append(["reset_object"])
         if imgui.button("Reset Camera"):
-            self.camera_distance = 150.0 # dist from origin
-            self.camera_azimuth = 0.0 # rotation about z axis
-            self.camera_elevation = 30.0 #angle above horizon (degs)
+            self.pending_actions.append(["reset_camera"])
         imgui.separator()
         if (not self.quaternion_mode):
             imgui.text("Rotation Mode: Euler Angles")
             imgui.text(f"X: {abs(self.plane_pitch) % 360:.1f}")
             imgui.text(f"Y: {abs(self.plane_yaw) % 360:.1f}")
             imgui.text(f"Z: {abs(self.plane_roll) % 360:.1f}")
-            if ((abs(self.plane_pitch) % 180) >= 86 and 
-                (abs(self.plane_pitch) % 180) <= 94):
+            pose = analyze(self.plane_yaw, self.plane_pitch, self.plane_roll)[0]
+            imgui.text(f"Lock distance: {pose['distance']:.1f} deg, "
+                       f"condition: {pose['condition']:.1f}")
+            if pose['distance'] <= GIMBAL_LOCK_WINDOW:
                 imgui.separator()
                 imgui.text(f"Gimbal Lock Detected!")
         else:
@@ -339,10 +690,92 @@ class Window:
             imgui.text(f"i:    {self.quaternion.i:.4f}")
             imgui.text(f"j:    {self.quaternion.j:.4f}")
             imgui.text(f"k:    {self.quaternion.k:.4f}")
+        imgui.separator()
+        imgui.text(f"Keyframe path: {len(self.path)} keys, {self.path.duration:.1f} s")
+        if imgui.button("Add Keyframe"):
+            # the ring angles as set, converting would wrap them into the
+            # canonical range and change what the euler curve interpolates
+            yaw, pitch, roll = self.plane_yaw, self.plane_pitch, self.plane_roll
+            if self.quaternion_mode:
+                yaw, pitch, roll = rotations.quaternion_to_euler(self._orientation(), degrees=True)
+            self.pending_actions.append(["keyframe", float(yaw), float(pitch), float(roll)])
+        imgui.same_line()
+        if imgui.button("Demo Path"):
+            self.pending_actions.append(["path", "demo"])
+        imgui.same_line()
+        if imgui.button("Clear Path"):
+            self.pending_actions.append(["path", "clear"])
+        for method in METHODS:
+            if imgui.radio_button(method.capitalize(), self.path_method == method):
+                self.pending_actions.append(["path_method", method])
+            imgui.same_line()
+        changed, playing = imgui.checkbox("Play Path", self.path_playing)
+        if changed:
+            self.pending_actions.append(["path_play", playing])
+        if len(self.path) > 1:
+            # travelled rotation, worst speed swing in a segment, euler's closest approach to lock
+            for method, stats in self.path.compare().items():
+                lock = "" if stats['lock_distance'] != stats['lock_distance'] \
+                    else f", lock {stats['lock_distance']:.1f} deg"
+                imgui.text_colored(f"{method}: {stats['rotation']:.0f} deg, "
+                                   f"speed x{stats['peak_rate']:.2f}{lock}", *PATH_COLORS[method])
+        if self.trajectory is not None:
+            imgui.separator()
+            imgui.text(f"Playback: {self.trajectory.path}")
+            # any frame is one memmap index away, scrubbing costs nothing
+            changed, frame = imgui.slider_int("Frame", self.trajectory_frame, 0, len(self.trajectory) - 1)
+            if changed:
+                self.pending_actions.append(["seek", frame])
+            changed, paused = imgui.checkbox("Pause", self.trajectory_paused)
+            if changed:
+                self.pending_actions.append(["pause", paused])
+        if self.trajectory_recorder is not None:
+            imgui.text(f"Recording: {self.trajectory_recorder.frames} frames")
+        imgui.separator()
+        changed, on_demand = imgui.checkbox("Render on demand", self.redraw.on_demand)
+        if changed:
+            self.pending_actions.append(["render_mode", "on_demand" if on_demand else "continuous"])
+        imgui.text(f"Frames drawn: {self.redraw.frames_drawn}, skipped: {self.redraw.frames_skipped}")
+        imgui.text(f"CPU: {self.redraw.cpu_percent:.1f}% of a core, "
+                   f"idle {self.redraw.idle_percent:.0f}% of the time")
+        changed, profiling = imgui.checkbox("Profiler", self.profiler.enabled)
+        if changed:
+            self.profiler.set_enabled(profiling)
         imgui.end()
+        if self.profiler.enabled and self.profiler.frames:
+            self._render_profiler()
         imgui.render()
         self.imgui_renderer.render(imgui.get_draw_data())
 
+    def _render_profiler(self):
+        imgui.begin("Profiler", True)
+        stats = self.profiler.percentiles()
+        imgui.text(f"{'ms':<8}{'cpu p50/p95/p99':>22}{'gpu p50/p95/p99':>22}")
+        for name in self.profiler.sections + ['frame']:
+            cpu = "/".join("-" if v != v else f"{v:.2f}" for v in stats[name]['cpu'])
+            gpu = "/".join("-" if v != v else f"{v:.2f}" for v in stats[name]['gpu'])
+            imgui.text(f"{name:<8}{cpu:>22}{gpu:>22}")
+        # frame time distribution, 0 - 50 ms
+        imgui.plot_histogram("##frametimes", array('f', self.profiler.histogram()), graph_size=(0, 80))
+        if imgui.button("Export CSV"):
+            self.profiler.export("profile.csv")
+        imgui.same_line()
+        if imgui.button("Export JSON"):
+            self.profiler.export("profile.json")
+        imgui.end()
+
+    def _switch_model(self, name):
+        self.requested_model = name
+        model = self.assets.request(name)
+        if model is not None:
+            self.model = model
+
+    def _finish_loads(self):
+        # gl uploads for background loads happen here, between frames
+        for name in self.assets.poll():
+            if name == self.requested_model:
+                self._switch_model(name)
+
     # axes are for reference
     def _draw_axes(self):
         # no light for drawing lines, solid color
@@ -367,15 +800,141 @@ class Window:
 
     def run(self):
         print("running")
+        if self.replay is not None:
+            self._run_replay()
+            return
+        if self.headless:
+            self._run_headless()
+            return
+        while self.running:
+            self.profiler.begin_frame()
+            self._finish_loads()
+            self._update()
+            animating = self._animating()
+            if self.redraw.needs_redraw(self._frame_state(), animating):
+                self._render()
+                # skipped iterations are left out of the profile
+                self.profiler.end_frame()
+            if self.redraw.idle(animating):
+                self._wait_for_input()
+            self.redraw.sample()
+            self.frame_seconds = self.clock.tick(self.fps) / 1000.0
+
+        self._cleanup()
+
+    def _frame_state(self):
+        # everything a frame shows that changes without an input event
+        q = self.quaternion
+        model = self.model
+        return (self.plane_yaw, self.plane_pitch, self.plane_roll, q.r, q.i, q.j, q.k,
+                self.quaternion_mode, self.camera_distance, self.camera_azimuth, self.camera_elevation,
+                id(model), model.lod if model is not None else None, self.instance_lod,
+                self.path.version, self.path_method, self.trajectory_frame)
+
+    def _animating(self):
+        # frames keep changing on their own: held controls, playback, instances, loads
+        return (bool(self.held_keys) or self.path_playing or self.scene is not None
+                or (self.trajectory is not None and not self.trajectory_paused
+                    and self.trajectory_frame < len(self.trajectory) - 1)
+                or self.model is None or bool(self.assets.pending) or bool(self.assets.streaming))
+
+    def _wait_for_input(self):
+        # block until an event arrives, it goes back on the queue for _handle_events
+        start = time.perf_counter()
+        event = pygame.event.wait(int(IDLE_WAIT_SECONDS * 1000))
+        if event.type != pygame.NOEVENT:
+            pygame.event.post(event)
+        self.redraw.waited(time.perf_counter() - start, self.fps)
+        # the wait is not simulated time
+        self.clock.tick()
+
+    def _update(self):
+        self.profiler.start("events")
+        self._handle_events()
+        self.profiler.stop("events")
+        self.profiler.start("update")
+        self._update_plane()
+        self.profiler.stop("update")
+
+    def _run_headless(self):
+        # no fps cap, frames are produced as fast as the gl context allows.
+        # every frame counts as 1/fps of simulated time so output is deterministic
+        self.frame_seconds = 1.0 / self.fps
+        start = time.perf_counter()
         while self.running:
-            self._handle_events()
+            self.profiler.begin_frame()
+            self._finish_loads()
+            self.profiler.start("update")
             self._update_plane()
-            self._render()
-            self.clock.tick(self.fps)
+            self.profiler.stop("update")
+            self._render_offscreen()
+            self.profiler.end_frame()
+            if self.max_frames is not None and self.frame_index >= self.max_frames:
+                self.running = False
+        elapsed = time.perf_counter() - start
+        print(f"rendered {self.frame_index} frames in {elapsed:.2f} s "
+              f"({self.frame_index / max(elapsed, 1e-9):.1f} fps), "
+              f"{self.draw_stats.draw_calls} draw calls and "
+              f"{self.draw_stats.state_changes} state changes in the last frame")
+        self._cleanup()
 
+    def _run_replay(self):
+        '''
+            feed a recorded input script through the same update and render
+            code as a live session, with no fps cap, and report throughput
+        '''
+        update_time = 0.0
+        render_time = 0.0
+        frames = 0
+        # each frame advances the simulation by its recorded time, not wall
+        # time, _handle_events takes it from the script
+        while self.running and not self.replay.done():
+            if self.max_frames is not None and frames >= self.max_frames:
+                break
+            self.profiler.begin_frame()
+            start = time.perf_counter()
+            self._update()
+            mid = time.perf_counter()
+            if self.headless:
+                self._render_offscreen()
+            else:
+                self._render()
+            render_time += time.perf_counter() - mid
+            self.profiler.end_frame()
+            update_time += mid - start
+            frames += 1
+        total = update_time + render_time
+        print(f"replayed {frames} frames from {self.replay.path} in {total:.2f} s "
+              f"({frames / max(total, 1e-9):.1f} fps)")
+        print(f"  update: {1000 * update_time / max(frames, 1):.3f} ms/frame, "
+              f"render: {1000 * render_time / max(frames, 1):.3f} ms/frame")
         self._cleanup()
 
     def _cleanup(self):
-        self.imgui_renderer.shutdown()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.trajectory_recorder is not None:
+            self.trajectory_recorder.close()
+        if self.trajectory is not None:
+            self.trajectory.close()
+        if self.profile_path and self.profiler.frames:
+            self.profiler.export(self.profile_path)
+        self.profiler.release()
+        self.assets.release_all()
+        self.rings.release()
+        if self.renderer is not None:
+            self.renderer.release()
+        if self.headless:
+            for index, pixels in self.readback.flush():
+                if self.frame_writer:
+                    self.frame_writer.write(index, pixels)
+            if self.frame_writer:
+                self.frame_writer.close()
+            self.readback.release()
+            self.frame_target.release()
+            self.gl_context.destroy()
+            sys.exit()
+        if self.imgui_renderer is not None:
+            self.imgui_renderer.shutdown()
         pygame.quit()
-        sys.exit()
\ No newline at end of file
+        sys.exit()